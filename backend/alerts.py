@@ -0,0 +1,203 @@
+from __future__ import annotations
+
+import atexit
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, List, Optional
+
+from .audit import AuditWriter
+from .datastore import DataStore, iso_now, store
+from .logstore import LogStore, system_log
+
+DEFAULT_DISK_TEMPERATURE = 45
+CAPACITY_HYSTERESIS = 2
+FAILED_SYNC_STATUSES = {"failed", "fail", "partial"}
+FINAL_SYNC_STATUSES = FAILED_SYNC_STATUSES | {"success"}
+UNHEALTHY_DISK_LEVELS = {"failed": "high", "error": "high", "offline": "high"}
+
+
+class AlertEngine:
+    # 订阅 DataStore 的变更事件，只对变化的那条磁盘 / 存储卷 / 同步作业重新评估规则；
+    # 同一告警键（如 volume:1:capacity）未关闭前只更新原记录，条件恢复后自动关闭。
+    # 规则在存储锁内执行，告警日志只放入 writer 的队列，由后台线程在锁外写盘
+    def __init__(self, data_store: DataStore, logs: LogStore) -> None:
+        self.store = data_store
+        self.logs = AuditWriter(logs, {"flushInterval": 0.2}, name="alert-log-writer")
+        self.handlers = {
+            "disks": self.evaluate_disk,
+            "storage_volumes": self.evaluate_volume,
+            "sync_jobs": self.evaluate_sync_job,
+        }
+        self.open: Dict[str, Dict[str, Any]] = {}
+        self.windows: Dict[Any, Deque[bool]] = {}
+        self.counted: set = set()
+        self.stats = {"events": 0, "raised": 0, "updated": 0, "closed": 0, "errors": 0}
+        for alert in data_store.data.get("alerts", []):
+            if alert.get("key") and alert.get("status") != "closed":
+                self.open[alert["key"]] = alert
+        if not data_store.read_only:
+            # replica 只读：告警由 primary 评估后随文档同步过来
+            self.reload()
+        # 告警由执行写操作的进程生成并随文档落盘，replica 同步过来的变更不再重复评估
+        data_store.subscribe(self.on_change, replicated=False)
+
+    def settings(self) -> Dict[str, Any]:
+        return self.store.data.get("alert_settings", {})
+
+    def reload(self) -> None:
+        # 启动或告警设置修改后：按最新阈值重建同步失败窗口，并对现有磁盘 / 存储卷评估一次
+        with self.store.lock:
+            self.windows = {}
+            self.counted = set()
+            for job in self.store.data.get("sync_jobs", []):
+                self.record_sync_result(job)
+            for task_id in list(self.windows):
+                self.evaluate_sync_window(task_id, None)
+            for disk in self.store.data.get("disks", []):
+                self.evaluate_disk(disk, "update")
+            for volume in self.store.data.get("storage_volumes", []):
+                self.evaluate_volume(volume, "update")
+
+    def on_change(self, collection: str, item: Dict[str, Any], action: str) -> None:
+        handler = self.handlers.get(collection)
+        if handler is None:
+            return
+        self.stats["events"] += 1
+        try:
+            with self.store.lock:
+                handler(item, action)
+        except Exception as exc:  # 规则出错不能影响触发变更的请求
+            self.stats["errors"] += 1
+            self.log("error", f"告警规则执行失败：{exc!r}")
+
+    def evaluate_disk(self, disk: Dict[str, Any], action: str) -> None:
+        disk_id = disk.get("id")
+        name = disk.get("name") or disk_id
+        if action == "delete":
+            self.resolve(f"disk:{disk_id}:health")
+            self.resolve(f"disk:{disk_id}:temperature")
+            return
+        status = disk.get("status") or "normal"
+        smart = disk.get("smart") or "OK"
+        if status == "normal" and smart == "OK":
+            self.resolve(f"disk:{disk_id}:health")
+        else:
+            level = UNHEALTHY_DISK_LEVELS.get(status, "medium")
+            detail = smart if smart != "OK" else status
+            self.raise_alert(f"disk:{disk_id}:health", "disk", level, f"磁盘 {name} 状态异常：{detail}", "disks", disk_id)
+        limit = self.settings().get("diskTemperature", DEFAULT_DISK_TEMPERATURE)
+        temperature = disk.get("temperature")
+        if temperature is not None and temperature >= limit:
+            content = f"磁盘 {name} 温度 {temperature}℃，超过阈值 {limit}℃"
+            self.raise_alert(f"disk:{disk_id}:temperature", "disk", "medium", content, "disks", disk_id)
+        else:
+            self.resolve(f"disk:{disk_id}:temperature")
+
+    def evaluate_volume(self, volume: Dict[str, Any], action: str) -> None:
+        key = f"volume:{volume.get('id')}:capacity"
+        capacity = volume.get("capacityGb") or 0
+        if action == "delete" or capacity <= 0:
+            self.resolve(key)
+            return
+        thresholds = sorted(self.settings().get("capacityThresholds") or [])
+        if not thresholds:
+            self.resolve(key)
+            return
+        usage = volume.get("usedGb", 0) * 100 / capacity
+        crossed = [threshold for threshold in thresholds if usage >= threshold]
+        if crossed:
+            level = "high" if crossed[-1] == thresholds[-1] else "medium"
+            content = f"存储卷 {volume.get('mountPoint') or volume.get('id')} 使用率 {usage:.0f}%"
+            self.raise_alert(key, "capacity", level, content, "storage_volumes", volume.get("id"))
+        elif usage < thresholds[0] - CAPACITY_HYSTERESIS:
+            # 留出回差，避免使用率在阈值附近波动时反复开关告警
+            self.resolve(key)
+
+    def record_sync_result(self, job: Dict[str, Any]) -> Optional[Any]:
+        # 每个作业只计入一次，且只在进入终态时计入
+        if job.get("id") in self.counted or job.get("status") not in FINAL_SYNC_STATUSES:
+            return None
+        self.counted.add(job.get("id"))
+        task_id = job.get("taskId")
+        size = max(1, int(self.settings().get("syncFailTimes") or 1))
+        window = self.windows.setdefault(task_id, deque(maxlen=size))
+        window.append(job.get("status") in FAILED_SYNC_STATUSES)
+        return task_id
+
+    def evaluate_sync_job(self, job: Dict[str, Any], action: str) -> None:
+        if action == "delete":
+            return
+        task_id = self.record_sync_result(job)
+        if task_id is not None:
+            self.evaluate_sync_window(task_id, job)
+
+    def evaluate_sync_window(self, task_id: Any, job: Optional[Dict[str, Any]]) -> None:
+        window = self.windows.get(task_id)
+        key = f"sync:{task_id}:failures"
+        if not window:
+            return
+        if len(window) == window.maxlen and all(window):
+            task = self.store.find_by_id("sync_tasks", task_id) or {}
+            name = (job or {}).get("taskName") or task.get("name") or task_id
+            content = f"同步任务 {name} 连续 {window.maxlen} 次执行失败"
+            self.raise_alert(key, "sync", "high", content, "sync_tasks", task_id)
+        elif not window[-1]:
+            self.resolve(key)
+
+    def raise_alert(self, key: str, alert_type: str, level: str, content: str, collection: str, item_id: Any) -> None:
+        now = iso_now()
+        alert = self.open.get(key)
+        if alert is not None and alert.get("status") != "closed":
+            alert["lastSeenAt"] = now
+            if alert.get("level") != level or alert.get("content") != content:
+                # 级别或内容变化按单条更新处理：递增记录版本号并发出 update 事件
+                alert.update({"level": level, "content": content})
+                self.stats["updated"] += 1
+                self.store.mark_changed("alerts", alert)
+            else:
+                self.store.mark_changed("alerts", ids=[alert.get("id")])
+            return
+        alert = {
+            "id": self.store.next_id("alerts"),
+            "type": alert_type,
+            "level": level,
+            "content": content,
+            "status": "open",
+            "createdAt": now,
+            "handler": None,
+            "handledAt": None,
+            "key": key,
+            "source": {"collection": collection, "id": item_id},
+            "lastSeenAt": now,
+        }
+        self.store.get_collection("alerts").append(alert)
+        self.open[key] = alert
+        self.stats["raised"] += 1
+        self.store.mark_changed("alerts", alert, "create")
+        self.log("warn", content)
+
+    def resolve(self, key: str) -> None:
+        alert = self.open.pop(key, None)
+        if alert is None or alert.get("status") == "closed":
+            return
+        alert.update({"status": "closed", "closedAt": iso_now(), "autoClosed": True})
+        self.stats["closed"] += 1
+        self.store.mark_changed("alerts", alert, "update")
+        self.log("info", f"{alert.get('content')}（已恢复）")
+
+    def log(self, level: str, message: str) -> None:
+        # 调用方可能持有存储锁（apply_update 内触发的事件），这里只入队，不等待写盘
+        self.logs.offer({"time": iso_now(), "level": level, "module": "alert", "message": message})
+
+    def open_alerts(self) -> Iterable[Dict[str, Any]]:
+        return [alert for alert in self.open.values() if alert.get("status") != "closed"]
+
+    def snapshot(self) -> Dict[str, Any]:
+        windows: List[Dict[str, Any]] = [
+            {"taskId": task_id, "results": ["fail" if failed else "success" for failed in window]}
+            for task_id, window in self.windows.items()
+        ]
+        return {"open": len(self.open_alerts()), "syncWindows": windows, "pendingLogs": self.logs.queue.qsize(), **self.stats}
+
+
+alert_engine = AlertEngine(store, system_log)
+atexit.register(alert_engine.logs.flush)
@@ -1,13 +1,73 @@
 from __future__ import annotations
 
-from typing import Any, Dict, List, Optional
-
-from fastapi import Body, FastAPI, HTTPException, Query
+import hashlib
+import ipaddress
+import os
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from copy import deepcopy
+from pathlib import Path
+from typing import Any, Dict, FrozenSet, List, Optional, Set, Tuple
+
+from fastapi import Body, FastAPI, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from starlette.routing import Match
+
+from .alerts import alert_engine
+from .audit import (
+    METHOD_ACTIONS,
+    READ_ONLY_ROUTES,
+    audit_writer,
+    build_record,
+    created_item,
+    created_records,
+    describe,
+    diff_summary,
+    payload_summary,
+    snapshot_item,
+)
+from .changefeed import change_feed
+from .cluster import HOP_HEADERS, replica, should_forward
+from .cold_cache import cold_cache
+from .datastore import STORE_ROLE, VersionConflict, iso_now, store
+from .denormalize import denormalizer
+from .facets import FACET_FIELDS, FACET_LIMIT, as_list, asset_facets, parse_sort, search_conditions
+from .http_cache import (
+    CACHEABLE,
+    DEPENDENCIES,
+    RECORD_PARAMS,
+    depends_on,
+    entity_tag,
+    http_date,
+    last_modified,
+    not_modified_since,
+    parse_record_tag,
+    record_tag,
+    response_cache,
+)
+from .importer import importer
+from .logstore import audit_log, system_log
+from .metadata import metadata_extractor
+from .metrics import RESPONSE_RENDER, RequestMetrics, registry
+from .permissions import permission_engine
+from .profiler import ProfiledRoute, ProfilingMiddleware, profiler
+from .project_ops import project_ops
+from .restore_queue import resolve_task_assets, restore_queue
+from .saved_views import saved_views, view_page
+from .thumbnails import KINDS, placeholder_svg, thumbnails
+
 
-from .datastore import iso_now, store
 
-app = FastAPI(title="创作 NAS 混合云 API", version="1.0.0")
+class TimedJSONResponse(JSONResponse):
+    # 统计响应体 JSON 编码的耗时
+    def render(self, content: Any) -> bytes:
+        with RESPONSE_RENDER.time():
+            return super().render(content)
+
+
+app = FastAPI(title="创作 NAS 混合云 API", version="1.0.0", default_response_class=TimedJSONResponse)
+app.router.route_class = ProfiledRoute
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -16,6 +76,188 @@ app.add_middleware(
 )
 
 
+def match_route(scope: Dict[str, Any]) -> Optional[Tuple[Any, Dict[str, Any]]]:
+    for route in app.router.routes:
+        match, child = route.matches(scope)
+        if match == Match.FULL:
+            return route, child.get("path_params", {})
+    return None
+
+
+def route_template(scope: Dict[str, Any]) -> Optional[str]:
+    matched = match_route(scope)
+    return getattr(matched[0], "path", None) if matched else None
+
+
+def audit_user(request: Request) -> str:
+    header = request.headers.get("x-user-id") or ""
+    user = store.find_by_id("users", int(header)) if header.isdigit() else None
+    return user.get("username", header) if user else (header or "anonymous")
+
+
+def parse_networks(value: str) -> List[Any]:
+    return [ipaddress.ip_network(part.strip(), strict=False) for part in value.split(",") if part.strip()]
+
+
+# 只采信这些代理（本机反向代理、多进程部署中转发写请求的 replica）给出的 X-Forwarded-For；逗号分隔的 IP 或网段
+TRUSTED_PROXIES = parse_networks(os.environ.get("NAS_TRUSTED_PROXIES", "127.0.0.1,::1"))
+
+
+def is_trusted_proxy(host: Optional[str]) -> bool:
+    try:
+        address = ipaddress.ip_address(host or "")
+    except ValueError:
+        return False
+    return any(address in network for network in TRUSTED_PROXIES)
+
+
+def client_ip(request: Request) -> Optional[str]:
+    # 直连地址不是受信任的代理时忽略 X-Forwarded-For（客户端可以任意伪造）；
+    # 否则从右向左跳过受信任的代理，第一个不受信任的地址即为客户端
+    peer = request.client.host if request.client else None
+    forwarded = request.headers.get("x-forwarded-for")
+    if not forwarded or not is_trusted_proxy(peer):
+        return peer
+    hops = [hop.strip() for hop in forwarded.split(",") if hop.strip()]
+    for hop in reversed(hops):
+        if not is_trusted_proxy(hop):
+            return hop
+    return hops[0] if hops else peer
+
+
+@app.middleware("http")
+async def capture_audit(request: Request, call_next: Any) -> Response:
+    # 记录所有写操作：请求前后各取一次目标记录的浅拷贝求差异，记录交给 audit_writer 异步批量落盘
+    if request.method not in METHOD_ACTIONS or not request.url.path.startswith("/api/"):
+        return await call_next(request)
+    matched = match_route(request.scope)
+    if matched is None or matched[0].path in READ_ONLY_ROUTES:
+        return await call_next(request)
+    route, params = matched
+    target = describe(route.path, request.method, params)
+    collection = target["collection"]
+    before = snapshot_item(store, collection, target["targetId"])
+    body = await request.body() if before is None else b""
+    bucket: List[Tuple[str, Dict[str, Any]]] = []
+    token = created_records.set(bucket)
+    try:
+        response = await call_next(request)
+    finally:
+        created_records.reset(token)
+    after = snapshot_item(store, collection, target["targetId"])
+    created = created_item(bucket, collection) if collection and target["targetId"] is None else None
+    if created is not None:
+        after = created
+        target["targetId"] = created.get("id")
+    details = diff_summary(before, after) or payload_summary(body)
+    record = build_record(audit_user(request), client_ip(request), target, response.status_code, details)
+    if audit_writer.offer(record) is None:
+        await run_in_threadpool(audit_writer.overflow, record)
+    return response
+
+
+@app.middleware("http")
+async def conditional_get(request: Request, call_next: Any) -> Response:
+    # 声明了依赖集合的读接口：按集合版本号生成 ETag，客户端缓存仍有效时直接返回 304，不执行处理函数。
+    # 详情接口改用记录版本号 W/"v<version>"，可直接作为 PATCH 的 If-Match
+    if request.method not in ("GET", "HEAD") or not request.url.path.startswith("/api/"):
+        return await call_next(request)
+    matched = match_route(request.scope)
+    collections = DEPENDENCIES.get(getattr(matched[0], "endpoint", None)) if matched else None
+    if not collections:
+        return await call_next(request)
+    request_key = f"{request.url.path}?{request.url.query}|{request.headers.get('x-user-id', '')}"
+    param = RECORD_PARAMS.get(matched[0].endpoint)
+    record_id = str(matched[1].get(param, "")) if param else ""
+    item = store.find_by_id(collections[0], int(record_id)) if record_id.isdigit() else None
+    if param and item is None:
+        return await call_next(request)
+    etag = record_tag(item) if item is not None else entity_tag(store, collections, request_key)
+    modified = last_modified(store, collections)
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "X-User-Id"}
+    stamp = http_date(modified)
+    if stamp:
+        headers["Last-Modified"] = stamp
+    if request.headers.get("if-none-match"):
+        if etag_matches(request, etag):
+            return Response(status_code=304, headers=headers)
+    elif not_modified_since(request.headers.get("if-modified-since"), modified):
+        return Response(status_code=304, headers=headers)
+    if request.method == "GET" and matched[0].endpoint in CACHEABLE:
+        return await cached_response(request, call_next, request_key, collections, headers)
+    response = await call_next(request)
+    if response.status_code == 200:
+        response.headers.update(headers)
+    return response
+
+
+async def cached_response(
+    request: Request, call_next: Any, key: str, collections: Tuple[str, ...], headers: Dict[str, str]
+) -> Response:
+    cached = response_cache.get(key, collections)
+    if cached is not None:
+        return Response(content=cached.body, media_type=cached.media_type, headers={**headers, "X-Cache": "hit"})
+    versions = response_cache.versions(collections)
+    response = await call_next(request)
+    if response.status_code != 200:
+        return response
+    body = b"".join([chunk async for chunk in response.body_iterator])
+    media_type = response.headers.get("content-type", "application/json")
+    response_cache.put(key, collections, versions, body, media_type)
+    return Response(content=body, media_type=media_type, headers={**headers, "X-Cache": "miss"})
+
+
+@app.middleware("http")
+async def replicate(request: Request, call_next: Any) -> Response:
+    # 多进程部署中的 replica：读请求由本地数据处理（后台线程按增量跟随 primary）；写请求转发给 primary，
+    # 返回前先应用 primary 的增量，保证同一客户端随后的读请求能读到自己的写入
+    if replica is None:
+        return await call_next(request)
+    replica.ensure_poller()
+    if replica.cursor is None:
+        await run_in_threadpool(replica.refresh)
+    if not should_forward(request.method, request.url.path):
+        return await call_next(request)
+    headers = {key: value for key, value in request.headers.items() if key not in HOP_HEADERS}
+    ip = client_ip(request)
+    if ip:
+        headers["x-forwarded-for"] = ip
+    body = await request.body()
+    try:
+        status, response_headers, content = await run_in_threadpool(
+            replica.forward, request.method, request.url.path, request.url.query, headers, body
+        )
+    except OSError:
+        return JSONResponse(status_code=503, content={"detail": "主进程不可用，请稍后重试"})
+    await run_in_threadpool(replica.refresh)
+    forwarded = {key: value for key, value in response_headers if key.lower() not in HOP_HEADERS}
+    return Response(content=content, status_code=status, headers=forwarded)
+
+
+# 最外层：包含中间件、缓存命中与转发在内的完整处理耗时
+app.add_middleware(ProfilingMiddleware, resolve=route_template)
+app.add_middleware(RequestMetrics, resolve=route_template)
+registry.gauge(
+    "nas_worker_queue_depth",
+    "后台任务排队 / 执行中的数量",
+    ("queue",),
+    lambda: {
+        ("audit_writer",): audit_writer.queue.qsize(),
+        ("metadata",): metadata_extractor.queue.qsize(),
+        ("restore",): len(restore_queue.pending),
+        ("import",): len(importer.running),
+        ("thumbnail",): len(thumbnails.inflight),
+        ("changefeed_subscribers",): len(change_feed.waiters),
+    },
+)
+registry.gauge(
+    "nas_cache_bytes",
+    "内存 / 磁盘缓存占用字节数",
+    ("cache",),
+    lambda: {("response",): response_cache.used, ("thumbnail",): thumbnails.cache.used},
+)
+
+
 def ensure_exists(collection: str, item_id: int) -> Dict[str, Any]:
     item = store.find_by_id(collection, item_id)
     if not item:
@@ -23,18 +265,108 @@ def ensure_exists(collection: str, item_id: int) -> Dict[str, Any]:
     return item
 
 
+def expected_version(request: Request, payload: Dict[str, Any]) -> Optional[int]:
+    # 期望版本优先取 If-Match 头（"*" 表示不校验），其次取请求体中的 expectedVersion / version；
+    # 都未提供时保持原有的直接覆盖行为。version 由服务端维护，不允许通过请求体改写
+    expected = payload.pop("expectedVersion", None)
+    body_version = payload.pop("version", None)
+    header = request.headers.get("if-match")
+    if header is not None:
+        if header.strip() == "*":
+            return None
+        version = parse_record_tag(header)
+        if version is None:
+            raise HTTPException(status_code=400, detail='If-Match 应为详情接口返回的 ETag（W/"v<version>"）')
+        return version
+    if expected is None:
+        expected = body_version
+    if expected is None:
+        return None
+    try:
+        return int(expected)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="期望版本应为记录的 version 整数")
+
+
+def apply_patch(
+    request: Request, collection: str, item: Dict[str, Any], payload: Dict[str, Any], **extra: Any
+) -> Dict[str, Any]:
+    expected = expected_version(request, payload)
+    try:
+        return store.apply_update(collection, item, {**payload, **extra}, expected)
+    except VersionConflict as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+
+
+def current_user_id(request: Request) -> Optional[int]:
+    # 请求方通过 X-User-Id 标识身份；未携带时保持原有的控制台行为，不做可见性过滤
+    header = request.headers.get("x-user-id")
+    if not header:
+        return None
+    try:
+        return int(header)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="X-User-Id 无效")
+
+
+def visible_project_ids(request: Request, permission: str) -> Optional[FrozenSet[int]]:
+    user_id = current_user_id(request)
+    if user_id is None:
+        return None
+    return permission_engine.visible_projects(user_id, permission)
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match", "")
+    return header.strip() == "*" or etag in [value.strip() for value in header.split(",")]
+
+
+def serve_cached_file(request: Request, path: Path, media_type: str, etag: str) -> Response:
+    headers = {"ETag": etag, "Cache-Control": "private, max-age=86400", "Accept-Ranges": "bytes"}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    size = path.stat().st_size
+    range_header = request.headers.get("range", "")
+    if range_header.startswith("bytes=") and "," not in range_header:
+        start_text, _, end_text = range_header[6:].partition("-")
+        try:
+            if start_text:
+                start, end = int(start_text), int(end_text) if end_text else size - 1
+            else:
+                start, end = max(size - int(end_text), 0), size - 1
+        except ValueError:
+            start, end = 0, -1
+        end = min(end, size - 1)
+        if start > end:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+        with path.open("rb") as fh:
+            fh.seek(start)
+            body = fh.read(end - start + 1)
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        return Response(content=body, status_code=206, media_type=media_type, headers=headers)
+    return FileResponse(path, media_type=media_type, headers=headers)
+
+
 @app.get("/api/dashboard/overview")
+@depends_on("projects", "assets", "disks", "sync_jobs", "alerts", cache=True)
 def dashboard_overview() -> Dict[str, Any]:
     return store.dashboard_overview()
 
 
 @app.get("/api/projects")
-def list_projects(
+@depends_on("projects", "project_members", "users", "roles")
+async def list_projects(
+    request: Request,
     keyword: Optional[str] = None,
     status: Optional[str] = None,
     owner: Optional[str] = None,
 ) -> Dict[str, Any]:
-    projects = store.data["projects"]
+    allowed = visible_project_ids(request, "perm.project.view")
+    if allowed is None:
+        projects = store.data["projects"]
+    else:
+        by_id = store.index("projects", "id")
+        projects = [by_id[project_id][0] for project_id in sorted(allowed) if project_id in by_id]
     result = []
     for project in projects:
         if keyword and keyword not in (project.get("name", "") + project.get("clientName", "")):
@@ -48,40 +380,59 @@ def list_projects(
 
 
 @app.post("/api/projects")
-def create_project(payload: Dict[str, Any]) -> Dict[str, Any]:
-    project_id = store.next_id("projects")
+async def create_project(payload: Dict[str, Any]) -> Dict[str, Any]:
     payload.setdefault("createdAt", iso_now())
     payload.setdefault("updatedAt", iso_now())
-    payload["id"] = project_id
-    store.get_collection("projects").append(payload)
-    store.save()
+    await run_in_threadpool(store.insert, "projects", payload)
+    await store.save_async()
     return payload
 
 
 @app.get("/api/projects/{project_id}")
-def get_project(project_id: int) -> Dict[str, Any]:
+@depends_on("projects", record="project_id")
+async def get_project(project_id: int) -> Dict[str, Any]:
     return ensure_exists("projects", project_id)
 
 
 @app.patch("/api/projects/{project_id}")
-def update_project(project_id: int, payload: Dict[str, Any]) -> Dict[str, Any]:
+async def update_project(project_id: int, payload: Dict[str, Any], request: Request) -> Dict[str, Any]:
     project = ensure_exists("projects", project_id)
-    project.update(payload)
-    project["updatedAt"] = iso_now()
-    store.save()
+    await run_in_threadpool(apply_patch, request, "projects", project, payload, updatedAt=iso_now())
+    await store.save_async()
     return project
 
 
 @app.delete("/api/projects/{project_id}")
 def delete_project(project_id: int) -> Dict[str, Any]:
-    deleted = store.delete_by_id("projects", project_id)
-    if not deleted:
-        raise HTTPException(status_code=404, detail="项目不存在")
-    store.save()
-    return {"status": "deleted"}
+    # 连同目录、素材、成员、同步任务（及其执行记录）与项目分层策略一并删除
+    project = ensure_exists("projects", project_id)
+    removed = project_ops.delete(project)
+    store.schedule_save()
+    return {"status": "deleted", "removed": removed}
+
+
+@app.post("/api/projects/{project_id}/archive")
+def archive_project(project_id: int, request: Request) -> Dict[str, Any]:
+    user_id = current_user_id(request)
+    if user_id is not None and not permission_engine.allowed(user_id, "perm.project.archive", project_id):
+        raise HTTPException(status_code=403, detail="没有归档该项目的权限")
+    project = ensure_exists("projects", project_id)
+    updated = project_ops.archive(project)
+    store.schedule_save()
+    return {"project": project, "updated": updated}
+
+
+@app.post("/api/projects/{project_id}/clone")
+def clone_project(project_id: int, payload: Dict[str, Any] = Body(default={})) -> Dict[str, Any]:
+    # payload 中的字段（如 name、ownerName）覆盖复制出的项目
+    project = ensure_exists("projects", project_id)
+    result = project_ops.clone(project, payload)
+    store.schedule_save()
+    return result
 
 
 @app.get("/api/projects/{project_id}/stats")
+@depends_on("projects", "assets", "folders", cache=True)
 def project_stats(project_id: int) -> Dict[str, Any]:
     ensure_exists("projects", project_id)
     assets = [asset for asset in store.data["assets"] if asset.get("projectId") == project_id]
@@ -103,14 +454,16 @@ def project_stats(project_id: int) -> Dict[str, Any]:
 
 
 @app.get("/api/projects/{project_id}/sync-tasks")
-def project_sync_tasks(project_id: int) -> Dict[str, Any]:
+@depends_on("projects", "sync_tasks")
+async def project_sync_tasks(project_id: int) -> Dict[str, Any]:
     ensure_exists("projects", project_id)
     tasks = [task for task in store.data["sync_tasks"] if task.get("projectId") == project_id]
     return {"items": tasks}
 
 
 @app.get("/api/projects/{project_id}/members")
-def list_project_members(project_id: int) -> Dict[str, Any]:
+@depends_on("projects", "project_members", "users")
+async def list_project_members(project_id: int) -> Dict[str, Any]:
     ensure_exists("projects", project_id)
     members = [member for member in store.data["project_members"] if member.get("projectId") == project_id]
     user_map = {user["id"]: user for user in store.data["users"]}
@@ -123,43 +476,46 @@ def list_project_members(project_id: int) -> Dict[str, Any]:
 
 
 @app.post("/api/projects/{project_id}/members")
-def add_project_member(project_id: int, payload: Dict[str, Any]) -> Dict[str, Any]:
+async def add_project_member(project_id: int, payload: Dict[str, Any]) -> Dict[str, Any]:
     ensure_exists("projects", project_id)
-    member_id = store.next_id("project_members")
-    payload["id"] = member_id
     payload["projectId"] = project_id
     payload.setdefault("joinedAt", iso_now())
-    store.get_collection("project_members").append(payload)
-    store.save()
+    await run_in_threadpool(store.insert, "project_members", payload)
+    # 在写入之后失效：先失效时并发请求可能在写入前重新编译并缓存旧权限
+    permission_engine.invalidate(payload.get("userId"))
+    await store.save_async()
     return payload
 
 
 @app.patch("/api/projects/{project_id}/members/{user_id}")
-def update_project_member(project_id: int, user_id: int, payload: Dict[str, Any]) -> Dict[str, Any]:
+async def update_project_member(project_id: int, user_id: int, payload: Dict[str, Any], request: Request) -> Dict[str, Any]:
     member = next(
         (item for item in store.data["project_members"] if item.get("projectId") == project_id and item.get("userId") == user_id),
         None,
     )
     if not member:
         raise HTTPException(status_code=404, detail="成员不存在")
-    member.update(payload)
-    store.save()
+    await run_in_threadpool(apply_patch, request, "project_members", member, payload)
+    permission_engine.invalidate(user_id)
+    await store.save_async()
     return member
 
 
 @app.delete("/api/projects/{project_id}/members/{user_id}")
-def delete_project_member(project_id: int, user_id: int) -> Dict[str, Any]:
-    before = len(store.data["project_members"])
-    store.data["project_members"] = [
-        item for item in store.data["project_members"] if not (item.get("projectId") == project_id and item.get("userId") == user_id)
+async def delete_project_member(project_id: int, user_id: int) -> Dict[str, Any]:
+    removed = [
+        item for item in store.data["project_members"] if item.get("projectId") == project_id and item.get("userId") == user_id
     ]
-    if before == len(store.data["project_members"]):
+    if not removed:
         raise HTTPException(status_code=404, detail="成员不存在")
-    store.save()
+    await run_in_threadpool(store.remove, "project_members", removed)
+    permission_engine.invalidate(user_id)
+    await store.save_async()
     return {"status": "deleted"}
 
 
 @app.get("/api/projects/{project_id}/tree")
+@depends_on("projects", "folders", cache=True)
 def project_tree(project_id: int) -> Dict[str, Any]:
     ensure_exists("projects", project_id)
     folders = [folder for folder in store.data["folders"] if folder.get("projectId") == project_id]
@@ -174,6 +530,7 @@ def project_tree(project_id: int) -> Dict[str, Any]:
 
 
 @app.get("/api/folders/{folder_id}/assets")
+@depends_on("folders", "assets")
 def folder_assets(folder_id: int) -> Dict[str, Any]:
     ensure_exists("folders", folder_id)
     assets = [asset for asset in store.data["assets"] if asset.get("folderId") == folder_id]
@@ -181,19 +538,17 @@ def folder_assets(folder_id: int) -> Dict[str, Any]:
 
 
 @app.post("/api/folders")
-def create_folder(payload: Dict[str, Any]) -> Dict[str, Any]:
-    folder_id = store.next_id("folders")
-    payload["id"] = folder_id
-    store.get_collection("folders").append(payload)
-    store.save()
+async def create_folder(payload: Dict[str, Any]) -> Dict[str, Any]:
+    await run_in_threadpool(store.insert, "folders", payload)
+    await store.save_async()
     return payload
 
 
 @app.patch("/api/folders/{folder_id}")
-def update_folder(folder_id: int, payload: Dict[str, Any]) -> Dict[str, Any]:
+async def update_folder(folder_id: int, payload: Dict[str, Any], request: Request) -> Dict[str, Any]:
     folder = ensure_exists("folders", folder_id)
-    folder.update(payload)
-    store.save()
+    await run_in_threadpool(apply_patch, request, "folders", folder, payload)
+    await store.save_async()
     return folder
 
 
@@ -204,8 +559,8 @@ def delete_folder(folder_id: int) -> Dict[str, Any]:
     has_assets = any(asset.get("folderId") == folder_id for asset in store.data["assets"])
     if has_child or has_assets:
         raise HTTPException(status_code=400, detail="目录非空，无法删除")
-    store.data["folders"] = [folder for folder in store.data["folders"] if folder.get("id") != folder_id]
-    store.save()
+    store.delete_by_id("folders", folder_id)
+    store.schedule_save()
     return {"status": "deleted"}
 
 
@@ -214,112 +569,198 @@ def batch_asset_operation(payload: Dict[str, Any]) -> Dict[str, Any]:
     action = payload.get("action")
     asset_ids: List[int] = payload.get("assetIds", [])
     updated: List[Dict[str, Any]] = []
-    for asset_id in asset_ids:
-        asset = store.find_by_id("assets", asset_id)
-        if not asset:
-            continue
-        if action == "move":
-            asset["folderId"] = payload.get("targetFolderId", asset.get("folderId"))
-        elif action == "delete":
-            store.delete_by_id("assets", asset_id)
-        elif action == "tag":
-            tags = payload.get("tags", [])
-            asset.setdefault("tags", [])
-            asset["tags"] = list(set(asset["tags"]) | set(tags))
-        updated.append(asset)
-    store.save()
+    with store.lock:
+        by_id = store.index("assets", "id")
+        for asset_id in dict.fromkeys(asset_ids):
+            asset = next(iter(by_id.get(asset_id, ())), None)
+            if not asset:
+                continue
+            if action == "move":
+                asset["folderId"] = payload.get("targetFolderId", asset.get("folderId"))
+            elif action == "tag":
+                tags = payload.get("tags", [])
+                asset.setdefault("tags", [])
+                asset["tags"] = list(set(asset["tags"]) | set(tags))
+            if action != "delete":
+                store.mark_changed("assets", asset)
+            updated.append(asset)
+        if action == "delete" and updated:
+            store.remove("assets", updated)
+    if action == "delete":
+        for asset in updated:
+            cold_cache.forget(asset["id"])
+    store.schedule_save()
     return {"items": updated}
 
 
 @app.get("/api/assets/{asset_id}")
+@depends_on("assets", record="asset_id")
 def get_asset(asset_id: int) -> Dict[str, Any]:
-    return ensure_exists("assets", asset_id)
+    asset = ensure_exists("assets", asset_id)
+    previews = {"thumbnailUrl": f"/api/assets/{asset_id}/thumbnail"}
+    if asset.get("fileType") == "video":
+        previews["proxyUrl"] = f"/api/assets/{asset_id}/thumbnail?kind=proxy"
+    return {**asset, **previews}
+
+
+@app.get("/api/assets/{asset_id}/thumbnail")
+def asset_thumbnail(asset_id: int, request: Request, kind: str = "thumb", wait: float = 2.0) -> Response:
+    if kind not in KINDS:
+        raise HTTPException(status_code=400, detail="不支持的预览类型")
+    asset = ensure_exists("assets", asset_id)
+    key, path = thumbnails.lookup(asset, kind)
+    if path is None:
+        future = thumbnails.submit(asset, kind)
+        if future is not None:
+            try:
+                path = future.result(timeout=min(max(wait, 0), 10))
+            except FutureTimeoutError:
+                return Response(status_code=202, headers={"Retry-After": "2"})
+    media_type = "video/mp4" if kind == "proxy" else "image/jpeg"
+    if path is not None and key:
+        return serve_cached_file(request, path, media_type, f'"{key}"')
+    if kind == "proxy":
+        raise HTTPException(status_code=404, detail="暂无代理文件")
+    body = placeholder_svg(asset)
+    etag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+    headers = {"ETag": etag, "Cache-Control": "private, max-age=300"}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="image/svg+xml", headers=headers)
+
+
+@app.get("/api/thumbnails/status")
+async def thumbnail_status() -> Dict[str, Any]:
+    return thumbnails.snapshot()
 
 
 @app.patch("/api/assets/{asset_id}/meta")
-def update_asset_meta(asset_id: int, payload: Dict[str, Any]) -> Dict[str, Any]:
+def update_asset_meta(asset_id: int, payload: Dict[str, Any], request: Request) -> Dict[str, Any]:
     asset = ensure_exists("assets", asset_id)
-    asset.update(payload)
-    asset["updatedAt"] = iso_now()
-    store.save()
+    apply_patch(request, "assets", asset, payload, updatedAt=iso_now())
+    store.schedule_save()
     return asset
 
 
 @app.post("/api/assets/{asset_id}/restore")
-def restore_asset(asset_id: int) -> Dict[str, Any]:
+def restore_asset(asset_id: int, payload: Dict[str, Any] = Body(default={})) -> Dict[str, Any]:
     asset = ensure_exists("assets", asset_id)
-    asset["localPresence"] = "both"
-    store.save()
-    return {"status": "restoring", "asset": asset}
+    if asset.get("tierLevel") != "cold":
+        asset["localPresence"] = "both"
+        store.mark_changed("assets", asset)
+        store.schedule_save()
+        return {"status": "restoring", "asset": asset}
+    task = restore_queue.submit(
+        [asset],
+        initiator=payload.get("initiator"),
+        priority=payload.get("priority", "normal"),
+        prefetch=payload.get("prefetch", True),
+    )
+    store.schedule_save()
+    if task["status"] == "success":
+        return {"status": "cached", "asset": asset, "task": task}
+    return {"status": "restoring", "asset": asset, "task": task}
 
 
 @app.get("/api/import/devices")
-def list_import_devices() -> Dict[str, Any]:
+@depends_on("import_devices")
+async def list_import_devices() -> Dict[str, Any]:
     return {"items": store.data.get("import_devices", [])}
 
 
 @app.post("/api/import/tasks")
-def create_import_task(payload: Dict[str, Any]) -> Dict[str, Any]:
-    task_id = store.next_id("import_tasks")
-    payload["id"] = task_id
+async def create_import_task(payload: Dict[str, Any]) -> Dict[str, Any]:
     payload.setdefault("status", "pending")
     payload.setdefault("createdAt", iso_now())
-    store.get_collection("import_tasks").append(payload)
-    store.save()
+    auto_start = payload.pop("autoStart", True)
+    await run_in_threadpool(store.insert, "import_tasks", payload)
+    await store.save_async()
+    if auto_start and importer.device(payload.get("sourceDevice")):
+        await run_in_threadpool(importer.submit, payload)
     return payload
 
 
 @app.get("/api/import/tasks")
-def list_import_tasks() -> Dict[str, Any]:
+@depends_on("import_tasks")
+async def list_import_tasks() -> Dict[str, Any]:
     return {"items": store.data["import_tasks"]}
 
 
 @app.get("/api/import/tasks/{task_id}")
-def get_import_task(task_id: int) -> Dict[str, Any]:
+@depends_on("import_tasks")
+async def get_import_task(task_id: int) -> Dict[str, Any]:
     return ensure_exists("import_tasks", task_id)
 
 
 @app.post("/api/import/tasks/{task_id}/retry")
-def retry_import_task(task_id: int) -> Dict[str, Any]:
+async def retry_import_task(task_id: int) -> Dict[str, Any]:
     task = ensure_exists("import_tasks", task_id)
-    task["status"] = "running"
-    task["startedAt"] = iso_now()
-    store.save()
+    if not await run_in_threadpool(importer.submit, task):
+        raise HTTPException(status_code=409, detail="导入任务正在执行")
     return task
 
 
+@app.post("/api/metadata/extract")
+def extract_asset_metadata(payload: Dict[str, Any]) -> Dict[str, Any]:
+    asset_ids = payload.get("assetIds")
+    if asset_ids is None:
+        asset_ids = [asset["id"] for asset in store.data["assets"] if asset.get("storagePath")]
+    queued = metadata_extractor.submit(asset_ids, force=payload.get("force", False))
+    return {"queued": queued}
+
+
+@app.get("/api/metadata/status")
+async def metadata_status() -> Dict[str, Any]:
+    return metadata_extractor.snapshot()
+
+
 @app.post("/api/assets/search")
-def search_assets(payload: Dict[str, Any]) -> Dict[str, Any]:
-    keyword = payload.get("keyword")
-    project_ids = payload.get("projectIds")
-    tier_level = payload.get("tierLevel")
-    file_type = payload.get("fileType")
-    results = []
-    for asset in store.data["assets"]:
-        if keyword and keyword not in (asset.get("fileName", "") + asset.get("projectName", "") + asset.get("clientName", "")):
-            continue
-        if project_ids and asset.get("projectId") not in project_ids:
-            continue
-        if tier_level and asset.get("tierLevel") != tier_level:
-            continue
-        if file_type and asset.get("fileType") != file_type:
-            continue
-        results.append(asset)
-    return {"items": results, "total": len(results)}
+def search_assets(payload: Dict[str, Any], request: Request) -> Dict[str, Any]:
+    # 等值条件（同一字段可传列表表示“或”）由分面位图求交，关键字只在剩余候选中匹配；
+    # query 为可组合的条件树（范围、标签 any / all、and / or / not），由查询规划器按选择性求值；
+    # facets 为 true 或字段名列表时同时返回各取值的计数，sort 排序，offset / limit 对结果分页，
+    # explain 为 true 时返回执行计划
+    requested = payload.get("facets")
+    facets = FACET_FIELDS if requested is True else as_list(requested)
+    try:
+        offset = max(0, int(payload.get("offset") or 0))
+        limit = None if payload.get("limit") is None else max(0, int(payload["limit"]))
+        facet_limit = int(payload.get("facetLimit") or FACET_LIMIT)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="offset / limit / facetLimit 应为整数")
+    try:
+        filters, keyword, query = search_conditions(payload)
+        sort = parse_sort(payload.get("sort"))
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    result = asset_facets.search(
+        filters,
+        keyword,
+        visible_project_ids(request, "perm.asset.search"),
+        facets,
+        facet_limit,
+        offset,
+        limit,
+        query,
+        sort,
+        bool(payload.get("explain")),
+    )
+    if not requested:
+        result.pop("facets")
+    return result
 
 
 @app.post("/api/search/views")
-def create_search_view(payload: Dict[str, Any]) -> Dict[str, Any]:
-    view_id = store.next_id("search_views")
-    payload["id"] = view_id
+async def create_search_view(payload: Dict[str, Any]) -> Dict[str, Any]:
     payload.setdefault("lastUsedAt", iso_now())
-    store.get_collection("search_views").append(payload)
-    store.save()
+    await run_in_threadpool(store.insert, "search_views", payload)
+    await store.save_async()
     return payload
 
 
 @app.get("/api/search/views")
-def list_search_views(userId: Optional[int] = Query(default=None, alias="userId")) -> Dict[str, Any]:
+@depends_on("search_views")
+async def list_search_views(userId: Optional[int] = Query(default=None, alias="userId")) -> Dict[str, Any]:
     views = store.data["search_views"]
     if userId is not None:
         views = [view for view in views if view.get("userId") == userId]
@@ -327,59 +768,87 @@ def list_search_views(userId: Optional[int] = Query(default=None, alias="userId"
 
 
 @app.patch("/api/search/views/{view_id}")
-def update_search_view(view_id: int, payload: Dict[str, Any]) -> Dict[str, Any]:
+async def update_search_view(view_id: int, payload: Dict[str, Any], request: Request) -> Dict[str, Any]:
     view = ensure_exists("search_views", view_id)
-    view.update(payload)
-    store.save()
+    await run_in_threadpool(apply_patch, request, "search_views", view, payload)
+    await store.save_async()
     return view
 
 
+@app.post("/api/search/views/{view_id}/open")
+async def open_search_view(
+    view_id: int, request: Request, payload: Dict[str, Any] = Body(default={})
+) -> Dict[str, Any]:
+    # 打开视图：materialized 视图直接读取增量维护的结果集，newSinceLastVisit 为上次打开后进入视图的素材数；
+    # 随后把 lastUsedAt / useCount 记为本次使用
+    view = ensure_exists("search_views", view_id)
+    try:
+        offset = max(0, int(payload.get("offset") or 0))
+        limit = None if payload.get("limit") is None else max(0, int(payload["limit"]))
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="offset / limit 必须为整数")
+    visible = visible_project_ids(request, "perm.asset.search")
+    try:
+        opened = await run_in_threadpool(saved_views.open, view, visible)
+        page = view_page(
+            view, opened["members"], opened["visit"], bool(payload.get("onlyNew")), offset, limit
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    last_visit = view.get("lastUsedAt")
+    await run_in_threadpool(saved_views.visited, view)
+    # 使用记录只是簿记，合并到后台保存，打开视图不等待整份文档落盘
+    store.schedule_save()
+    return {**page, "materialized": opened["materialized"], "lastVisitAt": last_visit, "view": view}
+
+
 @app.delete("/api/search/views/{view_id}")
-def delete_search_view(view_id: int) -> Dict[str, Any]:
-    deleted = store.delete_by_id("search_views", view_id)
+async def delete_search_view(view_id: int) -> Dict[str, Any]:
+    deleted = await run_in_threadpool(store.delete_by_id, "search_views", view_id)
     if not deleted:
         raise HTTPException(status_code=404, detail="视图不存在")
-    store.save()
+    await store.save_async()
     return {"status": "deleted"}
 
 
 @app.get("/api/sync-tasks")
-def list_sync_tasks() -> Dict[str, Any]:
+@depends_on("sync_tasks")
+async def list_sync_tasks() -> Dict[str, Any]:
     return {"items": store.data["sync_tasks"]}
 
 
 @app.post("/api/sync-tasks")
-def create_sync_task(payload: Dict[str, Any]) -> Dict[str, Any]:
-    task_id = store.next_id("sync_tasks")
-    payload["id"] = task_id
+async def create_sync_task(payload: Dict[str, Any]) -> Dict[str, Any]:
     payload.setdefault("enabled", True)
-    store.get_collection("sync_tasks").append(payload)
-    store.save()
+    await run_in_threadpool(store.insert, "sync_tasks", payload)
+    await store.save_async()
     return payload
 
 
 @app.patch("/api/sync-tasks/{task_id}")
-def update_sync_task(task_id: int, payload: Dict[str, Any]) -> Dict[str, Any]:
+async def update_sync_task(task_id: int, payload: Dict[str, Any], request: Request) -> Dict[str, Any]:
     task = ensure_exists("sync_tasks", task_id)
-    task.update(payload)
-    store.save()
+    await run_in_threadpool(apply_patch, request, "sync_tasks", task, payload)
+    await store.save_async()
     return task
 
 
 @app.patch("/api/sync-tasks/{task_id}/enable")
-def toggle_sync_task(task_id: int, payload: Dict[str, Any]) -> Dict[str, Any]:
+async def toggle_sync_task(task_id: int, payload: Dict[str, Any], request: Request) -> Dict[str, Any]:
     task = ensure_exists("sync_tasks", task_id)
-    task["enabled"] = payload.get("enabled", True)
-    store.save()
+    expected = expected_version(request, payload)
+    try:
+        await run_in_threadpool(store.apply_update, "sync_tasks", task, {"enabled": payload.get("enabled", True)}, expected)
+    except VersionConflict as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+    await store.save_async()
     return task
 
 
 @app.post("/api/sync-tasks/{task_id}/run")
-def run_sync_task(task_id: int) -> Dict[str, Any]:
+async def run_sync_task(task_id: int) -> Dict[str, Any]:
     task = ensure_exists("sync_tasks", task_id)
-    job_id = store.next_id("sync_jobs")
     job = {
-        "id": job_id,
         "taskId": task_id,
         "taskName": task.get("name"),
         "startedAt": iso_now(),
@@ -389,21 +858,22 @@ def run_sync_task(task_id: int) -> Dict[str, Any]:
         "successFiles": 0,
         "failedFiles": 0,
     }
-    store.get_collection("sync_jobs").append(job)
-    store.save()
+    await run_in_threadpool(store.insert, "sync_jobs", job)
+    await store.save_async()
     return job
 
 
 @app.delete("/api/sync-tasks/{task_id}")
-def delete_sync_task(task_id: int) -> Dict[str, Any]:
-    deleted = store.delete_by_id("sync_tasks", task_id)
+async def delete_sync_task(task_id: int) -> Dict[str, Any]:
+    deleted = await run_in_threadpool(store.delete_by_id, "sync_tasks", task_id)
     if not deleted:
         raise HTTPException(status_code=404, detail="任务不存在")
-    store.save()
+    await store.save_async()
     return {"status": "deleted"}
 
 
 @app.get("/api/sync-jobs")
+@depends_on("sync_jobs")
 def list_sync_jobs(taskId: Optional[int] = Query(default=None, alias="taskId")) -> Dict[str, Any]:
     jobs = store.data["sync_jobs"]
     if taskId is not None:
@@ -412,117 +882,196 @@ def list_sync_jobs(taskId: Optional[int] = Query(default=None, alias="taskId"))
 
 
 @app.get("/api/sync-jobs/{job_id}")
-def get_sync_job(job_id: int) -> Dict[str, Any]:
+@depends_on("sync_jobs", record="job_id")
+async def get_sync_job(job_id: int) -> Dict[str, Any]:
     return ensure_exists("sync_jobs", job_id)
 
 
+@app.patch("/api/sync-jobs/{job_id}")
+async def update_sync_job(job_id: int, payload: Dict[str, Any], request: Request) -> Dict[str, Any]:
+    # 同步执行端回报作业进度与结果；进入终态时同时更新所属任务的最近执行状态
+    job = ensure_exists("sync_jobs", job_id)
+    status = payload.get("status", job.get("status"))
+    extra: Dict[str, Any] = {}
+    if status not in ("running", "queued"):
+        extra["finishedAt"] = payload.get("finishedAt") or job.get("finishedAt") or iso_now()
+    await run_in_threadpool(apply_patch, request, "sync_jobs", job, payload, **extra)
+    task = store.find_by_id("sync_tasks", job.get("taskId")) if extra else None
+    if task:
+        await run_in_threadpool(store.apply_update, "sync_tasks", task, {"lastRunStatus": job["status"], "lastRunAt": job["finishedAt"]})
+    await store.save_async()
+    return job
+
+
 @app.get("/api/tier-policies")
-def list_tier_policies() -> Dict[str, Any]:
+@depends_on("tier_policies")
+async def list_tier_policies() -> Dict[str, Any]:
     return {"items": store.data["tier_policies"]}
 
 
 @app.post("/api/tier-policies")
 def create_tier_policy(payload: Dict[str, Any]) -> Dict[str, Any]:
-    policy_id = store.next_id("tier_policies")
-    payload["id"] = policy_id
-    store.get_collection("tier_policies").append(payload)
-    store.save()
+    store.insert("tier_policies", payload)
+    cold_cache.rebalance()
+    store.schedule_save()
     return payload
 
 
 @app.patch("/api/tier-policies/{policy_id}")
-def update_tier_policy(policy_id: int, payload: Dict[str, Any]) -> Dict[str, Any]:
+def update_tier_policy(policy_id: int, payload: Dict[str, Any], request: Request) -> Dict[str, Any]:
     policy = ensure_exists("tier_policies", policy_id)
-    policy.update(payload)
-    store.save()
+    apply_patch(request, "tier_policies", policy, payload)
+    cold_cache.rebalance()
+    store.schedule_save()
     return policy
 
 
 @app.patch("/api/projects/{project_id}/tier-policy")
-def update_project_tier_policy(project_id: int, payload: Dict[str, Any]) -> Dict[str, Any]:
+def update_project_tier_policy(project_id: int, payload: Dict[str, Any], request: Request) -> Dict[str, Any]:
     project = ensure_exists("projects", project_id)
     existing = next((p for p in store.data["tier_policies"] if p.get("projectId") == project_id), None)
     if existing:
-        existing.update(payload)
-        policy = existing
+        policy = apply_patch(request, "tier_policies", existing, payload)
     else:
-        policy_id = store.next_id("tier_policies")
-        policy = {
-            "id": policy_id,
-            "type": "project",
-            "projectId": project_id,
-            "projectName": project.get("name"),
-            **payload,
-        }
-        store.get_collection("tier_policies").append(policy)
-    store.save()
+        payload.pop("expectedVersion", None)
+        payload.pop("version", None)
+        policy = {"type": "project", "projectId": project_id, "projectName": project.get("name"), **payload}
+        store.insert("tier_policies", policy)
+    cold_cache.rebalance()
+    store.schedule_save()
     return policy
 
 
 @app.get("/api/restore/tasks")
-def list_restore_tasks() -> Dict[str, Any]:
+@depends_on("restore_tasks")
+async def list_restore_tasks() -> Dict[str, Any]:
     return {"items": store.data["restore_tasks"]}
 
 
+@app.post("/api/restore/tasks")
+def create_restore_task(payload: Dict[str, Any]) -> Dict[str, Any]:
+    folder_id = payload.get("folderId")
+    if folder_id is not None:
+        ensure_exists("folders", folder_id)
+        assets = [asset for asset in store.data["assets"] if asset.get("folderId") == folder_id and asset.get("tierLevel") == "cold"]
+        object_type = "folder"
+    else:
+        # 只接受冷层素材：热 / 温层素材已在本地，放入冷数据缓存后会在淘汰时被误标为仅云端
+        by_id = store.index("assets", "id")
+        assets = [
+            asset
+            for asset_id in dict.fromkeys(payload.get("assetIds", []))
+            for asset in by_id.get(asset_id, ())
+            if asset.get("tierLevel") == "cold"
+        ]
+        object_type = "asset"
+    if not assets:
+        raise HTTPException(status_code=400, detail="没有可回迁的冷数据素材")
+    task = restore_queue.submit(
+        assets,
+        initiator=payload.get("initiator"),
+        priority=payload.get("priority", "normal"),
+        prefetch=payload.get("prefetch", True),
+        object_type=object_type,
+    )
+    store.schedule_save()
+    return task
+
+
+@app.get("/api/restore/queue")
+async def restore_queue_status() -> Dict[str, Any]:
+    return restore_queue.snapshot()
+
+
+@app.get("/api/restore/cache")
+async def cold_cache_stats() -> Dict[str, Any]:
+    return cold_cache.snapshot()
+
+
 @app.get("/api/restore/tasks/{task_id}")
-def get_restore_task(task_id: int) -> Dict[str, Any]:
+@depends_on("restore_tasks", record="task_id")
+async def get_restore_task(task_id: int) -> Dict[str, Any]:
     return ensure_exists("restore_tasks", task_id)
 
 
 @app.post("/api/restore/tasks/{task_id}/retry")
-def retry_restore_task(task_id: int) -> Dict[str, Any]:
+def retry_restore_task(task_id: int, payload: Dict[str, Any] = Body(default={})) -> Dict[str, Any]:
     task = ensure_exists("restore_tasks", task_id)
-    task["status"] = "running"
-    task["startedAt"] = iso_now()
-    task["finishedAt"] = None
-    store.save()
+    assets = resolve_task_assets(store, task)
+    if not assets:
+        raise HTTPException(status_code=400, detail="没有可回迁的冷数据素材")
+    restore_queue.submit(
+        assets,
+        priority=payload.get("priority", task.get("priority", "normal")),
+        prefetch=False,
+        task=task,
+    )
+    store.schedule_save()
     return task
 
 
 @app.get("/api/disks")
-def list_disks() -> Dict[str, Any]:
+@depends_on("disks")
+async def list_disks() -> Dict[str, Any]:
     return {"items": store.data["disks"]}
 
 
 @app.get("/api/disks/{disk_id}")
-def get_disk(disk_id: int) -> Dict[str, Any]:
+@depends_on("disks", record="disk_id")
+async def get_disk(disk_id: int) -> Dict[str, Any]:
     return ensure_exists("disks", disk_id)
 
 
+@app.patch("/api/disks/{disk_id}")
+async def update_disk(disk_id: int, payload: Dict[str, Any], request: Request) -> Dict[str, Any]:
+    disk = ensure_exists("disks", disk_id)
+    await run_in_threadpool(apply_patch, request, "disks", disk, payload)
+    await store.save_async()
+    return disk
+
+
 @app.get("/api/storage/arrays")
-def list_storage_arrays() -> Dict[str, Any]:
+@depends_on("storage_arrays")
+async def list_storage_arrays() -> Dict[str, Any]:
     return {"items": store.data["storage_arrays"]}
 
 
 @app.post("/api/storage/arrays")
-def create_storage_array(payload: Dict[str, Any]) -> Dict[str, Any]:
-    array_id = store.next_id("storage_arrays")
-    payload["id"] = array_id
-    store.get_collection("storage_arrays").append(payload)
-    store.save()
+async def create_storage_array(payload: Dict[str, Any]) -> Dict[str, Any]:
+    await run_in_threadpool(store.insert, "storage_arrays", payload)
+    await store.save_async()
     return payload
 
 
 @app.get("/api/storage/volumes")
-def list_storage_volumes() -> Dict[str, Any]:
+@depends_on("storage_volumes")
+async def list_storage_volumes() -> Dict[str, Any]:
     return {"items": store.data["storage_volumes"]}
 
 
 @app.post("/api/storage/volumes")
-def create_storage_volume(payload: Dict[str, Any]) -> Dict[str, Any]:
-    volume_id = store.next_id("storage_volumes")
-    payload["id"] = volume_id
-    store.get_collection("storage_volumes").append(payload)
-    store.save()
+async def create_storage_volume(payload: Dict[str, Any]) -> Dict[str, Any]:
+    await run_in_threadpool(store.insert, "storage_volumes", payload)
+    await store.save_async()
     return payload
 
 
+@app.patch("/api/storage/volumes/{volume_id}")
+async def update_storage_volume(volume_id: int, payload: Dict[str, Any], request: Request) -> Dict[str, Any]:
+    volume = ensure_exists("storage_volumes", volume_id)
+    await run_in_threadpool(apply_patch, request, "storage_volumes", volume, payload)
+    await store.save_async()
+    return volume
+
+
 @app.get("/api/storage/capacity/summary")
+@depends_on("projects", "assets", "disks", "sync_jobs", "alerts", cache=True)
 def storage_capacity_summary() -> Dict[str, Any]:
     return store.dashboard_overview().get("capacitySummary", {})
 
 
 @app.get("/api/storage/capacity/by-project")
+@depends_on("projects", "assets", cache=True)
 def storage_capacity_by_project() -> Dict[str, Any]:
     assets = store.data["assets"]
     breakdown: Dict[int, Dict[str, Any]] = {}
@@ -538,7 +1087,8 @@ def storage_capacity_by_project() -> Dict[str, Any]:
 
 
 @app.get("/api/storage-targets")
-def list_storage_targets(type: Optional[str] = None) -> Dict[str, Any]:
+@depends_on("storage_targets")
+async def list_storage_targets(type: Optional[str] = None) -> Dict[str, Any]:
     targets = store.data["storage_targets"]
     if type:
         targets = [target for target in targets if target.get("type") == type]
@@ -546,39 +1096,37 @@ def list_storage_targets(type: Optional[str] = None) -> Dict[str, Any]:
 
 
 @app.post("/api/storage-targets")
-def create_storage_target(payload: Dict[str, Any]) -> Dict[str, Any]:
-    target_id = store.next_id("storage_targets")
-    payload["id"] = target_id
-    store.get_collection("storage_targets").append(payload)
-    store.save()
+async def create_storage_target(payload: Dict[str, Any]) -> Dict[str, Any]:
+    await run_in_threadpool(store.insert, "storage_targets", payload)
+    await store.save_async()
     return payload
 
 
 @app.patch("/api/storage-targets/{target_id}")
-def update_storage_target(target_id: int, payload: Dict[str, Any]) -> Dict[str, Any]:
+async def update_storage_target(target_id: int, payload: Dict[str, Any], request: Request) -> Dict[str, Any]:
     target = ensure_exists("storage_targets", target_id)
-    target.update(payload)
-    store.save()
+    await run_in_threadpool(apply_patch, request, "storage_targets", target, payload)
+    await store.save_async()
     return target
 
 
 @app.delete("/api/storage-targets/{target_id}")
-def delete_storage_target(target_id: int) -> Dict[str, Any]:
-    deleted = store.delete_by_id("storage_targets", target_id)
+async def delete_storage_target(target_id: int) -> Dict[str, Any]:
+    deleted = await run_in_threadpool(store.delete_by_id, "storage_targets", target_id)
     if not deleted:
         raise HTTPException(status_code=404, detail="存储目标不存在")
-    store.save()
+    await store.save_async()
     return {"status": "deleted"}
 
 
 @app.post("/api/storage-targets/{target_id}/test")
-def test_storage_target(target_id: int) -> Dict[str, Any]:
+async def test_storage_target(target_id: int) -> Dict[str, Any]:
     ensure_exists("storage_targets", target_id)
     return {"status": "ok", "testedAt": iso_now()}
 
 
 @app.post("/api/netdisk/{provider}/bind")
-def bind_netdisk(provider: str, payload: Dict[str, Any] = Body(default={})) -> Dict[str, Any]:
+async def bind_netdisk(provider: str, payload: Dict[str, Any] = Body(default={})) -> Dict[str, Any]:
     session_id = f"session-{len(store.data['netdisk_sessions']) + 1}"
     store.data["netdisk_sessions"][session_id] = {
         "provider": provider,
@@ -586,12 +1134,12 @@ def bind_netdisk(provider: str, payload: Dict[str, Any] = Body(default={})) -> D
         "createdAt": iso_now(),
         "account": payload.get("account"),
     }
-    store.save()
+    await store.save_async()
     return {"sessionId": session_id}
 
 
 @app.get("/api/netdisk/{provider}/bind/status")
-def netdisk_bind_status(provider: str, session: str) -> Dict[str, Any]:
+async def netdisk_bind_status(provider: str, session: str) -> Dict[str, Any]:
     data = store.data.get("netdisk_sessions", {}).get(session)
     if not data or data.get("provider") != provider:
         raise HTTPException(status_code=404, detail="会话不存在")
@@ -599,88 +1147,273 @@ def netdisk_bind_status(provider: str, session: str) -> Dict[str, Any]:
 
 
 @app.get("/api/users")
-def list_users() -> Dict[str, Any]:
+@depends_on("users")
+async def list_users() -> Dict[str, Any]:
     return {"items": store.data["users"]}
 
 
 @app.post("/api/users")
-def create_user(payload: Dict[str, Any]) -> Dict[str, Any]:
-    user_id = store.next_id("users")
-    payload["id"] = user_id
+async def create_user(payload: Dict[str, Any]) -> Dict[str, Any]:
     payload.setdefault("status", "enabled")
-    store.get_collection("users").append(payload)
-    store.save()
+    await run_in_threadpool(store.insert, "users", payload)
+    permission_engine.invalidate(payload["id"])
+    await store.save_async()
     return payload
 
 
 @app.patch("/api/users/{user_id}")
-def update_user(user_id: int, payload: Dict[str, Any]) -> Dict[str, Any]:
+async def update_user(user_id: int, payload: Dict[str, Any], request: Request) -> Dict[str, Any]:
     user = ensure_exists("users", user_id)
-    user.update(payload)
-    store.save()
+    await run_in_threadpool(apply_patch, request, "users", user, payload)
+    permission_engine.invalidate(user_id)
+    await store.save_async()
     return user
 
 
 @app.post("/api/users/{user_id}/reset-password")
-def reset_password(user_id: int) -> Dict[str, Any]:
+async def reset_password(user_id: int) -> Dict[str, Any]:
     ensure_exists("users", user_id)
     return {"status": "reset", "updatedAt": iso_now()}
 
 
 @app.get("/api/roles")
-def list_roles() -> Dict[str, Any]:
+@depends_on("roles")
+async def list_roles() -> Dict[str, Any]:
     return {"items": store.data["roles"]}
 
 
 @app.post("/api/roles")
-def create_role(payload: Dict[str, Any]) -> Dict[str, Any]:
-    role_id = store.next_id("roles")
-    payload["id"] = role_id
-    store.get_collection("roles").append(payload)
-    store.save()
+async def create_role(payload: Dict[str, Any]) -> Dict[str, Any]:
+    await run_in_threadpool(store.insert, "roles", payload)
+    await store.save_async()
     return payload
 
 
 @app.patch("/api/roles/{role_id}")
-def update_role(role_id: int, payload: Dict[str, Any]) -> Dict[str, Any]:
+async def update_role(role_id: int, payload: Dict[str, Any], request: Request) -> Dict[str, Any]:
     role = ensure_exists("roles", role_id)
-    role.update(payload)
-    store.save()
+    await run_in_threadpool(apply_patch, request, "roles", role, payload)
+    permission_engine.invalidate()
+    await store.save_async()
     return role
 
 
 @app.delete("/api/roles/{role_id}")
-def delete_role(role_id: int) -> Dict[str, Any]:
-    deleted = store.delete_by_id("roles", role_id)
+async def delete_role(role_id: int) -> Dict[str, Any]:
+    deleted = await run_in_threadpool(store.delete_by_id, "roles", role_id)
     if not deleted:
         raise HTTPException(status_code=404, detail="角色不存在")
-    store.save()
+    permission_engine.invalidate()
+    await store.save_async()
     return {"status": "deleted"}
 
 
+@app.get("/api/users/{user_id}/permissions")
+@depends_on("users", "roles", "project_members", "permissions")
+async def user_permissions(user_id: int, projectId: Optional[int] = Query(default=None, alias="projectId")) -> Dict[str, Any]:
+    ensure_exists("users", user_id)
+    projects = permission_engine.visible_projects(user_id)
+    return {
+        "userId": user_id,
+        "projectId": projectId,
+        "items": permission_engine.effective(user_id, projectId),
+        "projects": None if projects is None else sorted(projects),
+    }
+
+
 @app.get("/api/permissions")
-def list_permissions() -> Dict[str, Any]:
+@depends_on("permissions")
+async def list_permissions() -> Dict[str, Any]:
     return {"items": store.data["permissions"]}
 
 
+@app.post("/api/permissions/check")
+async def check_permission(payload: Dict[str, Any]) -> Dict[str, Any]:
+    user_id = payload.get("userId")
+    permission = payload.get("permission")
+    if user_id is None or not permission:
+        raise HTTPException(status_code=400, detail="缺少 userId 或 permission")
+    return {"allowed": permission_engine.allowed(user_id, permission, payload.get("projectId"))}
+
+
 @app.get("/api/audit/logs")
-def audit_logs(user: Optional[str] = None) -> Dict[str, Any]:
-    logs = store.data["audit_logs"]
-    if user:
-        logs = [log for log in logs if log.get("user") == user]
+def audit_logs(
+    user: Optional[str] = None,
+    action: Optional[str] = None,
+    targetType: Optional[str] = Query(default=None, alias="targetType"),
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    limit: int = Query(default=200, ge=1, le=5000),
+) -> Dict[str, Any]:
+    logs = audit_log.query({"user": user, "action": action, "targetType": targetType}, start, end, limit)
     return {"items": logs}
 
 
 @app.get("/api/system/logs")
-def system_logs(level: Optional[str] = None) -> Dict[str, Any]:
-    logs = store.data["system_logs"]
-    if level:
-        logs = [log for log in logs if log.get("level") == level]
+def system_logs(
+    level: Optional[str] = None,
+    module: Optional[str] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    limit: int = Query(default=200, ge=1, le=5000),
+) -> Dict[str, Any]:
+    logs = system_log.query({"level": level, "module": module}, start, end, limit)
     return {"items": logs}
 
 
+@app.get("/api/system/profiler")
+async def profiler_status() -> Dict[str, Any]:
+    return profiler.snapshot()
+
+
+@app.post("/api/system/profiler")
+async def update_profiler_settings(payload: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        settings = profiler.configure(payload)
+    except (TypeError, ValueError) as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    store.data["settings"]["profiler"] = dict(settings)
+    await run_in_threadpool(store.mark_changed, "settings")
+    await store.save_async()
+    return settings
+
+
+@app.get("/api/system/profiler/flamegraph")
+async def profiler_flamegraph(
+    route: Optional[str] = None,
+    format: str = Query(default="folded", pattern="^(folded|json)$"),
+    limit: Optional[int] = Query(default=None, ge=1),
+) -> Any:
+    rows = profiler.flamegraph(route, limit)
+    if format == "json":
+        return {"items": [{"stack": stack, "count": count} for stack, count in rows]}
+    return PlainTextResponse("".join(f"{stack} {count}\n" for stack, count in rows))
+
+
+@app.delete("/api/system/profiler/flamegraph")
+async def reset_profiler() -> Dict[str, Any]:
+    profiler.reset()
+    return profiler.snapshot()
+
+
+@app.get("/api/system/slow-requests")
+async def slow_requests(route: Optional[str] = None, limit: int = Query(default=50, ge=1, le=1000)) -> Dict[str, Any]:
+    return {"items": profiler.slow_requests(limit, route)}
+
+
+@app.get("/api/system/denormalization")
+async def denormalization_status() -> Dict[str, Any]:
+    return denormalizer.snapshot()
+
+
+@app.post("/api/system/denormalization/reconcile")
+async def reconcile_denormalized_fields() -> Dict[str, Any]:
+    # 按项目当前的名称 / 客户重新传播一遍，修复历史数据中已过期的副本
+    queued = await run_in_threadpool(denormalizer.reconcile)
+    return {"queued": queued, **denormalizer.snapshot()}
+
+
+@app.get("/api/logs/status")
+async def log_storage_status() -> Dict[str, Any]:
+    return {"audit": audit_log.snapshot(), "system": system_log.snapshot(), "auditWriter": audit_writer.snapshot()}
+
+
+def parse_collections(collections: Optional[str]) -> Optional[Set[str]]:
+    return {name.strip() for name in collections.split(",") if name.strip()} if collections else None
+
+
+@app.get("/api/changes")
+async def list_changes(
+    since: int = Query(default=0, ge=0),
+    collections: Optional[str] = None,
+    id: Optional[int] = None,
+    limit: int = Query(default=500, ge=1, le=5000),
+) -> Dict[str, Any]:
+    head, reset, changes = change_feed.since(since, parse_collections(collections), id, limit)
+    return {"seq": head, "reset": reset, "items": [change[3] for change in changes]}
+
+
+@app.get("/api/changes/stream")
+async def stream_changes(
+    request: Request,
+    since: Optional[int] = Query(default=None, ge=0),
+    collections: Optional[str] = None,
+    id: Optional[int] = None,
+) -> StreamingResponse:
+    # 断线重连时浏览器会带上 Last-Event-ID，从该序号之后继续推送
+    last_event_id = request.headers.get("last-event-id")
+    if last_event_id and last_event_id.isdigit():
+        since = int(last_event_id)
+    return StreamingResponse(
+        change_feed.stream(since, parse_collections(collections), id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/api/search/status")
+async def search_index_status() -> Dict[str, Any]:
+    return {**asset_facets.snapshot(), "savedViews": saved_views.snapshot()}
+
+
+@app.get("/api/cache/status")
+async def response_cache_status() -> Dict[str, Any]:
+    return response_cache.snapshot()
+
+
+@app.get("/api/changes/status")
+async def change_feed_status() -> Dict[str, Any]:
+    return change_feed.snapshot()
+
+
+@app.get("/api/cluster/status")
+async def cluster_status() -> Dict[str, Any]:
+    status: Dict[str, Any] = {"role": STORE_ROLE, "pid": os.getpid()}
+    if replica is not None:
+        status.update(replica.snapshot())
+    return status
+
+
+@app.get("/api/cluster/changes")
+async def cluster_changes(
+    since: int = Query(default=0, ge=0), wait: float = Query(default=0.0, ge=0, le=60)
+) -> Dict[str, Any]:
+    # replica 增量同步：since 之后的全部变更，包括批量变更标记；暂无新变更时最多等待 wait 秒
+    await change_feed.wait(since, wait)
+    head, reset, changes = change_feed.since(since, bulk=True)
+    return {"seq": head, "reset": reset, "items": [change[3] for change in changes]}
+
+
+@app.get("/api/cluster/collections/{name}")
+def cluster_collection(name: str, ids: Optional[str] = None) -> Dict[str, Any]:
+    # 批量变更后 replica 按 id 取回最新记录（不存在的 id 表示已删除），未给出 id 时取回整个集合
+    wanted = {int(value) for value in ids.split(",") if value.isdigit()} if ids is not None else None
+    with store.lock:
+        seq = change_feed.seq
+        value = store.data.get(name)
+        if isinstance(value, list):
+            value = [dict(item) for item in value if wanted is None or item.get("id") in wanted]
+        else:
+            value = deepcopy(value)
+    return {"seq": seq, "value": value}
+
+
+@app.get("/api/cluster/snapshot")
+def cluster_snapshot() -> Dict[str, Any]:
+    # replica 启动或落后于变更缓冲区时的全量同步；seq 与文档在同一次加锁中取得
+    with store.lock:
+        return {"seq": change_feed.seq, "data": store.snapshot()}
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics() -> PlainTextResponse:
+    # Prometheus 文本格式；多进程部署时每个进程单独暴露自己的指标
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 @app.get("/api/alerts")
-def list_alerts(status: Optional[str] = None) -> Dict[str, Any]:
+@depends_on("alerts")
+async def list_alerts(status: Optional[str] = None) -> Dict[str, Any]:
     alerts = store.data["alerts"]
     if status:
         alerts = [alert for alert in alerts if alert.get("status") == status]
@@ -688,56 +1421,87 @@ def list_alerts(status: Optional[str] = None) -> Dict[str, Any]:
 
 
 @app.patch("/api/alerts/{alert_id}")
-def update_alert(alert_id: int, payload: Dict[str, Any]) -> Dict[str, Any]:
+async def update_alert(alert_id: int, payload: Dict[str, Any], request: Request) -> Dict[str, Any]:
     alert = ensure_exists("alerts", alert_id)
-    alert.update(payload)
-    store.save()
+    await run_in_threadpool(apply_patch, request, "alerts", alert, payload)
+    await store.save_async()
     return alert
 
 
+@app.get("/api/alerts/engine")
+async def alert_engine_status() -> Dict[str, Any]:
+    return alert_engine.snapshot()
+
+
 @app.get("/api/alerts/settings")
-def get_alert_settings() -> Dict[str, Any]:
+@depends_on("alert_settings")
+async def get_alert_settings() -> Dict[str, Any]:
     return store.data["alert_settings"]
 
 
 @app.post("/api/alerts/settings")
 def update_alert_settings(payload: Dict[str, Any]) -> Dict[str, Any]:
-    store.data["alert_settings"].update(payload)
-    store.save()
+    with store.lock:
+        store.data["alert_settings"].update(payload)
+        store.mark_changed("alert_settings")
+    alert_engine.reload()
+    store.schedule_save()
     return store.data["alert_settings"]
 
 
 @app.get("/api/settings/base")
-def get_base_settings() -> Dict[str, Any]:
+@depends_on("settings")
+async def get_base_settings() -> Dict[str, Any]:
     return store.data["settings"].get("base", {})
 
 
 @app.post("/api/settings/base")
-def update_base_settings(payload: Dict[str, Any]) -> Dict[str, Any]:
+async def update_base_settings(payload: Dict[str, Any]) -> Dict[str, Any]:
     store.data["settings"]["base"].update(payload)
-    store.save()
+    await run_in_threadpool(store.mark_changed, "settings")
+    await store.save_async()
     return store.data["settings"]["base"]
 
 
 @app.get("/api/settings/network")
-def get_network_settings() -> Dict[str, Any]:
+@depends_on("settings")
+async def get_network_settings() -> Dict[str, Any]:
     return store.data["settings"].get("network", {})
 
 
 @app.post("/api/settings/network")
-def update_network_settings(payload: Dict[str, Any]) -> Dict[str, Any]:
+async def update_network_settings(payload: Dict[str, Any]) -> Dict[str, Any]:
     store.data["settings"]["network"].update(payload)
-    store.save()
+    await run_in_threadpool(store.mark_changed, "settings")
+    await store.save_async()
     return store.data["settings"]["network"]
 
 
+@app.get("/api/settings/audit")
+async def get_audit_settings() -> Dict[str, Any]:
+    return audit_writer.settings
+
+
+@app.post("/api/settings/audit")
+async def update_audit_settings(payload: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        settings = audit_writer.configure(payload)
+    except (TypeError, ValueError) as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    store.data["settings"]["audit"] = dict(settings)
+    await run_in_threadpool(store.mark_changed, "settings")
+    await store.save_async()
+    return settings
+
+
 @app.get("/api/settings/backup")
-def list_backups() -> Dict[str, Any]:
+@depends_on("settings")
+async def list_backups() -> Dict[str, Any]:
     return {"items": store.data["settings"].get("backup_history", [])}
 
 
 @app.post("/api/settings/restore")
-def restore_settings(payload: Dict[str, Any]) -> Dict[str, Any]:
+async def restore_settings(payload: Dict[str, Any]) -> Dict[str, Any]:
     entry = {
         "id": len(store.data["settings"].get("backup_history", [])) + 1,
         "file": payload.get("file", "uploaded-config.json"),
@@ -745,5 +1509,6 @@ def restore_settings(payload: Dict[str, Any]) -> Dict[str, Any]:
         "downloadUrl": payload.get("file", "uploaded-config.json"),
     }
     store.data["settings"].setdefault("backup_history", []).append(entry)
-    store.save()
+    await run_in_threadpool(store.mark_changed, "settings")
+    await store.save_async()
     return entry
@@ -0,0 +1,295 @@
+from __future__ import annotations
+
+import atexit
+import contextvars
+import json
+import queue
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from .datastore import DataStore, iso_now, store
+from .logstore import LogStore, audit_log
+
+OVERFLOW_MODES = ("drop_newest", "drop_oldest", "block", "inline")
+DEFAULT_SETTINGS: Dict[str, Any] = {
+    "capacity": 10000,
+    "batchSize": 256,
+    "flushInterval": 0.5,
+    "overflow": "drop_newest",
+    "blockTimeout": 0.05,
+}
+# 路径前缀 -> (集合名, targetType)
+COLLECTIONS: Dict[str, Tuple[str, str]] = {
+    "projects": ("projects", "project"),
+    "folders": ("folders", "folder"),
+    "assets": ("assets", "asset"),
+    "import/tasks": ("import_tasks", "import_task"),
+    "search/views": ("search_views", "search_view"),
+    "sync-tasks": ("sync_tasks", "sync_task"),
+    "tier-policies": ("tier_policies", "tier_policy"),
+    "restore/tasks": ("restore_tasks", "restore_task"),
+    "storage/arrays": ("storage_arrays", "storage_array"),
+    "storage/volumes": ("storage_volumes", "storage_volume"),
+    "storage-targets": ("storage_targets", "storage_target"),
+    "users": ("users", "user"),
+    "roles": ("roles", "role"),
+    "alerts": ("alerts", "alert"),
+}
+NESTED_TARGETS = {"members": "project_member"}
+# 无法由路径推导的接口：路由模板 -> (targetType, targetId, action)
+ROUTE_TARGETS: Dict[str, Tuple[str, Optional[str], str]] = {
+    "/api/alerts/settings": ("alert_settings", None, "update"),
+    "/api/settings/base": ("settings", "base", "update"),
+    "/api/settings/network": ("settings", "network", "update"),
+    "/api/settings/audit": ("settings", "audit", "update"),
+    "/api/settings/restore": ("settings", "backup", "restore"),
+}
+# 不落审计的只读 POST 接口
+READ_ONLY_ROUTES = {"/api/assets/search", "/api/permissions/check"}
+METHOD_ACTIONS = {"POST": "create", "PUT": "update", "PATCH": "update", "DELETE": "delete"}
+SENSITIVE_KEYS = ("password", "secret", "token", "accesskey")
+IGNORED_FIELDS = {"updatedAt", "version"}
+
+
+def brief(key: str, value: Any) -> Any:
+    if any(word in key.lower() for word in SENSITIVE_KEYS):
+        return "***"
+    if isinstance(value, str) and len(value) > 80:
+        return value[:80] + "…"
+    if isinstance(value, list) and len(value) > 5:
+        return f"[{len(value)} 项]"
+    if isinstance(value, dict) and len(value) > 5:
+        return f"{{{len(value)} 个字段}}"
+    return value
+
+
+def describe(template: str, method: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    # 由路由模板推导 targetType / targetId / action，例如
+    # PATCH /api/assets/{asset_id}/meta -> asset, asset_id, update.meta
+    if template in ROUTE_TARGETS:
+        target_type, target_id, action = ROUTE_TARGETS[template]
+        return {"collection": None, "targetType": target_type, "targetId": target_id, "action": action, "parent": None}
+    parts = template[len("/api/"):].split("/")
+    prefix = next((key for key in ("/".join(parts[:2]), parts[0]) if key in COLLECTIONS), None)
+    collection, target_type = COLLECTIONS[prefix] if prefix else (None, parts[0])
+    rest = parts[len(prefix.split("/")):] if prefix else parts[1:]
+    target_id: Any = None
+    literals: List[str] = []
+    parent: Optional[Tuple[str, Any]] = None
+    for part in rest:
+        if part.startswith("{"):
+            value = params.get(part[1:-1])
+            target_id = int(value) if isinstance(value, str) and value.isdigit() else value
+        elif part in NESTED_TARGETS:
+            parent = (target_type, target_id)
+            collection, target_type, target_id = None, NESTED_TARGETS[part], None
+        else:
+            literals.append(part)
+    action = METHOD_ACTIONS.get(method, method.lower())
+    if literals:
+        literal = "_".join(literals).replace("-", "_")
+        action = literal if method == "POST" else f"{action}.{literal}"
+    return {
+        "collection": collection if not literals or target_id is not None else None,
+        "targetType": target_type,
+        "targetId": target_id,
+        "action": action,
+        "parent": parent,
+    }
+
+
+def snapshot_item(data_store: DataStore, collection: Optional[str], item_id: Any) -> Optional[Dict[str, Any]]:
+    if not collection or not isinstance(item_id, int):
+        return None
+    item = data_store.find_by_id(collection, item_id)
+    return dict(item) if item else None
+
+
+def diff_summary(before: Optional[Dict[str, Any]], after: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    if before is None and after is None:
+        return {}
+    if after is None:
+        return {"deleted": before.get("name") or before.get("fileName") or before.get("username")}
+    if before is None:
+        return {"created": sorted(key for key in after if key not in IGNORED_FIELDS)}
+    changed = {
+        key: [brief(key, before.get(key)), brief(key, after.get(key))]
+        for key in set(before) | set(after)
+        if key not in IGNORED_FIELDS and before.get(key) != after.get(key)
+    }
+    return {"changed": changed} if changed else {}
+
+
+def payload_summary(body: bytes) -> Dict[str, Any]:
+    if not body:
+        return {}
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        return {"bodyBytes": len(body)}
+    if not isinstance(payload, dict):
+        return {"payload": brief("payload", payload)}
+    return {"payload": {key: brief(key, value) for key, value in payload.items()}}
+
+
+class AuditWriter:
+    # 请求线程只把记录放入有界队列，后台线程按批写入 LogStore；
+    # 队列满时按 overflow 处理：drop_newest 丢弃新记录、drop_oldest 挤掉最旧记录、
+    # block 最多等待 blockTimeout 秒后丢弃、inline 由请求线程直接同步写盘
+    def __init__(self, logs: LogStore, settings: Optional[Dict[str, Any]] = None, name: str = "audit-writer") -> None:
+        self.logs = logs
+        self.name = name
+        self.settings = dict(DEFAULT_SETTINGS)
+        self.queue: "queue.Queue[Dict[str, Any]]" = queue.Queue()
+        self.lock = threading.Lock()
+        self.worker: Optional[threading.Thread] = None
+        self.stats = {"submitted": 0, "written": 0, "dropped": 0, "inline": 0, "batches": 0}
+        self.configure(settings or {})
+
+    def configure(self, settings: Dict[str, Any]) -> Dict[str, Any]:
+        merged = {**self.settings, **{key: settings[key] for key in DEFAULT_SETTINGS if key in settings}}
+        if merged["overflow"] not in OVERFLOW_MODES:
+            raise ValueError(f"overflow 取值应为 {', '.join(OVERFLOW_MODES)}")
+        merged["capacity"] = max(1, int(merged["capacity"]))
+        merged["batchSize"] = max(1, int(merged["batchSize"]))
+        merged["flushInterval"] = max(0.0, float(merged["flushInterval"]))
+        merged["blockTimeout"] = max(0.0, float(merged["blockTimeout"]))
+        self.settings = merged
+        self.queue.maxsize = merged["capacity"]
+        return self.settings
+
+    def submit(self, record: Dict[str, Any]) -> bool:
+        accepted = self.offer(record)
+        return self.overflow(record) if accepted is None else accepted
+
+    def offer(self, record: Dict[str, Any]) -> Optional[bool]:
+        # 不阻塞的部分：入队或按 drop_* 处理；队列已满且需要等待或同步写盘（block / inline）时返回 None，
+        # 由调用方在工作线程中调用 overflow，事件循环上不做阻塞操作
+        self.ensure_worker()
+        self.stats["submitted"] += 1
+        try:
+            self.queue.put_nowait(record)
+            return True
+        except queue.Full:
+            pass
+        overflow = self.settings["overflow"]
+        if overflow in ("inline", "block"):
+            return None
+        if overflow == "drop_oldest":
+            try:
+                self.queue.get_nowait()
+                self.queue.task_done()
+                self.stats["dropped"] += 1
+            except queue.Empty:
+                pass
+            try:
+                self.queue.put_nowait(record)
+                return True
+            except queue.Full:
+                pass
+        self.stats["dropped"] += 1
+        return False
+
+    def overflow(self, record: Dict[str, Any]) -> bool:
+        # 可能阻塞：inline 同步写盘，block 最多等待 blockTimeout 秒
+        if self.settings["overflow"] == "inline":
+            self.logs.append(record)
+            self.stats["inline"] += 1
+            return True
+        try:
+            self.queue.put(record, timeout=self.settings["blockTimeout"])
+            return True
+        except queue.Full:
+            self.stats["dropped"] += 1
+            return False
+
+    def ensure_worker(self) -> None:
+        if self.worker is not None and self.worker.is_alive():
+            return
+        with self.lock:
+            if self.worker is None or not self.worker.is_alive():
+                self.worker = threading.Thread(target=self.loop, name=self.name, daemon=True)
+                self.worker.start()
+
+    def loop(self) -> None:
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + self.settings["flushInterval"]
+            while len(batch) < self.settings["batchSize"]:
+                remaining = deadline - time.monotonic()
+                try:
+                    batch.append(self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.write(batch)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    def write(self, batch: List[Dict[str, Any]]) -> None:
+        self.logs.extend(batch)
+        self.stats["written"] += len(batch)
+        self.stats["batches"] += 1
+
+    def flush(self) -> None:
+        # 退出时把队列中剩余的记录同步写完
+        batch: List[Dict[str, Any]] = []
+        while True:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        if batch:
+            self.write(batch)
+            for _ in batch:
+                self.queue.task_done()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"pending": self.queue.qsize(), **self.settings, **self.stats}
+
+
+def build_record(
+    user: str,
+    ip: Optional[str],
+    target: Dict[str, Any],
+    status_code: int,
+    details: Dict[str, Any],
+) -> Dict[str, Any]:
+    if target["parent"]:
+        parent_type, parent_id = target["parent"]
+        details[f"{parent_type}Id"] = parent_id
+    details["status"] = status_code
+    details["result"] = "success" if status_code < 400 else "fail"
+    return {
+        "time": iso_now(),
+        "user": user,
+        "action": target["action"],
+        "targetType": target["targetType"],
+        "targetId": target["targetId"],
+        "ip": ip,
+        "details": details,
+    }
+
+
+# 当前请求中新建的记录：中间件在调用处理函数前放入一个空列表，存储发出的 create 事件追加到列表中。
+# 处理函数所在的任务与 run_in_threadpool 的线程都复制了这个上下文，并发请求各自只看到自己的新建记录
+created_records: contextvars.ContextVar[Optional[List[Tuple[str, Dict[str, Any]]]]] = contextvars.ContextVar(
+    "audit_created_records", default=None
+)
+
+
+def record_created(collection: str, item: Dict[str, Any], action: str) -> None:
+    bucket = created_records.get()
+    if bucket is not None and action == "create":
+        bucket.append((collection, item))
+
+
+def created_item(bucket: List[Tuple[str, Dict[str, Any]]], collection: str) -> Optional[Dict[str, Any]]:
+    return next((dict(item) for name, item in reversed(bucket) if name == collection), None)
+
+
+store.subscribe(record_created, replicated=False)
+audit_writer = AuditWriter(audit_log, store.data["settings"].get("audit"))
+atexit.register(audit_writer.flush)
@@ -0,0 +1,448 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+from copy import deepcopy
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# 运行方式：python -m backend.bench --assets 200000 --requests 300
+# 在临时目录中生成合成数据并在进程内直接调用 ASGI 应用，不经过网络与 uvicorn。
+# 注意：backend 下的模块在导入时就会按当前目录加载 data_store.json，
+# 因此这里只能在切换到临时目录之后再导入
+
+FILE_KINDS = {
+    "video": ([".mp4", ".mov", ".mxf", ".r3d", ".braw"], ["4K", "6K", "8K", "1080p"]),
+    "audio": ([".wav", ".mp3", ".flac"], [None]),
+    "image": ([".jpg", ".raw", ".dng", ".tif"], ["4K", "8K", "6K"]),
+}
+FILE_WEIGHTS = {"video": 6, "audio": 2, "image": 3}
+TIER_WEIGHTS = {"hot": 3, "warm": 3, "cold": 4}
+PRESENCE = {"hot": "both", "warm": "local", "cold": "cloud"}
+CAMERAS = ["FX6", "FX9", "RED", "ARRI Alexa", "BMPCC", "A7S3", "录音笔", "Mavic 3"]
+LOCATIONS = ["上海", "北京", "深圳", "西藏", "杭州", "成都", "重庆", "新疆", "云南"]
+TAGS = ["汽车", "外景", "采访", "夜景", "航拍", "自然", "山脉", "城市", "人物", "空镜", "延时", "慢动作"]
+CLIENTS = ["星河汽车", "逐影传媒", "云帆科技", "北辰文旅", "青禾食品", "远山户外"]
+OWNERS = ["林楠", "韩越", "赵璐", "周航", "陈屿", "许诺"]
+JOB_STATUSES = {"success": 8, "partial": 1, "fail": 1}
+AUDIT_ACTIONS = ["create", "update", "delete", "update.meta", "run", "retry"]
+AUDIT_TARGETS = ["project", "asset", "folder", "sync_task", "restore_task", "user"]
+
+Request = Tuple[str, str, Optional[Any], Dict[str, str]]
+
+
+def pick(rng: random.Random, weights: Dict[str, int]) -> str:
+    return rng.choices(list(weights), weights=list(weights.values()))[0]
+
+
+def day(rng: random.Random, start_year: int = 2021, end_year: int = 2024) -> str:
+    return f"{rng.randint(start_year, end_year)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+
+
+def generate_catalog(
+    rng: random.Random,
+    base: Dict[str, Any],
+    projects: int,
+    folders_per_project: int,
+    depth: int,
+    assets: int,
+    sync_jobs: int,
+) -> Dict[str, Any]:
+    # 在默认数据（用户、角色、磁盘、设置等）基础上替换项目、目录、素材、同步等业务集合
+    data = deepcopy(base)
+    data.pop("audit_logs", None)
+    data.pop("system_logs", None)
+    users = data["users"]
+    project_rows: List[Dict[str, Any]] = []
+    members: List[Dict[str, Any]] = []
+    policies = [policy for policy in data["tier_policies"] if policy.get("type") == "global"]
+    for project_id in range(1, projects + 1):
+        project = {
+            "id": project_id,
+            "name": f"项目{project_id:04d}",
+            "clientName": rng.choice(CLIENTS),
+            "ownerName": rng.choice(OWNERS),
+            "status": rng.choice(["ongoing", "ongoing", "completed", "archived"]),
+            "createdAt": f"{day(rng)}T09:00:00Z",
+            "updatedAt": f"{day(rng)}T18:00:00Z",
+            "defaultStorageTargetId": 1,
+            "defaultStorageTargetName": "华南对象存储",
+            "projectCapacityGb": rng.randint(500, 20000),
+            "tierLevel": pick(rng, TIER_WEIGHTS),
+        }
+        project_rows.append(project)
+        for user in rng.sample(users[1:], k=min(2, len(users) - 1)):
+            role = rng.choice(["owner", "editor", "viewer"])
+            member = {"id": len(members) + 1, "projectId": project_id, "userId": user["id"], "role": role}
+            members.append({**member, "joinedAt": project["createdAt"]})
+        if rng.random() < 0.3:
+            policies.append(
+                {
+                    "id": len(policies) + 1,
+                    "type": "project",
+                    "projectId": project_id,
+                    "projectName": project["name"],
+                    "hotToWarmDays": 7,
+                    "warmToColdDays": 30,
+                    "coldCacheGb": 200,
+                }
+            )
+    folders: List[Dict[str, Any]] = []
+    by_project: Dict[int, List[Dict[str, Any]]] = {}
+    for project in project_rows:
+        created: List[Tuple[Dict[str, Any], int]] = []
+        for index in range(folders_per_project):
+            candidates = [(folder, level) for folder, level in created if level < depth]
+            parent, level = rng.choice(candidates) if candidates and rng.random() > 0.2 else (None, 0)
+            folder = {
+                "id": len(folders) + 1,
+                "projectId": project["id"],
+                "name": f"目录{index + 1:03d}",
+                "parentId": parent["id"] if parent else None,
+            }
+            folders.append(folder)
+            created.append((folder, level + 1))
+        by_project[project["id"]] = [folder for folder, _ in created]
+    asset_rows: List[Dict[str, Any]] = []
+    for asset_id in range(1, assets + 1):
+        project = rng.choice(project_rows)
+        folder = rng.choice(by_project[project["id"]]) if by_project[project["id"]] else None
+        file_type = pick(rng, FILE_WEIGHTS)
+        extensions, resolutions = FILE_KINDS[file_type]
+        tier = pick(rng, TIER_WEIGHTS)
+        created_at = f"{day(rng)}T{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:00Z"
+        asset_rows.append(
+            {
+                "id": asset_id,
+                "folderId": folder["id"] if folder else None,
+                "projectId": project["id"],
+                "fileName": f"A{asset_id:07d}_C{rng.randint(1, 999):03d}{rng.choice(extensions)}",
+                "fileType": file_type,
+                "size": round(rng.lognormvariate(1.0, 1.2), 2),
+                "resolution": rng.choice(resolutions),
+                "duration": rng.randint(5, 1800) if file_type != "image" else None,
+                "shootDate": day(rng),
+                "projectName": project["name"],
+                "tags": rng.sample(TAGS, k=rng.randint(1, 3)),
+                "tierLevel": tier,
+                "localPresence": PRESENCE[tier],
+                "clientName": project["clientName"],
+                "camera": rng.choice(CAMERAS),
+                "location": rng.choice(LOCATIONS),
+                "createdAt": created_at,
+                "updatedAt": created_at,
+                "owner": project["ownerName"],
+            }
+        )
+    tasks: List[Dict[str, Any]] = []
+    for project in project_rows:
+        for direction in ("local_to_cloud", "cloud_to_local"):
+            tasks.append(
+                {
+                    "id": len(tasks) + 1,
+                    "name": f"{project['name']}-{'备份' if direction == 'local_to_cloud' else '回迁'}",
+                    "projectId": project["id"],
+                    "source": f"项目/{project['name']}",
+                    "target": ["华南对象存储"],
+                    "direction": direction,
+                    "mode": "incremental",
+                    "schedule": "每日 02:00",
+                    "lastRunStatus": "success",
+                    "lastRunAt": None,
+                    "enabled": True,
+                }
+            )
+    jobs: List[Dict[str, Any]] = []
+    for job_id in range(1, sync_jobs + 1):
+        task = rng.choice(tasks)
+        status = pick(rng, JOB_STATUSES)
+        total = rng.randint(10, 2000)
+        failed = 0 if status == "success" else rng.randint(1, total)
+        started = f"{day(rng, 2023)}T02:00:00Z"
+        jobs.append(
+            {
+                "id": job_id,
+                "taskId": task["id"],
+                "taskName": task["name"],
+                "startedAt": started,
+                "finishedAt": started.replace("T02:00", "T02:30"),
+                "status": status,
+                "totalFiles": total,
+                "successFiles": total - failed,
+                "failedFiles": failed,
+            }
+        )
+    data.update(
+        {
+            "projects": project_rows,
+            "project_members": members,
+            "folders": folders,
+            "assets": asset_rows,
+            "sync_tasks": tasks,
+            "sync_jobs": jobs,
+            "tier_policies": policies,
+            "restore_tasks": [],
+            "import_tasks": [],
+            "search_views": [],
+        }
+    )
+    return data
+
+
+def generate_audit(rng: random.Random, count: int, usernames: List[str]) -> List[Dict[str, Any]]:
+    start = time.time() - 365 * 24 * 3600
+    step = 365 * 24 * 3600 / max(count, 1)
+    return [
+        {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(start + index * step)),
+            "user": rng.choice(usernames),
+            "action": rng.choice(AUDIT_ACTIONS),
+            "targetType": rng.choice(AUDIT_TARGETS),
+            "targetId": rng.randint(1, 1000),
+            "ip": f"10.0.{rng.randint(0, 255)}.{rng.randint(1, 254)}",
+            "details": {"status": 200, "result": "success"},
+        }
+        for index in range(count)
+    ]
+
+
+async def call(app: Any, method: str, path: str, body: Any = None, headers: Optional[Dict[str, str]] = None) -> Tuple[int, bytes]:
+    # 最小化的进程内 ASGI 客户端
+    path, _, query = path.partition("?")
+    raw = json.dumps(body, ensure_ascii=False).encode("utf-8") if body is not None else b""
+    header_list = [(b"host", b"bench"), (b"content-length", str(len(raw)).encode())]
+    if body is not None:
+        header_list.append((b"content-type", b"application/json"))
+    header_list.extend((key.lower().encode(), value.encode()) for key, value in (headers or {}).items())
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "root_path": "",
+        "headers": header_list,
+        "client": ("127.0.0.1", 0),
+        "server": ("bench", 80),
+    }
+    complete = asyncio.Event()
+    request_sent = False
+    status = 0
+    chunks: List[bytes] = []
+
+    async def receive() -> Dict[str, Any]:
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": raw, "more_body": False}
+        await complete.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message: Dict[str, Any]) -> None:
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                complete.set()
+
+    await app(scope, receive, send)
+    return status, b"".join(chunks)
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+async def run_scenario(app: Any, make: Callable[[int], Request], requests: int, concurrency: int) -> Dict[str, Any]:
+    latencies: List[float] = []
+    errors = 0
+    counter = iter(range(requests))
+
+    async def worker() -> None:
+        nonlocal errors
+        for index in counter:
+            method, path, body, headers = make(index)
+            begin = time.perf_counter()
+            status, _ = await call(app, method, path, body, headers)
+            latencies.append((time.perf_counter() - begin) * 1000)
+            if status >= 400:
+                errors += 1
+
+    begin = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    elapsed = time.perf_counter() - begin
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "p50Ms": round(percentile(latencies, 0.5), 3),
+        "p99Ms": round(percentile(latencies, 0.99), 3),
+        "maxMs": round(max(latencies, default=0.0), 3),
+        "throughput": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+def build_scenarios(rng: random.Random, data: Dict[str, Any]) -> Dict[str, Callable[[int], Request]]:
+    project_ids = [project["id"] for project in data["projects"]]
+    asset_ids = [asset["id"] for asset in data["assets"]]
+    task_ids = [task["id"] for task in data["sync_tasks"]]
+    usernames = [user["username"] for user in data["users"]]
+    admin = {"X-User-Id": "1"}
+
+    def search(index: int) -> Request:
+        variants = [
+            {"keyword": f"C{rng.randint(1, 999):03d}"},
+            {"tierLevel": "cold", "fileType": "video"},
+            {"projectIds": rng.sample(project_ids, k=min(3, len(project_ids))), "tierLevel": "hot"},
+        ]
+        return "POST", "/api/assets/search", variants[index % len(variants)], admin
+
+    def mixed(index: int) -> Request:
+        roll = rng.random()
+        if roll < 0.05:
+            return "PATCH", f"/api/assets/{rng.choice(asset_ids)}/meta", {"camera": rng.choice(CAMERAS)}, admin
+        if roll < 0.4:
+            return "GET", "/api/dashboard/overview", None, admin
+        if roll < 0.8:
+            return "GET", f"/api/assets/{rng.choice(asset_ids)}", None, admin
+        return search(index)
+
+    return {
+        # 查询参数 r 使每次请求的缓存键不同，测得的是实际计算耗时
+        "dashboard": lambda index: ("GET", f"/api/dashboard/overview?r={index}", None, admin),
+        "dashboard-cached": lambda index: ("GET", "/api/dashboard/overview", None, admin),
+        "search": search,
+        "tree": lambda index: ("GET", f"/api/projects/{rng.choice(project_ids)}/tree?r={index}", None, admin),
+        "asset": lambda index: ("GET", f"/api/assets/{rng.choice(asset_ids)}", None, admin),
+        "sync-jobs": lambda index: ("GET", f"/api/sync-jobs?taskId={rng.choice(task_ids)}", None, admin),
+        "audit": lambda index: ("GET", f"/api/audit/logs?user={rng.choice(usernames)}&limit=100", None, admin),
+        "batch": lambda index: (
+            "PATCH",
+            "/api/assets/batch",
+            {"action": "tag", "assetIds": rng.sample(asset_ids, k=min(100, len(asset_ids))), "tags": ["bench"]},
+            admin,
+        ),
+        "write": lambda index: ("PATCH", f"/api/assets/{rng.choice(asset_ids)}/meta", {"camera": rng.choice(CAMERAS)}, admin),
+        "run-sync": lambda index: ("POST", f"/api/sync-tasks/{rng.choice(task_ids)}/run", None, admin),
+        "mixed": mixed,
+    }
+
+
+def peak_rss_mb() -> float:
+    # Linux 上 ru_maxrss 的单位为 KB
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    # 与基线报告比较各场景的 p99 与吞吐，超出容差的记为回退
+    regressions: List[str] = []
+    for name, result in report["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if not before:
+            continue
+        if before["p99Ms"] and result["p99Ms"] > before["p99Ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p99 {before['p99Ms']}ms -> {result['p99Ms']}ms")
+        if before["throughput"] and result["throughput"] < before["throughput"] * (1 - tolerance):
+            regressions.append(f"{name}: 吞吐 {before['throughput']} -> {result['throughput']} req/s")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="生成合成数据并在进程内压测主要接口")
+    parser.add_argument("--projects", type=int, default=20)
+    parser.add_argument("--folders", type=int, default=30, help="每个项目的目录数")
+    parser.add_argument("--depth", type=int, default=4, help="目录最大层级")
+    parser.add_argument("--assets", type=int, default=20000)
+    parser.add_argument("--sync-jobs", type=int, default=5000)
+    parser.add_argument("--audit", type=int, default=50000, help="预先写入的操作日志条数")
+    parser.add_argument("--requests", type=int, default=200, help="每个场景的请求数")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--scenarios", default="", help="逗号分隔的场景名，默认全部")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workdir", default=None, help="数据目录，默认新建临时目录")
+    parser.add_argument("--json", dest="json_path", default=None, help="把报告写入 JSON 文件")
+    parser.add_argument("--baseline", default=None, help="基线报告，p99 或吞吐回退超出容差时返回非零")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    baseline = json.loads(open(args.baseline, encoding="utf-8").read()) if args.baseline else None
+    json_path = os.path.abspath(args.json_path) if args.json_path else None
+    workdir = args.workdir or tempfile.mkdtemp(prefix="nas-bench-")
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)
+    rng = random.Random(args.seed)
+    report: Dict[str, Any] = {"workdir": workdir, "params": vars(args), "timings": {}, "scenarios": {}}
+    timings = report["timings"]
+
+    from .datastore import DEFAULT_DATA, DataStore, store
+
+    begin = time.perf_counter()
+    data = generate_catalog(rng, DEFAULT_DATA, args.projects, args.folders, args.depth, args.assets, args.sync_jobs)
+    DataStore.fill_versions(data)
+    timings["generateS"] = round(time.perf_counter() - begin, 3)
+    store.data = data
+    begin = time.perf_counter()
+    store.save()
+    timings["saveS"] = round(time.perf_counter() - begin, 3)
+    timings["storeBytes"] = store.path.stat().st_size
+
+    begin = time.perf_counter()
+    from .app import app
+    from .logstore import audit_log
+
+    timings["startupS"] = round(time.perf_counter() - begin, 3)
+    begin = time.perf_counter()
+    audit = generate_audit(rng, args.audit, [user["username"] for user in data["users"]])
+    for offset in range(0, len(audit), 10000):
+        audit_log.extend(audit[offset : offset + 10000])
+    timings["auditLoadS"] = round(time.perf_counter() - begin, 3)
+    del audit
+
+    scenarios = build_scenarios(rng, data)
+    selected = [name.strip() for name in args.scenarios.split(",") if name.strip()] or list(scenarios)
+    unknown = [name for name in selected if name not in scenarios]
+    if unknown:
+        parser.error(f"未知场景：{', '.join(unknown)}，可选：{', '.join(scenarios)}")
+
+    async def run_all() -> None:
+        for name in selected:
+            await run_scenario(app, scenarios[name], min(5, args.requests), 1)
+            report["scenarios"][name] = await run_scenario(app, scenarios[name], args.requests, args.concurrency)
+            print(f"{name:<18}{json.dumps(report['scenarios'][name], ensure_ascii=False)}", flush=True)
+
+    print(
+        f"数据：{args.projects} 个项目，{len(data['folders'])} 个目录，{args.assets} 个素材，"
+        f"{args.sync_jobs} 条同步记录，{args.audit} 条操作日志；目录 {workdir}",
+        flush=True,
+    )
+    print(f"耗时：{json.dumps(timings, ensure_ascii=False)}", flush=True)
+    asyncio.run(run_all())
+    store.io.shutdown(wait=True)
+    report["peakRssMb"] = peak_rss_mb()
+    print(f"峰值 RSS：{report['peakRssMb']} MB")
+    if json_path:
+        with open(json_path, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, ensure_ascii=False, indent=2)
+    if baseline is not None:
+        regressions = compare(report, baseline, args.tolerance)
+        for line in regressions:
+            print(f"回退：{line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import threading
+from collections import deque
+from itertools import islice
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Set, Tuple
+
+from .datastore import DataStore, iso_now, store
+
+CHANGE_LOG_SIZE = 10000
+HEARTBEAT_SECONDS = 15.0
+
+# (seq, collection, id, 事件, 预先序列化的 JSON)
+Change = Tuple[int, str, Any, Dict[str, Any], str]
+
+
+class ChangeFeed:
+    # 订阅 DataStore 的单条记录变更，按全局递增序号保存在环形缓冲区中；
+    # 每个事件只序列化一次，SSE 连接与轮询接口按序号增量读取。批量变更记为 action 为 bulk 的标记，
+    # 只提供给 replica 的增量同步（/api/cluster/changes），不推送给 SSE 与 /api/changes 的客户端
+    def __init__(self, data_store: DataStore, capacity: int = CHANGE_LOG_SIZE) -> None:
+        self.events: Deque[Change] = deque(maxlen=capacity)
+        self.seq = 0
+        self.lock = threading.Lock()
+        self.waiters: Set[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = set()
+        data_store.subscribe(self.publish)
+        data_store.subscribe_bulk(self.publish_bulk)
+
+    def publish(self, collection: str, item: Dict[str, Any], action: str) -> None:
+        self.append(collection, item.get("id"), {"action": action, "item": item})
+
+    def publish_bulk(self, collection: str, ids: Optional[List[Any]]) -> None:
+        self.append(collection, None, {"action": "bulk", "ids": ids})
+
+    def append(self, collection: str, item_id: Any, fields: Dict[str, Any]) -> None:
+        with self.lock:
+            self.seq += 1
+            event = {"seq": self.seq, "collection": collection, "id": item_id, "time": iso_now(), **fields}
+            data = json.dumps(event, ensure_ascii=False, default=str)
+            self.events.append((self.seq, collection, item_id, json.loads(data), data))
+            waiters = list(self.waiters)
+        for loop, flag in waiters:
+            try:
+                loop.call_soon_threadsafe(flag.set)
+            except RuntimeError:  # 连接所在的事件循环已关闭
+                pass
+
+    def since(
+        self,
+        seq: int,
+        collections: Optional[Set[str]] = None,
+        item_id: Optional[int] = None,
+        limit: Optional[int] = None,
+        bulk: bool = False,
+    ) -> Tuple[int, bool, List[Change]]:
+        # 返回 (当前序号, 是否有事件已被缓冲区淘汰, 序号大于 seq 的匹配事件)；bulk=True 时包含批量变更标记
+        with self.lock:
+            head = self.seq
+            oldest = self.events[0][0] if self.events else head + 1
+            # 客户端的序号超过当前序号（服务重启或重连到了另一个进程）时同样要求其重新拉取
+            reset = (seq + 1 < oldest and seq < head) or seq > head
+            start = max(0, seq + 1 - oldest)
+            window = list(islice(self.events, start, None))
+        matched = [
+            change
+            for change in window
+            if (not collections or change[1] in collections)
+            and (item_id is None or change[2] == item_id)
+            and (bulk or change[3]["action"] != "bulk")
+        ]
+        if limit is not None and len(matched) > limit:
+            matched = matched[:limit]
+            head = matched[-1][0]
+        return head, reset, matched
+
+    async def wait(self, seq: int, timeout: float) -> None:
+        # 长轮询：当前序号仍不大于 seq 时最多等待 timeout 秒
+        flag = asyncio.Event()
+        waiter = (asyncio.get_running_loop(), flag)
+        with self.lock:
+            if self.seq > seq:
+                return
+            self.waiters.add(waiter)
+        try:
+            await asyncio.wait_for(flag.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self.lock:
+                self.waiters.discard(waiter)
+
+    async def stream(
+        self,
+        since: Optional[int],
+        collections: Optional[Set[str]] = None,
+        item_id: Optional[int] = None,
+        heartbeat: float = HEARTBEAT_SECONDS,
+    ) -> AsyncIterator[str]:
+        flag = asyncio.Event()
+        waiter = (asyncio.get_running_loop(), flag)
+        with self.lock:
+            self.waiters.add(waiter)
+            cursor = self.seq if since is None else since
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                flag.clear()
+                head, reset, changes = self.since(cursor, collections, item_id)
+                if reset:
+                    # 客户端落后于缓冲区：通知其重新拉取完整数据，再从当前序号继续推送
+                    yield f"event: reset\nid: {head}\ndata: {json.dumps({'seq': head})}\n\n"
+                    cursor = head
+                    continue
+                for seq, _, _, _, data in changes:
+                    yield f"id: {seq}\ndata: {data}\n\n"
+                cursor = head
+                try:
+                    await asyncio.wait_for(flag.wait(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+        finally:
+            with self.lock:
+                self.waiters.discard(waiter)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "seq": self.seq,
+                "buffered": len(self.events),
+                "oldestSeq": self.events[0][0] if self.events else None,
+                "subscribers": len(self.waiters),
+            }
+
+
+change_feed = ChangeFeed(store)
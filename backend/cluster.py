@@ -0,0 +1,233 @@
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from .audit import READ_ONLY_ROUTES
+from .datastore import STORE_ROLE, DataStore, iso_now, store
+from .permissions import PermissionEngine, permission_engine
+
+PRIMARY_URL = os.environ.get("NAS_PRIMARY_URL", "http://127.0.0.1:8001")
+POLL_INTERVAL = 0.5
+# 长轮询等待时间；primary 有新变更时立即返回
+POLL_WAIT = 15.0
+# 批量变更涉及的 id 超过这个数量时直接取回整个集合
+MAX_FETCH_IDS = 1000
+FORWARD_TIMEOUT = 60.0
+WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+HOP_HEADERS = {"host", "connection", "keep-alive", "content-length", "transfer-encoding"}
+# 状态只存在于 primary 内存或由 primary 维护磁盘缓存的读接口，一并转发
+PRIMARY_ONLY_PREFIXES = (
+    "/api/audit/logs",
+    "/api/system/logs",
+    "/api/logs/",
+    "/api/restore/queue",
+    "/api/restore/cache",
+    "/api/metadata/status",
+    "/api/thumbnails/",
+    "/api/alerts/engine",
+    "/api/cluster/changes",
+    "/api/cluster/collections/",
+    "/api/cluster/snapshot",
+)
+PERMISSION_COLLECTIONS = {"users", "roles", "project_members", "permissions"}
+
+
+def should_forward(method: str, path: str) -> bool:
+    if method in WRITE_METHODS:
+        return path not in READ_ONLY_ROUTES
+    return path.startswith(PRIMARY_ONLY_PREFIXES) or (path.startswith("/api/assets/") and path.endswith("/thumbnail"))
+
+
+class Replica:
+    # replica 进程不写 data_store.json，按增量跟随 primary：后台线程长轮询 primary 的
+    # /api/cluster/changes（有新变更时立即返回），按记录 id 在本地覆盖或删除，并补发给变更流、
+    # 响应缓存等订阅者；批量变更标记按 id 取回最新记录，未带 id 时取回整个集合。启动、落后于
+    # primary 的变更缓冲区或 primary 重启后做一次全量同步。写请求原样转发给 primary，返回前先跟上增量
+    def __init__(self, data_store: DataStore, permissions: PermissionEngine, primary_url: str) -> None:
+        self.store = data_store
+        self.permissions = permissions
+        self.primary_url = primary_url.rstrip("/")
+        self.lock = threading.Lock()
+        # 已应用到的 primary 变更序号；None 表示尚未与 primary 同步
+        self.cursor: Optional[int] = None
+        self.healthy = True
+        self.poller: Optional[threading.Thread] = None
+        self.stats: Dict[str, Any] = {
+            "resyncs": 0,
+            "deltas": 0,
+            "appliedChanges": 0,
+            "fetchedCollections": 0,
+            "syncErrors": 0,
+            "forwarded": 0,
+            "forwardErrors": 0,
+        }
+        self.last_sync: Optional[str] = None
+
+    def fetch(self, path: str, timeout: float = FORWARD_TIMEOUT) -> Dict[str, Any]:
+        with urllib.request.urlopen(f"{self.primary_url}{path}", timeout=timeout) as response:
+            return json.loads(response.read())
+
+    def refresh(self, wait: float = 0.0) -> bool:
+        # 拉取并应用 cursor 之后的变更，返回是否有变化；长轮询的等待不持有 self.lock，
+        # 等待期间其他线程已推进 cursor 时丢弃这次结果
+        since = self.cursor
+        try:
+            if since is None:
+                with self.lock:
+                    changed = self.resync() if self.cursor is None else set()
+            else:
+                result = self.fetch(f"/api/cluster/changes?since={since}&wait={wait}", timeout=FORWARD_TIMEOUT + wait)
+                with self.lock:
+                    if self.cursor != since:
+                        return False
+                    changed = self.resync() if result["reset"] else self.apply(result)
+        except (OSError, ValueError, KeyError):
+            self.healthy = False
+            self.stats["syncErrors"] += 1
+            return False
+        self.healthy = True
+        if changed & PERMISSION_COLLECTIONS:
+            self.permissions.invalidate()
+        return bool(changed)
+
+    def resync(self) -> Set[str]:
+        snapshot = self.fetch("/api/cluster/snapshot")
+        changed = self.store.replace(snapshot["data"])
+        self.cursor = snapshot["seq"]
+        self.stats["resyncs"] += 1
+        self.last_sync = iso_now()
+        return changed
+
+    def apply(self, result: Dict[str, Any]) -> Set[str]:
+        # 同一条记录只保留最后一次取值；批量变更取回的记录比之前的事件更新，覆盖它们
+        latest: Dict[Tuple[str, Any], Optional[Dict[str, Any]]] = {}
+        values: Dict[str, Any] = {}
+        wanted: Dict[str, List[Any]] = {}
+        for event in result["items"]:
+            collection = event["collection"]
+            if event["action"] != "bulk":
+                latest[(collection, event["id"])] = None if event["action"] == "delete" else event["item"]
+            elif event.get("ids") is None or len(event["ids"]) > MAX_FETCH_IDS:
+                values[collection] = None
+            else:
+                wanted.setdefault(collection, []).extend(event["ids"])
+        for collection in values:
+            values[collection] = self.fetch(f"/api/cluster/collections/{collection}")["value"]
+            self.stats["fetchedCollections"] += 1
+        for collection, ids in wanted.items():
+            if collection in values:
+                continue
+            ids = list(dict.fromkeys(ids))
+            for start in range(0, len(ids), MAX_FETCH_IDS):
+                chunk = ids[start : start + MAX_FETCH_IDS]
+                query = ",".join(str(item_id) for item_id in chunk)
+                fetched = self.fetch(f"/api/cluster/collections/{collection}?ids={query}")["value"]
+                rows = {row.get("id"): row for row in fetched}
+                for item_id in chunk:
+                    latest[(collection, item_id)] = rows.get(item_id)
+        changes = [
+            (collection, item_id, item) for (collection, item_id), item in latest.items() if collection not in values
+        ]
+        changed = self.store.apply_changes(changes, values) if changes or values else set()
+        self.cursor = result["seq"]
+        self.stats["deltas"] += 1
+        self.stats["appliedChanges"] += len(changes)
+        self.last_sync = iso_now()
+        return changed
+
+    def ensure_poller(self) -> None:
+        if self.poller is not None and self.poller.is_alive():
+            return
+        with self.lock:
+            if self.poller is None or not self.poller.is_alive():
+                self.poller = threading.Thread(target=self.poll, name="replica-poller", daemon=True)
+                self.poller.start()
+
+    def poll(self) -> None:
+        # 没有请求时也要跟上 primary 的写入，SSE 连接才能及时收到其他进程产生的变更
+        while True:
+            try:
+                self.refresh(wait=POLL_WAIT)
+            except Exception:  # 轮询线程不能退出
+                self.healthy = False
+                self.stats["syncErrors"] += 1
+            if not self.healthy:
+                time.sleep(POLL_INTERVAL)
+
+    def forward(
+        self, method: str, path: str, query: str, headers: Dict[str, str], body: bytes
+    ) -> Tuple[int, List[Tuple[str, str]], bytes]:
+        # 连接失败时抛出 OSError，由调用方返回 503
+        url = f"{self.primary_url}{path}" + (f"?{query}" if query else "")
+        request = urllib.request.Request(url, data=body or None, method=method, headers=headers)
+        self.stats["forwarded"] += 1
+        try:
+            with urllib.request.urlopen(request, timeout=FORWARD_TIMEOUT) as response:
+                return response.status, response.getheaders(), response.read()
+        except urllib.error.HTTPError as exc:
+            return exc.code, list(exc.headers.items()), exc.read()
+        except OSError:
+            self.stats["forwardErrors"] += 1
+            raise
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "primaryUrl": self.primary_url,
+            "cursor": self.cursor,
+            "healthy": self.healthy,
+            "lastSyncAt": self.last_sync,
+            **self.stats,
+        }
+
+
+replica = Replica(store, permission_engine, PRIMARY_URL) if STORE_ROLE == "replica" else None
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    # 启动一个 primary（仅监听本机，独占写入并运行导入、回迁、告警等后台任务）
+    # 和 N 个 replica worker（共享对外端口，处理读请求并转发写请求）
+    parser = argparse.ArgumentParser(description="以多进程方式启动 API")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--primary-port", type=int, default=8001)
+    args = parser.parse_args(argv)
+    uvicorn = [sys.executable, "-m", "uvicorn", "app:app"]
+    primary = subprocess.Popen(
+        uvicorn + ["--host", "127.0.0.1", "--port", str(args.primary_port)],
+        env={**os.environ, "NAS_STORE_ROLE": "primary"},
+    )
+    replicas = subprocess.Popen(
+        uvicorn + ["--host", args.host, "--port", str(args.port), "--workers", str(max(1, args.workers))],
+        env={
+            **os.environ,
+            "NAS_STORE_ROLE": "replica",
+            "NAS_PRIMARY_URL": f"http://127.0.0.1:{args.primary_port}",
+        },
+    )
+    processes = [primary, replicas]
+    try:
+        while all(process.poll() is None for process in processes):
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes:
+            if process.poll() is None:
+                process.terminate()
+        for process in processes:
+            process.wait()
+    return max(process.returncode or 0 for process in processes)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,311 @@
+from __future__ import annotations
+
+import heapq
+import itertools
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from .datastore import DataStore, iso_now, store
+
+GB = 1024 ** 3
+
+
+def asset_bytes(asset: Dict[str, Any]) -> int:
+    return int((asset.get("size") or 0) * GB)
+
+
+class EvictionPolicy(ABC):
+    name = ""
+
+    @abstractmethod
+    def insert(self, key: int, size: int) -> None:
+        ...
+
+    @abstractmethod
+    def hit(self, key: int) -> None:
+        ...
+
+    @abstractmethod
+    def remove(self, key: int) -> None:
+        ...
+
+    @abstractmethod
+    def victim(self, exclude: Optional[int] = None) -> Optional[int]:
+        # 下一个应淘汰的素材；exclude 为刚放入、本轮不能淘汰的素材
+        ...
+
+
+class LRUPolicy(EvictionPolicy):
+    name = "lru"
+
+    def __init__(self) -> None:
+        self.order: "OrderedDict[int, None]" = OrderedDict()
+
+    def insert(self, key: int, size: int) -> None:
+        self.order[key] = None
+        self.order.move_to_end(key)
+
+    def hit(self, key: int) -> None:
+        if key in self.order:
+            self.order.move_to_end(key)
+
+    def remove(self, key: int) -> None:
+        self.order.pop(key, None)
+
+    def victim(self, exclude: Optional[int] = None) -> Optional[int]:
+        return next((key for key in self.order if key != exclude), None)
+
+
+class _HeapPolicy(EvictionPolicy):
+    # 小顶堆 + 惰性删除：优先级变化时压入新条目，弹出时丢弃过期条目
+    def __init__(self) -> None:
+        self.heap: List[Tuple[float, int, int]] = []
+        self.current: Dict[int, Tuple[float, int]] = {}
+        self.counter = itertools.count()
+
+    @abstractmethod
+    def priority(self, key: int) -> float:
+        ...
+
+    def push(self, key: int) -> None:
+        entry = (self.priority(key), next(self.counter))
+        self.current[key] = entry
+        heapq.heappush(self.heap, (entry[0], entry[1], key))
+
+    def remove(self, key: int) -> None:
+        self.current.pop(key, None)
+
+    def victim(self, exclude: Optional[int] = None) -> Optional[int]:
+        # LFU / size 策略下刚放入的素材优先级最低，总在堆顶：暂时取出 exclude 的条目，返回其后的候选
+        held: List[Tuple[float, int, int]] = []
+        try:
+            while self.heap:
+                priority, seq, key = self.heap[0]
+                if self.current.get(key) != (priority, seq):
+                    heapq.heappop(self.heap)
+                elif key == exclude:
+                    held.append(heapq.heappop(self.heap))
+                else:
+                    return key
+            return None
+        finally:
+            for entry in held:
+                heapq.heappush(self.heap, entry)
+
+
+class LFUPolicy(_HeapPolicy):
+    name = "lfu"
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.hits: Dict[int, int] = {}
+
+    def priority(self, key: int) -> float:
+        return self.hits.get(key, 0)
+
+    def insert(self, key: int, size: int) -> None:
+        self.hits[key] = 1
+        self.push(key)
+
+    def hit(self, key: int) -> None:
+        if key in self.current:
+            self.hits[key] = self.hits.get(key, 0) + 1
+            self.push(key)
+
+    def remove(self, key: int) -> None:
+        super().remove(key)
+        self.hits.pop(key, None)
+
+
+class SizeAwarePolicy(_HeapPolicy):
+    # GreedyDual-Size-Frequency：优先淘汰体积大且访问少的素材
+    name = "size"
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.clock = 0.0
+        self.hits: Dict[int, int] = {}
+        self.sizes: Dict[int, int] = {}
+
+    def priority(self, key: int) -> float:
+        size_gb = max(self.sizes.get(key, 0) / GB, 1e-6)
+        return self.clock + self.hits.get(key, 0) / size_gb
+
+    def insert(self, key: int, size: int) -> None:
+        self.hits[key] = 1
+        self.sizes[key] = size
+        self.push(key)
+
+    def hit(self, key: int) -> None:
+        if key in self.current:
+            self.hits[key] = self.hits.get(key, 0) + 1
+            self.push(key)
+
+    def remove(self, key: int) -> None:
+        entry = self.current.get(key)
+        if entry:
+            self.clock = max(self.clock, entry[0])
+        super().remove(key)
+        self.hits.pop(key, None)
+        self.sizes.pop(key, None)
+
+
+POLICIES = {policy.name: policy for policy in (LRUPolicy, LFUPolicy, SizeAwarePolicy)}
+
+
+class ProjectCache:
+    def __init__(self, project_id: Optional[int], policy: str) -> None:
+        self.project_id = project_id
+        self.policy: EvictionPolicy = POLICIES[policy]()
+        self.sizes: Dict[int, int] = {}
+        self.used = 0
+
+    def add(self, asset_id: int, size: int) -> None:
+        self.sizes[asset_id] = size
+        self.used += size
+        self.policy.insert(asset_id, size)
+
+    def drop(self, asset_id: int) -> None:
+        self.used -= self.sizes.pop(asset_id, 0)
+        self.policy.remove(asset_id)
+
+
+class ColdCacheManager:
+    # 加锁顺序：store.lock 在前、self.lock 在后。admit / rebalance 会修改素材并调用 mark_changed，
+    # 因此先取 store.lock；回迁队列在持有 store.lock 时调用 admit，顺序一致
+    def __init__(self, data_store: DataStore) -> None:
+        self.store = data_store
+        self.lock = threading.RLock()
+        self.projects: Dict[Optional[int], ProjectCache] = {}
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "evictedBytes": 0}
+        self.policy_name = "lru"
+        self.rebuild()
+
+    def global_policy(self) -> Dict[str, Any]:
+        return next((p for p in self.store.data.get("tier_policies", []) if p.get("type") == "global"), {})
+
+    def budget_bytes(self, project_id: Optional[int]) -> int:
+        policy = next(
+            (p for p in self.store.data.get("tier_policies", []) if p.get("type") == "project" and p.get("projectId") == project_id),
+            None,
+        )
+        if not policy or policy.get("coldCacheGb") is None:
+            policy = self.global_policy()
+        return int((policy.get("coldCacheGb") or 0) * GB)
+
+    def rebuild(self) -> None:
+        with self.lock:
+            policy = self.global_policy().get("evictionPolicy", "lru")
+            self.policy_name = policy if policy in POLICIES else "lru"
+            self.projects = {}
+            cached = [
+                asset
+                for asset in self.store.get_collection("assets")
+                if asset.get("tierLevel") == "cold" and asset.get("localPresence") == "both"
+            ]
+            cached.sort(key=lambda asset: asset.get("cachedAt") or asset.get("updatedAt") or "")
+            for asset in cached:
+                self.project_cache(asset.get("projectId")).add(asset["id"], asset_bytes(asset))
+
+    def project_cache(self, project_id: Optional[int]) -> ProjectCache:
+        cache = self.projects.get(project_id)
+        if cache is None:
+            cache = self.projects[project_id] = ProjectCache(project_id, self.policy_name)
+        return cache
+
+    def lookup(self, asset: Dict[str, Any]) -> bool:
+        with self.lock:
+            cache = self.project_cache(asset.get("projectId"))
+            if asset["id"] in cache.sizes and asset.get("localPresence") == "both":
+                self.stats["hits"] += 1
+                cache.policy.hit(asset["id"])
+                return True
+            self.stats["misses"] += 1
+            return False
+
+    def admit(self, asset: Dict[str, Any], prefetch: bool = False) -> Optional[List[int]]:
+        # 只缓存冷层素材；预取只使用空闲容量，不挤占已回迁的素材；单个素材超过项目缓存容量时不放入。
+        # 返回 None 表示未放入缓存
+        if asset.get("tierLevel") != "cold":
+            return None
+        with self.store.lock, self.lock:
+            cache = self.project_cache(asset.get("projectId"))
+            asset_id = asset["id"]
+            size = asset_bytes(asset)
+            budget = self.budget_bytes(cache.project_id)
+            if size > budget or (prefetch and cache.used - cache.sizes.get(asset_id, 0) + size > budget):
+                return None
+            cache.drop(asset_id)
+            asset["localPresence"] = "both"
+            asset["cachedAt"] = iso_now()
+            cache.add(asset_id, size)
+            self.store.mark_changed("assets", asset)
+            return self.enforce(cache, keep=asset_id)
+
+    def request(self, asset: Dict[str, Any]) -> Dict[str, Any]:
+        if self.lookup(asset):
+            return {"hit": True, "evicted": []}
+        return {"hit": False, "evicted": self.admit(asset) or []}
+
+    def enforce(self, cache: ProjectCache, keep: Optional[int] = None) -> List[int]:
+        budget = self.budget_bytes(cache.project_id)
+        evicted: List[int] = []
+        while cache.used > budget:
+            victim = cache.policy.victim(exclude=keep)
+            if victim is None:
+                break
+            size = cache.sizes.get(victim, 0)
+            cache.drop(victim)
+            asset = self.store.find_by_id("assets", victim)
+            if asset:
+                asset["localPresence"] = "cloud"
+                asset.pop("cachedAt", None)
+                self.store.mark_changed("assets", asset)
+            self.stats["evictions"] += 1
+            self.stats["evictedBytes"] += size
+            evicted.append(victim)
+        return evicted
+
+    def forget(self, asset_id: int) -> None:
+        with self.lock:
+            for cache in self.projects.values():
+                cache.drop(asset_id)
+
+    def forget_project(self, project_id: int) -> None:
+        # 项目归档或删除后其素材不再占用本地冷数据缓存
+        with self.lock:
+            self.projects.pop(project_id, None)
+
+    def rebalance(self) -> List[int]:
+        with self.store.lock, self.lock:
+            policy = self.global_policy().get("evictionPolicy", "lru")
+            if policy in POLICIES and policy != self.policy_name:
+                self.rebuild()
+            evicted: List[int] = []
+            for cache in self.projects.values():
+                evicted.extend(self.enforce(cache))
+            return evicted
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            projects = [
+                {
+                    "projectId": cache.project_id,
+                    "assets": len(cache.sizes),
+                    "usedBytes": cache.used,
+                    "budgetBytes": self.budget_bytes(cache.project_id),
+                }
+                for cache in self.projects.values()
+            ]
+            return {
+                "policy": self.policy_name,
+                **self.stats,
+                "hitRate": round(self.stats["hits"] / lookups, 4) if lookups else 0.0,
+                "projects": projects,
+            }
+
+
+cold_cache = ColdCacheManager(store)
@@ -1,18 +1,109 @@
 from __future__ import annotations
 
+import asyncio
+import itertools
 import json
+import os
+import threading
+import time
+from bisect import bisect_left, insort
+from concurrent.futures import Future, ThreadPoolExecutor
 from copy import deepcopy
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from .metrics import registry
 
 ISO_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+SERIALIZE_ATTEMPTS = 3
+# 多进程部署时由 backend/cluster.py 的启动器设置：primary 独占写入，replica 只读并把写请求转发给 primary
+STORE_ROLE = os.environ.get("NAS_STORE_ROLE", "standalone")
+
+
+class VersionConflict(Exception):
+    def __init__(self, current: int) -> None:
+        super().__init__(f"版本冲突：当前版本为 {current}")
+        self.current = current
+
+
+STORE_SERIALIZE = registry.histogram("nas_store_serialize_seconds", "整份文档序列化耗时", ("mode",))
+STORE_WRITE = registry.histogram("nas_store_write_seconds", "写临时文件并原子替换的耗时")
+STORE_BYTES = registry.counter("nas_store_written_bytes_total", "写入 data_store.json 的字节数")
+STORE_INDEX = registry.counter(
+    "nas_store_index_lookups_total", "字段索引读取次数（命中 / 重建）", ("collection", "field", "result")
+)
+STORE_INDEX_BUILD = registry.histogram("nas_store_index_build_seconds", "字段索引重建耗时", ("collection",))
+STORE_RELOAD = registry.histogram("nas_store_reload_seconds", "replica 应用 primary 变更的耗时", ("mode",))
 
 
 def iso_now() -> str:
     return datetime.utcnow().strftime(ISO_FORMAT)
 
 
+def record_id(item: Dict[str, Any]) -> Any:
+    return item.get("id") or 0
+
+
+class FieldIndex:
+    # 一个 (集合, 字段) 索引：字段值 -> 记录列表（按 id 排列，与集合中的追加顺序一致）。
+    # 由 DataStore 在单条变更时增量维护，keys 为每条记录上次写入索引时的字段值，rows 为 id -> 记录；
+    # 集合被整体替换或批量变更无法按 id 补写时置 stale，下次读取时重建
+    __slots__ = ("field", "source", "buckets", "keys", "rows", "stale")
+
+    def __init__(self, field: str, source: List[Dict[str, Any]]) -> None:
+        self.field = field
+        self.source = source
+        self.buckets: Dict[Any, List[Dict[str, Any]]] = {}
+        self.keys: Dict[int, Any] = {}
+        self.rows: Dict[Any, Dict[str, Any]] = {}
+        self.stale = False
+        for item in source:
+            value = item.get(field)
+            self.buckets.setdefault(value, []).append(item)
+            self.keys[id(item)] = value
+            self.rows[item.get("id")] = item
+
+    def put(self, item: Dict[str, Any]) -> None:
+        value = item.get(self.field)
+        known = id(item) in self.keys
+        old = self.keys.get(id(item))
+        self.rows[item.get("id")] = item
+        if known and old == value:
+            return
+        if known:
+            self.discard(old, item)
+        self.keys[id(item)] = value
+        bucket = self.buckets.setdefault(value, [])
+        if not bucket or record_id(bucket[-1]) <= record_id(item):
+            bucket.append(item)
+        else:
+            insort(bucket, item, key=record_id)
+
+    def drop(self, item: Dict[str, Any]) -> None:
+        if id(item) in self.keys:
+            self.discard(self.keys.pop(id(item)), item)
+        if self.rows.get(item.get("id")) is item:
+            del self.rows[item.get("id")]
+
+    def discard(self, value: Any, item: Dict[str, Any]) -> None:
+        bucket = self.buckets.get(value)
+        if not bucket:
+            return
+        position = bisect_left(bucket, record_id(item), key=record_id)
+        for offset in range(position, len(bucket)):
+            if bucket[offset] is item:
+                del bucket[offset]
+                break
+        else:  # 集合不是按 id 排列时退回线性查找
+            for offset, row in enumerate(bucket):
+                if row is item:
+                    del bucket[offset]
+                    break
+        if not bucket:
+            del self.buckets[value]
+
+
 DEFAULT_DATA: Dict[str, Any] = {
     "projects": [
         {
@@ -483,40 +574,376 @@ DEFAULT_DATA: Dict[str, Any] = {
 
 
 class DataStore:
-    def __init__(self, path: str = "data_store.json") -> None:
+    def __init__(self, path: str = "data_store.json", read_only: bool = False) -> None:
         self.path = Path(path)
+        self.read_only = read_only
+        self.lock = threading.RLock()
+        self.versions: Dict[str, int] = {}
+        self.modified: Dict[str, float] = {}
+        self.loaded_at = time.time()
+        self.indexes: Dict[Tuple[str, str], FieldIndex] = {}
+        # 每个集合的索引变更计数：不加锁重建索引期间有变更时，重建结果只用于本次读取
+        self.index_events: Dict[str, int] = {}
+        self.listeners: List[Callable[[str, Dict[str, Any], str], None]] = []
+        self.replica_listeners: List[Callable[[str, Dict[str, Any], str], None]] = []
+        self.bulk_listeners: List[Callable[[str, Optional[List[Any]]], None]] = []
+        # 异步写入：落盘交给单线程 I/O 执行器，排队中尚未开始的保存由后到的调用方共享
+        self.io = ThreadPoolExecutor(max_workers=1, thread_name_prefix="store-io")
+        self.save_lock = threading.Lock()
+        self.pending_save: Optional["Future[None]"] = None
+        self.write_lock = threading.Lock()
+        self.tickets = itertools.count(1)
+        self.written_ticket = 0
+        self.stats = {"saves": 0, "asyncSaves": 0, "coalesced": 0, "retries": 0}
         if self.path.exists():
             self.data = json.loads(self.path.read_text(encoding="utf-8"))
         else:
             self.data = deepcopy(DEFAULT_DATA)
             self.save()
+        self.fill_versions(self.data)
+
+    @staticmethod
+    def fill_versions(data: Dict[str, Any]) -> None:
+        # 每条记录带有 version，供写接口做乐观并发控制；旧数据按版本 1 补齐
+        for value in data.values():
+            if isinstance(value, list):
+                for item in value:
+                    if isinstance(item, dict):
+                        item.setdefault("version", 1)
 
     def save(self) -> None:
-        self.path.write_text(json.dumps(self.data, ensure_ascii=False, indent=2), encoding="utf-8")
+        # 同步保存：只在取快照时持有 self.lock，序列化与写盘在锁外进行。
+        # 请求处理函数与后台任务改用 schedule_save / save_async
+        if self.read_only:
+            return
+        ticket, data = self.capture()
+        with STORE_SERIALIZE.time("sync"):
+            text = self.serialize(data)
+        self.write(ticket, text)
+
+    def capture(self) -> Tuple[int, Dict[str, Any]]:
+        # 票号与快照在同一次加锁中取得：票号顺序与快照顺序一致，write 据此丢弃较早的快照
+        with self.lock:
+            return next(self.tickets), self.snapshot()
+
+    def serialize(self, data: Dict[str, Any]) -> str:
+        # 快照只复制到记录一层，记录内嵌的列表 / 字典仍与存储共享，被并发修改时 json.dumps 抛出
+        # RuntimeError：重新取快照重试，多次失败后才在锁内序列化
+        for _ in range(SERIALIZE_ATTEMPTS):
+            try:
+                return json.dumps(data, ensure_ascii=False, indent=2)
+            except RuntimeError:
+                self.stats["retries"] += 1
+                data = self.snapshot()
+        with self.lock:
+            return json.dumps(self.data, ensure_ascii=False, indent=2)
+
+    def write(self, ticket: int, text: str) -> None:
+        # 先写临时文件再原子替换，其他进程读取时不会看到写了一半的文档；
+        # 序列化开始得更晚的快照已经落盘时，较早的快照直接丢弃
+        with self.write_lock:
+            if ticket < self.written_ticket:
+                return
+            start = time.perf_counter()
+            content = text.encode("utf-8")
+            temp = self.path.with_name(self.path.name + ".tmp")
+            temp.write_bytes(content)
+            os.replace(temp, self.path)
+            self.written_ticket = ticket
+            self.stats["saves"] += 1
+            STORE_WRITE.observe(time.perf_counter() - start)
+            STORE_BYTES.inc(len(content))
+
+    async def save_async(self) -> None:
+        # 供 async 处理函数调用：序列化与写盘都在 I/O 线程中完成，不阻塞事件循环
+        if self.read_only:
+            return
+        await asyncio.wrap_future(self.schedule_save())
+
+    def schedule_save(self) -> "Future[None]":
+        with self.save_lock:
+            self.stats["asyncSaves"] += 1
+            if self.pending_save is None:
+                self.pending_save = self.io.submit(self.flush_pending)
+            else:
+                self.stats["coalesced"] += 1
+            return self.pending_save
+
+    def flush_pending(self) -> None:
+        # 开始执行前先清空排队标记，此后的写入会触发下一次保存。只在取快照时持有 self.lock，
+        # 序列化的是加锁时的一致快照，写操作不必等待整份文档序列化
+        with self.save_lock:
+            self.pending_save = None
+        if self.read_only:
+            return
+        ticket, data = self.capture()
+        with STORE_SERIALIZE.time("async"):
+            text = self.serialize(data)
+        self.write(ticket, text)
+
+    def snapshot(self) -> Dict[str, Any]:
+        # 在锁内逐条复制记录的顶层字段，序列化可以在锁外进行，不会读到写了一半的记录
+        with self.lock:
+            return {
+                name: [dict(item) if isinstance(item, dict) else item for item in value]
+                if isinstance(value, list)
+                else deepcopy(value)
+                for name, value in self.data.items()
+            }
+
+    def insert(self, collection: str, item: Dict[str, Any]) -> Dict[str, Any]:
+        # 在锁内分配 id 并追加，随后发出 create 事件
+        with self.lock:
+            item["id"] = self.next_id(collection)
+            self.get_collection(collection).append(item)
+            self.mark_changed(collection, item, "create")
+        return item
+
+    def remove(self, collection: str, items: List[Dict[str, Any]]) -> None:
+        # 在锁内重建一次列表，逐条发出 delete 事件
+        doomed = {id(item) for item in items}
+        with self.lock:
+            self.data[collection] = [item for item in self.get_collection(collection) if id(item) not in doomed]
+            for item in items:
+                self.mark_changed(collection, item, "delete")
+
+    def replace(self, data: Dict[str, Any]) -> Set[str]:
+        # replica 全量同步：整份替换文档，内容有变化的集合递增版本号，
+        # 并按记录的 id / version 比对，把新建、更新、删除的记录补发给 replica_listeners
+        start = time.perf_counter()
+        self.fill_versions(data)
+        events: List[Tuple[str, Dict[str, Any], str]] = []
+        with self.lock:
+            previous, self.data = self.data, data
+            changed = {name for name in set(previous) | set(data) if previous.get(name) != data.get(name)}
+            now = time.time()
+            for name in changed:
+                self.versions[name] = self.versions.get(name, 0) + 1
+                self.modified[name] = now
+                before, after = previous.get(name), data.get(name)
+                if isinstance(before, list) and isinstance(after, list):
+                    events.extend(self.record_changes(name, before, after))
+        STORE_RELOAD.observe(time.perf_counter() - start, "full")
+        self.notify_replicated(events, changed)
+        return changed
+
+    def apply_changes(
+        self, changes: List[Tuple[str, Any, Optional[Dict[str, Any]]]], values: Optional[Dict[str, Any]] = None
+    ) -> Set[str]:
+        # replica 增量同步：changes 为 (集合, id, 最新记录)，记录为 None 表示已删除；已有记录原地覆盖，
+        # 其他对象持有的引用仍然有效。values 为整体取回的集合（未带 id 的批量变更、settings 等非列表取值）
+        start = time.perf_counter()
+        events: List[Tuple[str, Dict[str, Any], str]] = []
+        changed: Set[str] = set()
+        with self.lock:
+            for name, value in (values or {}).items():
+                before = self.data.get(name)
+                self.fill_versions({name: value})
+                self.data[name] = value
+                changed.add(name)
+                if isinstance(before, list) and isinstance(value, list):
+                    events.extend(self.record_changes(name, before, value))
+            for name in dict.fromkeys(change[0] for change in changes):
+                collection = self.get_collection(name)
+                by_id = {item.get("id"): item for item in collection if isinstance(item, dict)}
+                doomed: Set[int] = set()
+                for _, item_id, item in (change for change in changes if change[0] == name):
+                    current = by_id.get(item_id)
+                    if item is None:
+                        if current is not None:
+                            doomed.add(id(by_id.pop(item_id)))
+                            events.append((name, current, "delete"))
+                        continue
+                    item.setdefault("version", 1)
+                    if current is None:
+                        collection.append(item)
+                        by_id[item_id] = item
+                        events.append((name, item, "create"))
+                    elif current != item:
+                        current.clear()
+                        current.update(item)
+                        events.append((name, current, "update"))
+                if doomed:
+                    self.data[name] = [item for item in collection if id(item) not in doomed]
+                changed.add(name)
+            now = time.time()
+            for name in changed:
+                self.versions[name] = self.versions.get(name, 0) + 1
+                self.modified[name] = now
+        STORE_RELOAD.observe(time.perf_counter() - start, "delta")
+        self.notify_replicated(events, set(values or {}))
+        return changed
+
+    def notify_replicated(self, events: List[Tuple[str, Dict[str, Any], str]], replaced: Iterable[str] = ()) -> None:
+        # replaced 为整体替换的集合：其中的记录对象已全部换新，按未带 id 的批量变更通知 bulk_listeners，
+        # 持有旧记录对象的索引据此重建
+        for collection, item, action in events:
+            self.index_record(collection, item, action)
+            for listener in self.replica_listeners:
+                listener(collection, item, action)
+        for collection in replaced:
+            self.index_bulk(collection, None)
+            for bulk_listener in self.bulk_listeners:
+                bulk_listener(collection, None)
+
+    @staticmethod
+    def record_changes(
+        collection: str, before: List[Dict[str, Any]], after: List[Dict[str, Any]]
+    ) -> List[Tuple[str, Dict[str, Any], str]]:
+        old = {item.get("id"): item for item in before if isinstance(item, dict) and "id" in item}
+        events: List[Tuple[str, Dict[str, Any], str]] = []
+        for item in after:
+            if not isinstance(item, dict) or "id" not in item:
+                continue
+            known = old.pop(item["id"], None)
+            if known is None:
+                events.append((collection, item, "create"))
+            elif known != item:
+                events.append((collection, item, "update"))
+        events.extend((collection, item, "delete") for item in old.values())
+        return events
 
     def get_collection(self, name: str) -> List[Dict[str, Any]]:
         if name not in self.data:
             self.data[name] = []
         return self.data[name]
 
-    def next_id(self, collection: str) -> int:
-        coll = self.get_collection(collection)
-        if not coll:
-            return 1
-        return max(item.get("id", 0) for item in coll) + 1
+    def next_id(self, collection: str, count: int = 1) -> int:
+        # id 不复用：已分配过的最大 id 记在 id_sequences 中随文档保存，删除末尾记录后新建的记录也不会拿到旧 id，
+        # 客户端手里旧记录的 ETag（W/"v<version>"）与 If-Match 因此不会误配到新记录上。
+        # 批量新建时一次预留 count 个连续 id，返回第一个
+        with self.lock:
+            coll = self.get_collection(collection)
+            sequences = self.data.setdefault("id_sequences", {})
+            latest = max([sequences.get(collection, 0)] + [item.get("id", 0) for item in coll])
+            sequences[collection] = latest + count
+            return latest + 1
 
     def find_by_id(self, collection: str, item_id: int) -> Optional[Dict[str, Any]]:
-        return next((item for item in self.get_collection(collection) if item.get("id") == item_id), None)
+        # 走增量维护的 id 索引，不线性扫描集合：事件循环中的详情读取、条件请求与审计快照都会调用
+        rows = self.index(collection, "id").get(item_id)
+        return rows[0] if rows else None
 
     def delete_by_id(self, collection: str, item_id: int) -> bool:
-        coll = self.get_collection(collection)
-        initial = len(coll)
-        self.data[collection] = [item for item in coll if item.get("id") != item_id]
-        return len(self.data[collection]) != initial
+        with self.lock:
+            removed = self.find_by_id(collection, item_id)
+            if removed is not None:
+                self.remove(collection, [removed])
+        return removed is not None
 
     def touch(self) -> None:
         self.save()
 
+    def mark_changed(
+        self,
+        collection: str,
+        item: Optional[Dict[str, Any]] = None,
+        action: str = "update",
+        ids: Optional[Iterable[Any]] = None,
+    ) -> None:
+        # item 非空时把这次变更（create / update / delete）通知给订阅者，
+        # 并维护记录自身的 version：新建为 1，每次更新加一。批量变更（item 为空）只通知
+        # bulk_listeners，ids 为涉及的记录 id（新建、修改或删除），未知时为 None
+        with self.lock:
+            self.versions[collection] = self.versions.get(collection, 0) + 1
+            self.modified[collection] = time.time()
+            if item is not None and action == "create":
+                item.setdefault("version", 1)
+            elif item is not None and action == "update":
+                item["version"] = item.get("version", 1) + 1
+        if item is not None:
+            self.index_record(collection, item, action)
+            for listener in self.listeners:
+                listener(collection, item, action)
+        else:
+            bulk = None if ids is None else list(ids)
+            self.index_bulk(collection, bulk)
+            for bulk_listener in self.bulk_listeners:
+                bulk_listener(collection, bulk)
+
+    def apply_update(
+        self, collection: str, item: Dict[str, Any], changes: Dict[str, Any], expected: Optional[int] = None
+    ) -> Dict[str, Any]:
+        # 比较并更新：expected 与记录当前版本不一致时抛出 VersionConflict，否则合并后由
+        # mark_changed 把版本号加一。只在比较与合并期间持锁，落盘仍由调用方完成
+        with self.lock:
+            current = item.get("version", 1)
+            if expected is not None and expected != current:
+                raise VersionConflict(current)
+            item.update(changes)
+            self.mark_changed(collection, item)
+        return item
+
+    def subscribe(self, listener: Callable[[str, Dict[str, Any], str], None], replicated: bool = True) -> None:
+        # replicated=False 的订阅者只接收本进程产生的变更，不接收 reload 补发的其他进程的变更
+        self.listeners.append(listener)
+        if replicated:
+            self.replica_listeners.append(listener)
+
+    def subscribe_bulk(self, listener: Callable[[str, Optional[List[Any]]], None]) -> None:
+        self.bulk_listeners.append(listener)
+
+    def version(self, collection: str) -> int:
+        return self.versions.get(collection, 0)
+
+    def last_modified(self, collection: str) -> float:
+        # 进程启动后未变更过的集合以加载时间为准
+        return self.modified.get(collection, self.loaded_at)
+
+    def index(self, collection: str, field: str) -> Dict[Any, List[Dict[str, Any]]]:
+        # 字段值 -> 记录列表（按 id 排列）；单条变更由 index_record 增量维护，只有集合被整体替换
+        # 或批量变更无法按 id 补写时才在下次读取时重建
+        coll = self.get_collection(collection)
+        cached = self.indexes.get((collection, field))
+        if cached is not None and not cached.stale and cached.source is coll:
+            STORE_INDEX.inc(1, collection, field, "hit")
+            return cached.buckets
+        # 重建不加锁，事件循环中的读接口也可以调用：变更计数在遍历前读取，遍历期间有变更时
+        # 重建结果标记为过期，下次读取时再重建
+        STORE_INDEX.inc(1, collection, field, "rebuild")
+        events = self.index_events.get(collection, 0)
+        with STORE_INDEX_BUILD.time(collection):
+            built = FieldIndex(field, coll)
+        built.stale = self.index_events.get(collection, 0) != events
+        self.indexes[(collection, field)] = built
+        return built.buckets
+
+    def index_record(self, collection: str, item: Dict[str, Any], action: str) -> None:
+        self.index_events[collection] = self.index_events.get(collection, 0) + 1
+        current = self.data.get(collection)
+        for (name, _), index in list(self.indexes.items()):
+            if name != collection:
+                continue
+            if action == "delete":
+                # remove 重建集合列表后逐条发出删除事件，其余记录对象不变，索引跟随新列表
+                index.source = current
+                index.drop(item)
+            else:
+                index.put(item)
+
+    def index_bulk(self, collection: str, ids: Optional[List[Any]]) -> None:
+        # 批量变更：已知记录按 id 重新写入索引；新 id 只在恰好是集合末尾追加的记录时补写，
+        # 其余情况（整体替换、列表被重建、未带 id）标记为过期
+        self.index_events[collection] = self.index_events.get(collection, 0) + 1
+        current = self.data.get(collection)
+        for (name, _), index in list(self.indexes.items()):
+            if name != collection or index.stale:
+                continue
+            if ids is None or index.source is not current:
+                index.stale = True
+                continue
+            fresh = [item_id for item_id in ids if item_id not in index.rows]
+            tail = current[len(current) - len(fresh) :] if fresh else []
+            if {item.get("id") for item in tail} != set(fresh):
+                index.stale = True
+                continue
+            for item_id in ids:
+                row = index.rows.get(item_id)
+                if row is not None:
+                    index.put(row)
+            for item in tail:
+                index.put(item)
+
     def dashboard_overview(self) -> Dict[str, Any]:
         projects = self.data["projects"]
         assets = self.data["assets"]
@@ -559,4 +986,18 @@ class DataStore:
         }
 
 
-store = DataStore()
+store = DataStore(read_only=STORE_ROLE == "replica")
+registry.gauge(
+    "nas_store_operations_total",
+    "DataStore 保存相关计数（saves / asyncSaves / coalesced / retries）",
+    ("operation",),
+    lambda: {(name,): value for name, value in store.stats.items()},
+    kind="counter",
+)
+registry.gauge("nas_store_pending_saves", "排队中尚未开始的异步保存", (), lambda: {(): int(store.pending_save is not None)})
+registry.gauge(
+    "nas_store_records",
+    "各集合记录数",
+    ("collection",),
+    lambda: {(name,): len(value) for name, value in store.data.items() if isinstance(value, list)},
+)
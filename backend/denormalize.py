@@ -0,0 +1,242 @@
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from .datastore import DataStore, iso_now, store
+from .metrics import registry
+from .project_ops import touch
+
+BATCH_SIZE = 1000
+# 两批之间让出存储锁，请求线程的写操作不必等整个项目传播完
+BATCH_PAUSE = 0.005
+
+
+class Derived:
+    # 一条冗余字段声明：target 集合中 key 指向 source 集合的记录，fields 为 {冗余字段: 来源字段}。
+    # follow=True 的字段不一定是来源的副本，只更新仍等于来源旧值的记录
+    __slots__ = ("target", "key", "source", "fields", "follow")
+
+    def __init__(self, target: str, key: str, source: str, fields: Dict[str, str], follow: bool = False) -> None:
+        self.target = target
+        self.key = key
+        self.source = source
+        self.fields = fields
+        self.follow = follow
+
+
+# 素材的 owner 可能是导入任务的发起人（importer 写入 createdBy），只有沿用项目负责人的记录才跟随改名
+DENORMALIZED = (
+    Derived("assets", "projectId", "projects", {"projectName": "name", "clientName": "clientName"}),
+    Derived("assets", "projectId", "projects", {"owner": "ownerName"}, follow=True),
+    Derived("tier_policies", "projectId", "projects", {"projectName": "name"}),
+)
+
+
+class Propagation:
+    __slots__ = ("rule", "source_id", "values", "previous", "rows", "position", "generation", "enqueued", "updated")
+
+    def __init__(self, rule: int, source_id: Any, values: Dict[str, Any]) -> None:
+        self.rule = rule
+        self.source_id = source_id
+        self.values = values
+        # follow 字段：来源在本次传播完成前出现过的旧值
+        self.previous: Dict[str, Set[Any]] = {}
+        self.rows: Optional[List[Dict[str, Any]]] = None
+        self.position = 0
+        self.generation = 0
+        self.enqueued = time.time()
+        self.updated = 0
+
+
+class Denormalizer:
+    # 订阅来源集合的单条变更：声明中的来源字段取值变化时登记一次传播，由后台线程按外键索引
+    # （store.index(target, key)）取出目标记录，每批 BATCH_SIZE 条在存储锁内改写，批与批之间释放锁，
+    # 每批按批量变更递增一次目标集合的版本号并合并保存。同一来源记录在传播完成前再次变更时
+    # 合并为一次传播，从头按最新取值重扫。未完成传播中最早一条的等待时间即收敛延迟
+    def __init__(self, data_store: DataStore, rules: Tuple[Derived, ...] = DENORMALIZED) -> None:
+        self.store = data_store
+        self.rules = rules
+        self.lock = threading.Condition(threading.RLock())
+        self.pending: Dict[Tuple[int, Any], Propagation] = {}
+        # (来源集合, 记录 id) -> 各来源字段最近一次的取值，用于在变更事件中得到旧值
+        self.sources: Dict[Tuple[str, Any], Dict[str, Any]] = {}
+        self.worker: Optional[threading.Thread] = None
+        self.stats = {"changes": 0, "propagations": 0, "batches": 0, "rowsUpdated": 0, "lastLagSeconds": 0.0}
+        self.last_converged: Optional[str] = None
+        for name in {rule.source for rule in rules}:
+            for item in data_store.get_collection(name):
+                self.sources[(name, item.get("id"))] = self.source_values(name, item)
+        # 只处理本进程的写入：replica 同步时补发的变更由 primary 负责传播
+        data_store.subscribe(self.on_change, replicated=False)
+
+    def source_values(self, source: str, item: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            field: item.get(field) for rule in self.rules if rule.source == source for field in rule.fields.values()
+        }
+
+    def on_change(self, collection: str, item: Dict[str, Any], action: str) -> None:
+        rules = [index for index, rule in enumerate(self.rules) if rule.source == collection]
+        if not rules:
+            return
+        key = (collection, item.get("id"))
+        with self.lock:
+            if action == "delete":
+                self.sources.pop(key, None)
+                for index in rules:
+                    self.pending.pop((index, item.get("id")), None)
+                return
+            old = self.sources.get(key)
+            current = self.source_values(collection, item)
+            self.sources[key] = current
+            if action == "create" or old == current:
+                return
+            self.stats["changes"] += 1
+            for index in rules:
+                rule = self.rules[index]
+                if old is not None and all(old[field] == current[field] for field in rule.fields.values()):
+                    continue
+                if rule.follow and old is None:
+                    continue  # 不知道旧值时无法判断哪些记录是副本
+                values = {derived: current[field] for derived, field in rule.fields.items()}
+                job = self.pending.get((index, item.get("id")))
+                if job is None:
+                    job = self.pending[(index, item.get("id"))] = Propagation(index, item.get("id"), values)
+                else:
+                    job.values = values
+                    job.rows = None
+                    job.position = 0
+                    job.generation += 1
+                if rule.follow:
+                    for derived, field in rule.fields.items():
+                        job.previous.setdefault(derived, set()).add(old[field])
+            self.ensure_worker()
+            self.lock.notify()
+
+    def reconcile(self) -> int:
+        # 按来源当前取值重新登记所有非 follow 的传播，用于修复历史数据中已过期的冗余字段
+        queued = 0
+        with self.store.lock, self.lock:
+            for index, rule in enumerate(self.rules):
+                if rule.follow:
+                    continue
+                for item in self.store.get_collection(rule.source):
+                    self.sources[(rule.source, item.get("id"))] = self.source_values(rule.source, item)
+                    values = {derived: item.get(field) for derived, field in rule.fields.items()}
+                    job = self.pending.get((index, item.get("id")))
+                    if job is None:
+                        self.pending[(index, item.get("id"))] = Propagation(index, item.get("id"), values)
+                    else:
+                        job.values, job.rows, job.position = values, None, 0
+                        job.generation += 1
+                    queued += 1
+            if queued:
+                self.ensure_worker()
+                self.lock.notify()
+        return queued
+
+    def ensure_worker(self) -> None:
+        if self.worker is None or not self.worker.is_alive():
+            self.worker = threading.Thread(target=self.loop, name="denormalizer", daemon=True)
+            self.worker.start()
+
+    def loop(self) -> None:
+        while True:
+            with self.lock:
+                while not self.pending:
+                    self.lock.wait()
+            if self.run_once():
+                time.sleep(BATCH_PAUSE)
+
+    def run_once(self) -> bool:
+        # 处理最早登记的传播中的一批记录；没有待处理的传播时返回 False
+        with self.lock:
+            if not self.pending:
+                return False
+            job = min(self.pending.values(), key=lambda item: item.enqueued)
+            rule = self.rules[job.rule]
+            generation, values, rows, start = job.generation, dict(job.values), job.rows, job.position
+            previous = {derived: set(olds) for derived, olds in job.previous.items()}
+        updated: List[Any] = []
+        with self.store.lock:
+            if rows is None:
+                rows = list(self.store.index(rule.target, rule.key).get(job.source_id, ()))
+            for row in rows[start : start + BATCH_SIZE]:
+                if row.get(rule.key) != job.source_id:
+                    continue  # 已移到其他来源记录下
+                changes = {
+                    derived: value
+                    for derived, value in values.items()
+                    if row.get(derived) != value and (not rule.follow or row.get(derived) in previous.get(derived, ()))
+                }
+                if changes:
+                    touch(row, changes)
+                    updated.append(row.get("id"))
+            if updated:
+                self.store.mark_changed(rule.target, ids=updated)
+        with self.lock:
+            self.stats["batches"] += 1
+            self.stats["rowsUpdated"] += len(updated)
+            job.updated += len(updated)
+            if job.generation == generation:
+                job.rows = rows
+                job.position = start + BATCH_SIZE
+                if job.position >= len(rows) and self.pending.get((job.rule, job.source_id)) is job:
+                    del self.pending[(job.rule, job.source_id)]
+                    self.stats["propagations"] += 1
+                    self.stats["lastLagSeconds"] = round(time.time() - job.enqueued, 3)
+                    self.last_converged = iso_now()
+        if updated:
+            self.store.schedule_save()
+        return True
+
+    def drain(self) -> int:
+        batches = 0
+        while self.run_once():
+            batches += 1
+        return batches
+
+    def lag(self) -> float:
+        with self.lock:
+            if not self.pending:
+                return 0.0
+            return max(0.0, time.time() - min(job.enqueued for job in self.pending.values()))
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.time()
+        with self.lock:
+            jobs = sorted(self.pending.values(), key=lambda item: item.enqueued)
+            pending = [
+                {
+                    "target": self.rules[job.rule].target,
+                    "fields": sorted(self.rules[job.rule].fields),
+                    "source": self.rules[job.rule].source,
+                    "sourceId": job.source_id,
+                    "waitingSeconds": round(now - job.enqueued, 3),
+                    "rows": None if job.rows is None else len(job.rows),
+                    "remaining": None if job.rows is None else max(0, len(job.rows) - job.position),
+                    "updated": job.updated,
+                }
+                for job in jobs
+            ]
+            return {
+                "rules": [
+                    {"target": rule.target, "key": rule.key, "source": rule.source, "fields": rule.fields, "follow": rule.follow}
+                    for rule in self.rules
+                ],
+                "lagSeconds": round(now - jobs[0].enqueued, 3) if jobs else 0.0,
+                "lastConvergedAt": self.last_converged,
+                "pending": pending,
+                **self.stats,
+            }
+
+
+denormalizer = Denormalizer(store)
+
+registry.gauge(
+    "nas_denormalization_lag_seconds", "最早一条未完成的冗余字段传播已等待的时间", (), lambda: {(): denormalizer.lag()}
+)
+registry.gauge(
+    "nas_denormalization_pending", "未完成的冗余字段传播数", (), lambda: {(): len(denormalizer.pending)}
+)
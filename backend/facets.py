@@ -0,0 +1,683 @@
+from __future__ import annotations
+
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+from .datastore import DataStore, store
+
+FACET_FIELDS = ("projectId", "tierLevel", "fileType", "camera", "location", "tags", "resolution")
+# 范围条件与排序使用的有序索引：数值字段按浮点数比较，日期字段按 ISO 字符串比较
+RANGE_FIELDS = {"size": "number", "duration": "number", "shootDate": "date", "createdAt": "date"}
+MULTI_VALUED = {"tags"}
+# 取值覆盖的素材数超过 总数 / SPARSE_RATIO 时用位图，否则用槽位集合（与 roaring 的 bitmap / array 容器同理）
+SPARSE_RATIO = 256
+# 位图按 CHUNK_BITS 个槽位分块保存，单个素材变更只重建所在的块（8KB），不复制整张位图
+CHUNK_BITS = 1 << 16
+CHUNK_BYTES = CHUNK_BITS >> 3
+# 批量变更涉及的素材超过槽位数的 1/PENDING_RATIO 时直接重建，不再逐条补写
+PENDING_RATIO = 8
+FACET_LIMIT = 20
+# 检索请求中的条件名 -> 素材字段
+SEARCH_FILTERS = {
+    "projectIds": "projectId",
+    "tierLevel": "tierLevel",
+    "fileType": "fileType",
+    "camera": "camera",
+    "location": "location",
+    "tags": "tags",
+}
+
+# 相对当前候选集的估计行数超过该倍数时，条件改为逐行校验候选，而不再走索引生成位图
+FILTER_FACTOR = 4
+# 结果数不足总数的 1/SORT_SCAN_RATIO 时直接排序结果，否则按有序索引顺序遍历
+SORT_SCAN_RATIO = 16
+RANGE_OPERATORS = ("gt", "gte", "lt", "lte")
+
+Container = Union["Chunks", Set[int]]
+# 解析后的条件树：("and" | "or", [子节点]) / ("not", 子节点) / ("in" | "all", 字段, 取值)
+# / ("range", 字段, 边界) / ("keyword", 关键字)
+Node = Tuple[Any, ...]
+
+
+def bitmap_from(slots: Iterable[int], size: int) -> int:
+    buffer = bytearray((size >> 3) + 1)
+    for slot in slots:
+        buffer[slot >> 3] |= 1 << (slot & 7)
+    return int.from_bytes(buffer, "little")
+
+
+class Chunks:
+    # 分块位图：chunks[i] 为槽位 [i * CHUNK_BITS, (i + 1) * CHUNK_BITS) 的位，count 为置位数；
+    # 查询时拼接为一个整数位图，拼接结果缓存到下次修改
+    __slots__ = ("chunks", "count", "joined")
+
+    def __init__(self, bitmap: int = 0) -> None:
+        data = bitmap.to_bytes((bitmap.bit_length() + 7) >> 3, "little")
+        self.chunks = [
+            int.from_bytes(data[start : start + CHUNK_BYTES], "little") for start in range(0, len(data), CHUNK_BYTES)
+        ]
+        self.count = bitmap.bit_count()
+        self.joined: Optional[int] = bitmap
+
+    def __len__(self) -> int:
+        return self.count
+
+    def add(self, slot: int) -> None:
+        index, bit = slot // CHUNK_BITS, 1 << (slot % CHUNK_BITS)
+        if index >= len(self.chunks):
+            self.chunks.extend([0] * (index + 1 - len(self.chunks)))
+        if not self.chunks[index] & bit:
+            self.chunks[index] |= bit
+            self.count += 1
+            self.joined = None
+
+    def discard(self, slot: int) -> None:
+        index, bit = slot // CHUNK_BITS, 1 << (slot % CHUNK_BITS)
+        if index < len(self.chunks) and self.chunks[index] & bit:
+            self.chunks[index] &= ~bit
+            self.count -= 1
+            self.joined = None
+
+    def bitmap(self) -> int:
+        if self.joined is None:
+            data = b"".join(chunk.to_bytes(CHUNK_BYTES, "little") for chunk in self.chunks)
+            self.joined = int.from_bytes(data, "little")
+        return self.joined
+
+
+def iter_bits(bitmap: int) -> Iterator[int]:
+    # 按槽位从小到大枚举置位的位
+    text = bin(bitmap)[:1:-1]
+    position = text.find("1")
+    while position >= 0:
+        yield position
+        position = text.find("1", position + 1)
+
+
+def as_list(value: Any) -> List[Any]:
+    # 条件取值可以是单个值或列表；None、空字符串与空列表表示不限
+    if value is None or value == "" or value is False:
+        return []
+    return list(value) if isinstance(value, (list, tuple, set)) else [value]
+
+
+def range_key(field: str, value: Any) -> Any:
+    if RANGE_FIELDS[field] == "number":
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return None
+        return float(value)
+    return value if isinstance(value, str) and value else None
+
+
+def field_values(asset: Dict[str, Any], field: str) -> Tuple[Any, ...]:
+    value = asset.get(field)
+    if field in MULTI_VALUED:
+        return tuple({item for item in value if isinstance(item, (str, int))}) if isinstance(value, list) else ()
+    if value is None or isinstance(value, (list, dict)):
+        return ()
+    return (value,)
+
+
+class RangeIndex:
+    # 按 (取值, 槽位) 排序的两个平行数组；槽位用 array 紧凑存储，插入删除为一次内存移动
+    def __init__(self, kind: str, pairs: List[Tuple[Any, int]]) -> None:
+        pairs.sort()
+        self.keys: Any = array("d", [key for key, _ in pairs]) if kind == "number" else [key for key, _ in pairs]
+        self.slots = array("l", [slot for _, slot in pairs])
+        self.upper = "\uffff" if kind == "date" else None
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def position(self, key: Any, slot: int) -> int:
+        low, high = bisect_left(self.keys, key), bisect_right(self.keys, key)
+        return low + bisect_left(self.slots[low:high], slot) if high > low else low
+
+    def insert(self, key: Any, slot: int) -> None:
+        position = self.position(key, slot)
+        self.keys.insert(position, key)
+        self.slots.insert(position, slot)
+
+    def remove(self, key: Any, slot: int) -> None:
+        position = self.position(key, slot)
+        if position < len(self.slots) and self.slots[position] == slot and self.keys[position] == key:
+            del self.keys[position]
+            del self.slots[position]
+
+    def span(self, bounds: Dict[str, Any]) -> Tuple[int, int]:
+        # bounds 为 gt / gte / lt / lte；日期的 lte 包含以该前缀开头的全部时间（"2023-12-31" 含当天）
+        low, high = 0, len(self.keys)
+        if "gte" in bounds:
+            low = max(low, bisect_left(self.keys, bounds["gte"]))
+        if "gt" in bounds:
+            key = bounds["gt"] + self.upper if self.upper else bounds["gt"]
+            low = max(low, bisect_right(self.keys, key))
+        if "lt" in bounds:
+            high = min(high, bisect_left(self.keys, bounds["lt"]))
+        if "lte" in bounds:
+            key = bounds["lte"] + self.upper if self.upper else bounds["lte"]
+            high = min(high, bisect_right(self.keys, key))
+        return low, max(low, high)
+
+
+class FacetState:
+    # 一次全量构建得到的索引：素材按集合中的顺序分配槽位，新建的素材追加在末尾，
+    # 删除只清除 alive 位，空槽在下次重建时回收。pending 为批量变更涉及、尚未补写的素材 id，
+    # stale 表示集合被整体替换，需要重建
+    def __init__(self, assets: List[Dict[str, Any]]) -> None:
+        self.pending: Set[Any] = set()
+        self.stale = False
+        self.slots: List[Optional[Dict[str, Any]]] = list(assets)
+        self.slot_of: Dict[Any, int] = {}
+        self.values: List[Dict[str, Tuple[Any, ...]]] = []
+        self.keys: List[Dict[str, Any]] = []
+        postings: Dict[str, Dict[Any, List[int]]] = {field: {} for field in FACET_FIELDS}
+        pairs: Dict[str, List[Tuple[Any, int]]] = {field: [] for field in RANGE_FIELDS}
+        for slot, asset in enumerate(self.slots):
+            self.slot_of[asset.get("id")] = slot
+            row = {field: field_values(asset, field) for field in FACET_FIELDS}
+            self.values.append(row)
+            for field, values in row.items():
+                for value in values:
+                    postings[field].setdefault(value, []).append(slot)
+            keys = {field: range_key(field, asset.get(field)) for field in RANGE_FIELDS}
+            self.keys.append(keys)
+            for field, key in keys.items():
+                if key is not None:
+                    pairs[field].append((key, slot))
+        self.ranges = {field: RangeIndex(kind, pairs[field]) for field, kind in RANGE_FIELDS.items()}
+        size = len(self.slots)
+        self.alive = Chunks((1 << size) - 1)
+        self.holes = 0
+        self.containers: Dict[str, Dict[Any, Container]] = {
+            field: {
+                value: Chunks(bitmap_from(slots, size)) if len(slots) * SPARSE_RATIO > size else set(slots)
+                for value, slots in values.items()
+            }
+            for field, values in postings.items()
+        }
+
+    def add_value(self, field: str, value: Any, slot: int) -> None:
+        containers = self.containers[field]
+        container = containers.get(value)
+        if container is None:
+            containers[value] = {slot}
+        elif isinstance(container, set):
+            container.add(slot)
+            if len(container) * SPARSE_RATIO > len(self.slots):
+                containers[value] = Chunks(bitmap_from(container, len(self.slots)))
+        else:
+            container.add(slot)
+
+    def remove_value(self, field: str, value: Any, slot: int) -> None:
+        containers = self.containers[field]
+        container = containers.get(value)
+        if container is not None:
+            container.discard(slot)
+            if not container:
+                del containers[value]
+
+    def apply(self, asset: Dict[str, Any], action: str) -> None:
+        # 可重复执行：create / update 都按“移除旧取值、写入新取值”处理，只改动取值有变化的字段
+        slot = self.slot_of.get(asset.get("id"))
+        live = slot is not None and self.slots[slot] is not None
+        if action == "delete":
+            if live:
+                self.write(slot, {field: () for field in FACET_FIELDS}, {field: None for field in RANGE_FIELDS})
+                self.slots[slot] = None
+                self.alive.discard(slot)
+                self.holes += 1
+            return
+        if slot is None:
+            slot = len(self.slots)
+            self.slot_of[asset.get("id")] = slot
+            self.slots.append(None)
+            self.values.append({field: () for field in FACET_FIELDS})
+            self.keys.append({field: None for field in RANGE_FIELDS})
+            self.holes += 1
+        if self.slots[slot] is None:
+            self.holes -= 1
+        self.slots[slot] = asset
+        self.alive.add(slot)
+        self.write(
+            slot,
+            {field: field_values(asset, field) for field in FACET_FIELDS},
+            {field: range_key(field, asset.get(field)) for field in RANGE_FIELDS},
+        )
+
+    def write(self, slot: int, row: Dict[str, Tuple[Any, ...]], keys: Dict[str, Any]) -> None:
+        for field, values in row.items():
+            old = self.values[slot][field]
+            if old == values:
+                continue
+            for value in old:
+                if value not in values:
+                    self.remove_value(field, value, slot)
+            for value in values:
+                if value not in old:
+                    self.add_value(field, value, slot)
+        self.values[slot] = row
+        for field, key in keys.items():
+            old = self.keys[slot][field]
+            if old == key:
+                continue
+            if old is not None:
+                self.ranges[field].remove(old, slot)
+            if key is not None:
+                self.ranges[field].insert(key, slot)
+        self.keys[slot] = keys
+
+    def size(self, field: str, value: Any) -> int:
+        container = self.containers[field].get(value)
+        return 0 if container is None else len(container)
+
+    def range_bitmap(self, field: str, bounds: Dict[str, Any]) -> int:
+        index = self.ranges[field]
+        low, high = index.span(bounds)
+        return bitmap_from(index.slots[low:high], len(self.slots))
+
+    def union(self, field: str, values: Iterable[Any]) -> int:
+        bitmap = 0
+        sparse: List[int] = []
+        for value in values:
+            container = self.containers[field].get(value)
+            if isinstance(container, set):
+                sparse.extend(container)
+            elif container is not None:
+                bitmap |= container.bitmap()
+        return bitmap | bitmap_from(sparse, len(self.slots)) if sparse else bitmap
+
+    def counts(self, field: str, base: int, limit: int) -> List[Dict[str, Any]]:
+        base_bytes: Optional[bytes] = None
+        buckets: List[Tuple[int, Any]] = []
+        for value, container in self.containers[field].items():
+            if isinstance(container, set):
+                if base_bytes is None:
+                    base_bytes = base.to_bytes((len(self.slots) >> 3) + 1, "little")
+                count = sum(1 for slot in container if base_bytes[slot >> 3] >> (slot & 7) & 1)
+            else:
+                count = (container.bitmap() & base).bit_count()
+            if count:
+                buckets.append((count, value))
+        buckets.sort(key=lambda bucket: (-bucket[0], str(bucket[1])))
+        return [{"value": value, "count": count} for count, value in buckets[:limit]]
+
+
+class FacetIndex:
+    # 素材的分面索引：每个字段取值对应一个分块位图（或稀疏时的槽位集合）。订阅 DataStore 的单条变更增量维护；
+    # 批量变更只带 id，记入 pending，下次查询前按 id 取回素材补写；未带 id 的批量变更
+    # （replica 整体替换素材集合等）、待补写或空槽过多时才在下次查询前全量重建
+    def __init__(self, data_store: DataStore) -> None:
+        self.store = data_store
+        self.lock = threading.Lock()
+        self.state: Optional[FacetState] = None
+        self.stats = {"rebuilds": 0, "updates": 0, "catchUps": 0, "queries": 0}
+        data_store.subscribe(self.on_change)
+        data_store.subscribe_bulk(self.on_bulk)
+
+    def on_change(self, collection: str, item: Dict[str, Any], action: str) -> None:
+        if collection != "assets":
+            return
+        with self.lock:
+            if self.state is None:
+                return
+            self.state.apply(item, action)
+            self.stats["updates"] += 1
+
+    def on_bulk(self, collection: str, ids: Optional[List[Any]]) -> None:
+        if collection != "assets":
+            return
+        with self.lock:
+            if self.state is None:
+                return
+            if ids is None:
+                self.state.stale = True
+            else:
+                self.state.pending.update(ids)
+
+    def current(self) -> FacetState:
+        # 调用方持有 self.lock
+        state = self.state
+        if (
+            state is None
+            or state.stale
+            or state.holes > max(1024, len(state.slots) // 2)
+            or len(state.pending) > max(1024, len(state.slots) // PENDING_RATIO)
+        ):
+            state = self.state = FacetState(self.store.get_collection("assets"))
+            self.stats["rebuilds"] += 1
+        elif state.pending:
+            # 按 id 取回批量变更涉及的素材重新写入，已不在集合中的按删除处理
+            by_id = self.store.index("assets", "id")
+            for asset_id in state.pending:
+                rows = by_id.get(asset_id)
+                state.apply(rows[0] if rows else {"id": asset_id}, "update" if rows else "delete")
+            self.stats["updates"] += len(state.pending)
+            self.stats["catchUps"] += 1
+            state.pending.clear()
+        return state
+
+    def search(
+        self,
+        filters: Dict[str, List[Any]],
+        keyword: Optional[str] = None,
+        visible: Optional[Iterable[int]] = None,
+        facets: Iterable[str] = (),
+        facet_limit: int = FACET_LIMIT,
+        offset: int = 0,
+        limit: Optional[int] = None,
+        query: Optional[Node] = None,
+        sort: Optional[Tuple[str, bool]] = None,
+        explain: bool = False,
+    ) -> Dict[str, Any]:
+        # filters: 字段 -> 取值列表（同一字段内为“或”，字段之间为“与”）；visible 为可见项目；
+        # query 为 parse_query 解析后的条件树，由 QueryPlanner 求值后与其余条件相与。
+        # 每个分面的计数按“除该字段自身外的全部条件”计算，已选中的分面仍能看到其他取值的数量
+        facets = [field for field in facets if field in FACET_FIELDS]
+        plan: List[Dict[str, Any]] = []
+        with self.lock:
+            self.stats["queries"] += 1
+            state = self.current()
+            base = state.alive.bitmap()
+            if visible is not None:
+                base &= state.union("projectId", visible)
+            selected = {field: state.union(field, values) for field, values in filters.items() if values}
+            if query is not None:
+                base &= QueryPlanner(state, plan).evaluate(query)
+        everything = base
+        for bitmap in selected.values():
+            everything &= bitmap
+        if keyword:
+            # 关键字无法走索引：只扫描可能出现在结果或任一分面计数中的素材
+            candidates = everything
+            for field in facets:
+                partial = base
+                for other, bitmap in selected.items():
+                    if other != field:
+                        partial &= bitmap
+                candidates |= partial
+            matched = bitmap_from(
+                (slot for slot in iter_bits(candidates) if keyword_match(state.slots[slot], keyword)), len(state.slots)
+            )
+            base &= matched
+            everything &= matched
+        counts: Dict[str, List[Dict[str, Any]]] = {}
+        with self.lock:
+            for field in facets:
+                partial = base
+                for other, bitmap in selected.items():
+                    if other != field:
+                        partial &= bitmap
+                counts[field] = state.counts(field, partial, facet_limit)
+            stop = None if limit is None else offset + limit
+            if sort is None:
+                items = (state.slots[slot] for slot in iter_bits(everything))
+                page = list(islice((item for item in items if item is not None), offset, stop))
+            else:
+                page = ordered(state, everything, sort[0], sort[1], stop)[offset:stop]
+        result: Dict[str, Any] = {"items": page, "total": everything.bit_count(), "facets": counts}
+        if explain:
+            result["plan"] = plan
+        return result
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            state = self.state
+            if state is None:
+                return {"built": False, **self.stats}
+            dense = sum(
+                1 for containers in state.containers.values() for container in containers.values() if isinstance(container, Chunks)
+            )
+            return {
+                "built": True,
+                "slots": len(state.slots),
+                "holes": state.holes,
+                "pending": len(state.pending),
+                "values": {field: len(containers) for field, containers in state.containers.items()},
+                "bitmaps": dense,
+                **self.stats,
+            }
+
+
+def parse_query(node: Any) -> Node:
+    # {"and": [...]} / {"or": [...]} / {"not": {...}} / {"keyword": "..."} /
+    # {"field": "tierLevel", "eq": "cold"} / {"field": "tags", "in" | "any" | "all": [...]} /
+    # {"field": "size", "gt": 5, "lte": 20}；格式不正确时抛出 ValueError
+    if not isinstance(node, dict):
+        raise ValueError("检索条件应为对象")
+    for operator in ("and", "or"):
+        if operator in node:
+            children = node[operator]
+            if not isinstance(children, list) or not children:
+                raise ValueError(f"{operator} 应为非空的条件列表")
+            return (operator, [parse_query(child) for child in children])
+    if "not" in node:
+        return ("not", parse_query(node["not"]))
+    if "keyword" in node:
+        if not isinstance(node["keyword"], str) or not node["keyword"]:
+            raise ValueError("keyword 应为非空字符串")
+        return ("keyword", node["keyword"])
+    field = node.get("field")
+    if not isinstance(field, str) or not field:
+        raise ValueError("条件缺少 field")
+    bounds = {operator: node[operator] for operator in RANGE_OPERATORS if operator in node}
+    if bounds:
+        if field not in RANGE_FIELDS:
+            raise ValueError(f"{field} 不支持范围条件，可用字段：{', '.join(RANGE_FIELDS)}")
+        normalized = {operator: range_key(field, value) for operator, value in bounds.items()}
+        if any(value is None for value in normalized.values()):
+            kind = "数字" if RANGE_FIELDS[field] == "number" else "日期字符串"
+            raise ValueError(f"{field} 的范围边界应为{kind}")
+        return ("range", field, normalized)
+    if "all" in node:
+        return ("all", field, as_list(node["all"]))
+    for operator in ("eq", "in", "any"):
+        if operator in node:
+            return ("in", field, as_list(node[operator]))
+    raise ValueError(f"{field} 缺少比较运算（eq / in / any / all / gt / gte / lt / lte）")
+
+
+def search_conditions(payload: Dict[str, Any]) -> Tuple[Dict[str, List[Any]], Optional[str], Optional[Node]]:
+    # 检索请求 / 检索视图 conditions 中的条件部分 -> (等值条件, 关键字, 条件树)
+    filters = {field: as_list(payload.get(key)) for key, field in SEARCH_FILTERS.items()}
+    query = parse_query(payload["query"]) if payload.get("query") else None
+    return filters, payload.get("keyword") or None, query
+
+
+def condition_node(filters: Dict[str, List[Any]], keyword: Optional[str], query: Optional[Node]) -> Optional[Node]:
+    # 合并为一棵条件树，供 matches 逐条判断；没有任何条件时返回 None（匹配全部）
+    children: List[Node] = [("in", field, values) for field, values in filters.items() if values]
+    if keyword:
+        children.append(("keyword", keyword))
+    if query is not None:
+        children.append(query)
+    if not children:
+        return None
+    return children[0] if len(children) == 1 else ("and", children)
+
+
+def parse_sort(value: Any) -> Optional[Tuple[str, bool]]:
+    # "size" / "-size" / {"field": "size", "order": "desc"} -> (字段, 是否降序)
+    if value is None or value == "":
+        return None
+    if isinstance(value, dict):
+        field, descending = value.get("field"), str(value.get("order", "asc")).lower() == "desc"
+    elif isinstance(value, str):
+        field, descending = value.lstrip("-"), value.startswith("-")
+    else:
+        raise ValueError("sort 应为字段名或 {field, order}")
+    if not isinstance(field, str) or not field:
+        raise ValueError("sort 缺少字段名")
+    return field, descending
+
+
+def describe(node: Node) -> str:
+    kind = node[0]
+    if kind in ("and", "or"):
+        return f" {kind} ".join(f"({describe(child)})" for child in node[1])
+    if kind == "not":
+        return f"not ({describe(node[1])})"
+    if kind == "keyword":
+        return f"keyword ~ {node[1]}"
+    if kind == "range":
+        return " and ".join(f"{node[1]} {operator} {value}" for operator, value in node[2].items())
+    return f"{node[1]} {kind} {node[2]}"
+
+
+def matches(asset: Optional[Dict[str, Any]], node: Node) -> bool:
+    # 逐行校验单条素材，语义与索引求值一致
+    if asset is None:
+        return False
+    kind = node[0]
+    if kind == "and":
+        return all(matches(asset, child) for child in node[1])
+    if kind == "or":
+        return any(matches(asset, child) for child in node[1])
+    if kind == "not":
+        return not matches(asset, node[1])
+    if kind == "keyword":
+        return keyword_match(asset, node[1])
+    field = node[1]
+    if kind == "range":
+        key = range_key(field, asset.get(field))
+        return key is not None and in_bounds(key, node[2], RANGE_FIELDS[field] == "date")
+    value = asset.get(field)
+    values = set(field_values(asset, field)) if field in FACET_FIELDS else set(value if isinstance(value, list) else [value])
+    if kind == "all":
+        return all(item in values for item in node[2])
+    return any(item in values for item in node[2])
+
+
+def in_bounds(key: Any, bounds: Dict[str, Any], date: bool) -> bool:
+    upper = "\uffff" if date else None
+    if "gte" in bounds and not key >= bounds["gte"]:
+        return False
+    if "gt" in bounds and not key > (bounds["gt"] + upper if upper else bounds["gt"]):
+        return False
+    if "lt" in bounds and not key < bounds["lt"]:
+        return False
+    if "lte" in bounds and not key <= (bounds["lte"] + upper if upper else bounds["lte"]):
+        return False
+    return True
+
+
+class QueryPlanner:
+    # 在一个 FacetState 上求值条件树（调用方持有索引锁）。and 的子条件按估计行数从小到大求值：
+    # 最先求值的条件走分面位图 / 有序索引，后续条件的估计行数远大于当前候选集时改为逐行校验候选，
+    # 因此只要有一个条件能走索引，就不会扫描整张表；plan 记录每一步的估计行数、方式与实际行数
+    def __init__(self, state: FacetState, plan: List[Dict[str, Any]]) -> None:
+        self.state = state
+        self.plan = plan
+
+    def estimate(self, node: Node) -> int:
+        state, kind = self.state, node[0]
+        total = len(state.slots) - state.holes
+        if kind == "and":
+            return min(self.estimate(child) for child in node[1])
+        if kind == "or":
+            return min(total, sum(self.estimate(child) for child in node[1]))
+        if kind == "not":
+            return max(0, total - self.estimate(node[1]))
+        if kind == "range":
+            low, high = state.ranges[node[1]].span(node[2])
+            return high - low
+        if kind in ("in", "all") and node[1] in FACET_FIELDS:
+            sizes = [state.size(node[1], value) for value in node[2]]
+            if not sizes:
+                return total
+            return sum(sizes) if kind == "in" else min(sizes)
+        return total
+
+    def record(self, node: Node, estimate: int, method: str, bitmap: int) -> int:
+        self.plan.append({"step": describe(node), "estimate": estimate, "method": method, "rows": bitmap.bit_count()})
+        return bitmap
+
+    def evaluate(self, node: Node) -> int:
+        state, kind = self.state, node[0]
+        if kind == "and":
+            return self.conjunction(node[1])
+        if kind == "or":
+            bitmap = 0
+            for child in node[1]:
+                bitmap |= self.evaluate(child)
+            return bitmap
+        if kind == "not":
+            return state.alive.bitmap() & ~self.evaluate(node[1])
+        estimate = self.estimate(node)
+        if kind == "range":
+            return self.record(node, estimate, "index", state.range_bitmap(node[1], node[2]))
+        if kind in ("in", "all") and node[1] in FACET_FIELDS and node[2]:
+            if kind == "in":
+                return self.record(node, estimate, "index", state.union(node[1], node[2]))
+            bitmap = state.alive.bitmap()
+            for value in sorted(node[2], key=lambda value: state.size(node[1], value)):
+                bitmap &= state.union(node[1], [value])
+            return self.record(node, estimate, "index", bitmap)
+        return self.record(node, estimate, "scan", self.filter(state.alive.bitmap(), node))
+
+    def conjunction(self, children: List[Node]) -> int:
+        ordered_children = sorted(children, key=self.estimate)
+        bitmap: Optional[int] = None
+        for child in ordered_children:
+            if bitmap is not None:
+                if not bitmap:
+                    break
+                rows = bitmap.bit_count()
+                estimate = self.estimate(child)
+                if estimate > rows * FILTER_FACTOR:
+                    bitmap = self.record(child, estimate, "filter", self.filter(bitmap, child))
+                    continue
+                bitmap &= self.evaluate(child)
+            else:
+                bitmap = self.evaluate(child)
+        return bitmap if bitmap is not None else self.state.alive.bitmap()
+
+    def filter(self, candidates: int, node: Node) -> int:
+        slots = self.state.slots
+        return bitmap_from((slot for slot in iter_bits(candidates) if matches(slots[slot], node)), len(slots))
+
+
+def ordered(
+    state: FacetState, bitmap: int, field: str, descending: bool, stop: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    # 范围字段且结果较多时沿有序索引遍历，取够 stop 条即停止；其余情况取出结果后排序。
+    # 缺少该字段的素材排在最后
+    if field in RANGE_FIELDS and bitmap.bit_count() * SORT_SCAN_RATIO >= len(state.slots):
+        index = state.ranges[field]
+        member = bitmap.to_bytes((len(state.slots) >> 3) + 1, "little")
+        positions = range(len(index) - 1, -1, -1) if descending else range(len(index))
+        result: List[Dict[str, Any]] = []
+        for position in positions:
+            slot = index.slots[position]
+            if member[slot >> 3] >> (slot & 7) & 1:
+                result.append(state.slots[slot])
+                if stop is not None and len(result) >= stop:
+                    return result
+        return result + [state.slots[slot] for slot in iter_bits(bitmap) if state.keys[slot].get(field) is None]
+    items = [item for item in (state.slots[slot] for slot in iter_bits(bitmap)) if item is not None]
+    return sort_items(items, field, descending)
+
+
+def sort_items(items: List[Dict[str, Any]], field: str, descending: bool) -> List[Dict[str, Any]]:
+    key: Callable[[Dict[str, Any]], Any] = (
+        (lambda item: range_key(field, item.get(field))) if field in RANGE_FIELDS else (lambda item: item.get(field))
+    )
+    present = [item for item in items if key(item) is not None]
+    absent = [item for item in items if key(item) is None]
+    try:
+        present.sort(key=key, reverse=descending)
+    except TypeError:  # 同一字段混有不同类型的取值
+        present.sort(key=lambda item: str(key(item)), reverse=descending)
+    return present + absent
+
+
+def keyword_match(asset: Optional[Dict[str, Any]], keyword: str) -> bool:
+    if asset is None:
+        return False
+    return keyword in (asset.get("fileName", "") + asset.get("projectName", "") + asset.get("clientName", ""))
+
+
+asset_facets = FacetIndex(store)
@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import hashlib
+import math
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+from .datastore import DataStore, store
+
+# 版本号只在进程内递增，ETag 中带上启动标识，重启后旧 ETag 自然失效
+EPOCH = secrets.token_hex(4)
+DEFAULT_CACHE_BYTES = 64 * 1024 * 1024
+MAX_ENTRY_BYTES = 8 * 1024 * 1024
+DEPENDENCIES: Dict[Callable[..., Any], Tuple[str, ...]] = {}
+CACHEABLE: Set[Callable[..., Any]] = set()
+# 详情接口 -> 记录 id 所在的路径参数名
+RECORD_PARAMS: Dict[Callable[..., Any], str] = {}
+
+
+def depends_on(
+    *collections: str, cache: bool = False, record: Optional[str] = None
+) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    # 声明读接口的响应只取决于这些集合；未声明的接口不做条件请求处理。
+    # cache=True 的接口（计算量大的汇总类接口）同时缓存序列化后的响应体；
+    # record 为详情接口中记录 id 的路径参数名，响应只由这一条记录决定，ETag 取记录版本号
+    def register(func: Callable[..., Any]) -> Callable[..., Any]:
+        DEPENDENCIES[func] = collections
+        if cache:
+            CACHEABLE.add(func)
+        if record:
+            RECORD_PARAMS[func] = record
+        return func
+
+    return register
+
+
+def entity_tag(data_store: DataStore, collections: Sequence[str], request_key: str) -> str:
+    versions = ",".join(f"{name}:{data_store.version(name)}" for name in collections)
+    digest = hashlib.blake2b(f"{request_key}|{versions}".encode("utf-8"), digest_size=12).hexdigest()
+    return f'"{EPOCH}-{digest}"'
+
+
+def record_tag(item: Dict[str, Any]) -> str:
+    # 详情接口的 ETag：W/"v<version>"，写接口的 If-Match 原样带回即作为期望版本
+    return f'W/"v{item.get("version", 1)}"'
+
+
+def parse_record_tag(value: str) -> Optional[int]:
+    # 接受 W/"v3"、"v3"、"3" 与 3；其他形式（如列表接口的不透明 ETag）返回 None
+    value = value.strip()
+    value = value[2:] if value.startswith("W/") else value
+    value = value.strip('"')
+    value = value[1:] if value.startswith("v") else value
+    return int(value) if value.isdigit() else None
+
+
+def last_modified(data_store: DataStore, collections: Sequence[str]) -> float:
+    return max(data_store.last_modified(name) for name in collections)
+
+
+def http_date(timestamp: float) -> Optional[str]:
+    # Last-Modified 只有秒级精度：修改所在的这一秒过去之后才给出（向上取整），
+    # 否则同一秒内的后续修改会被 If-Modified-Since 误判为未修改
+    stamp = math.ceil(timestamp)
+    return formatdate(stamp, usegmt=True) if time.time() >= stamp else None
+
+
+def not_modified_since(header: Optional[str], timestamp: float) -> bool:
+    if not header:
+        return False
+    try:
+        since = parsedate_to_datetime(header).timestamp()
+    except (TypeError, ValueError):
+        return False
+    return timestamp <= since
+
+
+class CachedResponse:
+    __slots__ = ("collections", "versions", "body", "media_type")
+
+    def __init__(self, collections: Tuple[str, ...], versions: Tuple[int, ...], body: bytes, media_type: str) -> None:
+        self.collections = collections
+        self.versions = versions
+        self.body = body
+        self.media_type = media_type
+
+
+class ResponseCache:
+    # 以“路径 + 查询参数 + 调用方”为键缓存响应体，每条记录带上依赖集合及写入时的版本号：
+    # 集合发生单条变更时按标签立即移除，仅递增版本号的批量变更在读取时比对版本号失效；总大小按 LRU 限制
+    def __init__(self, data_store: DataStore, max_bytes: int = DEFAULT_CACHE_BYTES) -> None:
+        self.store = data_store
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self.tags: Dict[str, Set[str]] = {}
+        self.used = 0
+        self.stats = {"hits": 0, "misses": 0, "invalidations": 0, "evictions": 0, "oversize": 0}
+        data_store.subscribe(self.on_change)
+
+    def versions(self, collections: Sequence[str]) -> Tuple[int, ...]:
+        return tuple(self.store.version(name) for name in collections)
+
+    def get(self, key: str, collections: Tuple[str, ...]) -> Optional[CachedResponse]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry.versions != self.versions(collections):
+                self.remove(key)
+                self.stats["invalidations"] += 1
+                entry = None
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            self.entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry
+
+    def put(self, key: str, collections: Tuple[str, ...], versions: Tuple[int, ...], body: bytes, media_type: str) -> None:
+        if len(body) > min(MAX_ENTRY_BYTES, self.max_bytes):
+            self.stats["oversize"] += 1
+            return
+        with self.lock:
+            if versions != self.versions(collections):
+                return  # 生成期间依赖集合已变更，不缓存
+            self.remove(key)
+            self.entries[key] = CachedResponse(collections, versions, body, media_type)
+            self.used += len(body)
+            for name in collections:
+                self.tags.setdefault(name, set()).add(key)
+            while self.used > self.max_bytes and self.entries:
+                self.remove(next(iter(self.entries)))
+                self.stats["evictions"] += 1
+
+    def remove(self, key: str) -> None:
+        # 调用方需持有 self.lock
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        self.used -= len(entry.body)
+        for name in entry.collections:
+            keys = self.tags.get(name)
+            if keys is not None:
+                keys.discard(key)
+
+    def on_change(self, collection: str, item: Dict[str, Any], action: str) -> None:
+        with self.lock:
+            keys: List[str] = list(self.tags.get(collection, ()))
+            for key in keys:
+                self.remove(key)
+            self.stats["invalidations"] += len(keys)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+            self.tags.clear()
+            self.used = 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                "entries": len(self.entries),
+                "usedBytes": self.used,
+                "maxBytes": self.max_bytes,
+                "hitRate": round(self.stats["hits"] / lookups, 4) if lookups else None,
+                **self.stats,
+            }
+
+
+response_cache = ResponseCache(store)
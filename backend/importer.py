@@ -0,0 +1,373 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .datastore import DataStore, iso_now, store
+from .metadata import MetadataExtractor, metadata_extractor
+from .thumbnails import ThumbnailService, thumbnails
+
+CHUNK_SIZE = 8 * 1024 * 1024
+DEFAULT_WORKERS = min(8, (os.cpu_count() or 2) * 2)
+ASSET_FLUSH_SIZE = 200
+SAVE_INTERVAL = 1.0
+
+FILE_TYPES = {
+    "video": {".mp4", ".mov", ".mxf", ".avi", ".mkv", ".r3d", ".braw", ".crm", ".mts"},
+    "audio": {".wav", ".mp3", ".aac", ".flac", ".aiff", ".bwf"},
+    "image": {".jpg", ".jpeg", ".png", ".tif", ".tiff", ".raw", ".dng", ".arw", ".cr2", ".cr3", ".nef", ".heic"},
+}
+SKIPPED_NAMES = {".DS_Store", "Thumbs.db"}
+
+
+def file_type_of(name: str) -> str:
+    suffix = Path(name).suffix.lower()
+    return next((kind for kind, suffixes in FILE_TYPES.items() if suffix in suffixes), "other")
+
+
+def new_hasher() -> Any:
+    return hashlib.blake2b(digest_size=16)
+
+
+def hash_file(path: Path) -> str:
+    hasher = new_hasher()
+    with path.open("rb") as fh:
+        while True:
+            chunk = fh.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            hasher.update(chunk)
+    return "blake2b:" + hasher.hexdigest()
+
+
+def copy_with_hash(source: Path, dest: Path, verify: bool = True) -> Tuple[int, str]:
+    # 单次读取源文件，边写入边计算哈希；写入临时文件后原子替换，可选回读目标文件校验
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dest.with_name(dest.name + ".part")
+    hasher = new_hasher()
+    size = 0
+    with source.open("rb") as src, tmp.open("wb") as dst:
+        while True:
+            chunk = src.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            hasher.update(chunk)
+            dst.write(chunk)
+            size += len(chunk)
+    checksum = "blake2b:" + hasher.hexdigest()
+    if verify and hash_file(tmp) != checksum:
+        tmp.unlink(missing_ok=True)
+        raise IOError(f"{source.name} 校验失败")
+    os.replace(tmp, dest)
+    return size, checksum
+
+
+class ImportManifest:
+    # 每个导入任务一个 JSONL 清单，逐行追加已完成文件（路径、大小、mtime、校验值、目标路径）
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        if path.exists():
+            for line in path.read_text(encoding="utf-8").splitlines():
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                self.entries[entry["path"]] = entry
+
+    def is_complete(self, relative: Path, stat: os.stat_result) -> bool:
+        entry = self.entries.get(str(relative))
+        if not entry or entry.get("size") != stat.st_size or entry.get("mtimeNs") != stat.st_mtime_ns:
+            return False
+        try:
+            return Path(entry["dest"]).stat().st_size == entry["size"]
+        except OSError:
+            return False
+
+    def record(self, entries: List[Dict[str, Any]]) -> None:
+        if not entries:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.open("a", encoding="utf-8") as fh:
+            for entry in entries:
+                fh.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                self.entries[entry["path"]] = entry
+
+
+class ImportExecutor:
+    def __init__(
+        self,
+        data_store: DataStore,
+        extractor: Optional[MetadataExtractor] = None,
+        thumbnail_service: Optional[ThumbnailService] = None,
+        media_root: Optional[str] = None,
+        workers: int = DEFAULT_WORKERS,
+    ) -> None:
+        self.store = data_store
+        self.extractor = extractor
+        self.thumbnails = thumbnail_service
+        self.media_root = media_root
+        self.workers = workers
+        self.verify = True
+        self.manifest_dir: Optional[Path] = None
+        self.lock = threading.Lock()
+        self.running: Dict[int, threading.Thread] = {}
+
+    def root(self) -> Path:
+        if self.media_root:
+            return Path(self.media_root)
+        volumes = self.store.data.get("storage_volumes") or [{}]
+        return Path(volumes[0].get("mountPoint") or "media")
+
+    def manifest(self, task_id: int) -> ImportManifest:
+        directory = self.manifest_dir or self.store.path.parent / "import_manifests"
+        return ImportManifest(directory / f"{task_id}.jsonl")
+
+    def device(self, name: Optional[str]) -> Optional[Dict[str, Any]]:
+        return next((device for device in self.store.data.get("import_devices", []) if device.get("name") == name), None)
+
+    def folder_path(self, project: Dict[str, Any], folder_id: Optional[int]) -> Path:
+        parts: List[str] = []
+        folders = {folder["id"]: folder for folder in self.store.data.get("folders", []) if folder.get("projectId") == project["id"]}
+        while folder_id in folders:
+            folder = folders[folder_id]
+            parts.append(folder.get("name", str(folder_id)))
+            folder_id = folder.get("parentId")
+        return self.root().joinpath(project.get("name") or str(project["id"]), *reversed(parts))
+
+    def walk(
+        self, mount: Path, source_paths: List[str], failures: List[Dict[str, Any]]
+    ) -> Iterator[Tuple[Path, Path]]:
+        # 源路径解析（含 ..、符号链接）后必须仍在挂载目录内，越界的源路径记为失败，不遍历
+        root = mount.resolve()
+        seen = set()
+        for source_path in source_paths or ["/"]:
+            base = (root / source_path.lstrip("/")).resolve()
+            if base != root and root not in base.parents:
+                failures.append({"path": source_path, "reason": "源路径不在导入设备的挂载目录内"})
+                continue
+            if base.is_file():
+                candidates = [base]
+            else:
+                candidates = (Path(dirpath) / name for dirpath, _, names in os.walk(base) for name in sorted(names))
+            for path in candidates:
+                if path.name in SKIPPED_NAMES or path.name.startswith("._") or path in seen:
+                    continue
+                seen.add(path)
+                yield path, path.relative_to(root)
+
+    def submit(self, task: Dict[str, Any]) -> bool:
+        with self.lock:
+            thread = self.running.get(task["id"])
+            if thread and thread.is_alive():
+                return False
+            with self.store.lock:
+                task.update({"status": "running", "startedAt": iso_now(), "finishedAt": None})
+                self.store.mark_changed("import_tasks", task)
+            thread = threading.Thread(target=self.run, args=(task,), name=f"import-{task['id']}", daemon=True)
+            self.running[task["id"]] = thread
+            thread.start()
+            return True
+
+    def run(self, task: Dict[str, Any]) -> Dict[str, Any]:
+        # 任何未预料的异常都把任务标记为失败，不让任务停留在 running
+        try:
+            return self.execute(task)
+        except Exception as exc:
+            with self.store.lock:
+                task.update({"status": "fail", "finishedAt": iso_now(), "failureReason": str(exc) or type(exc).__name__})
+                self.store.mark_changed("import_tasks", task)
+            self.store.schedule_save()
+            return task
+
+    def execute(self, task: Dict[str, Any]) -> Dict[str, Any]:
+        device = self.device(task.get("sourceDevice"))
+        project = self.store.find_by_id("projects", task.get("targetProjectId"))
+        with self.store.lock:
+            task.update({"status": "running", "startedAt": iso_now(), "finishedAt": None, "failureReason": None})
+            reason = None
+            if not device or not project:
+                reason = "导入设备或目标项目不存在"
+            elif not Path(device.get("mountPath", "")).is_dir():
+                reason = "导入设备未挂载"
+            if reason:
+                task.update({"status": "fail", "finishedAt": iso_now(), "failureReason": reason})
+                self.store.mark_changed("import_tasks", task)
+                self.store.schedule_save()
+                return task
+        mount = Path(device.get("mountPath", ""))
+        target = self.folder_path(project, task.get("targetFolderId"))
+        manifest = self.manifest(task["id"])
+        failures: List[Dict[str, Any]] = []
+        files = list(self.walk(mount, task.get("sourcePaths", []), failures))
+        rejected = len(failures)
+        plan: List[Tuple[Path, Path, os.stat_result]] = []
+        for source, relative in files:
+            try:
+                stat = source.stat()
+            except OSError as exc:
+                failures.append({"path": str(relative), "reason": str(exc)})
+                continue
+            if not manifest.is_complete(relative, stat):
+                plan.append((source, relative, stat))
+        skipped = len(files) - len(plan) - (len(failures) - rejected)
+        with self.store.lock:
+            task.update(
+                {
+                    "totalFiles": len(files) + rejected,
+                    "successFiles": skipped,
+                    "skippedFiles": skipped,
+                    "failedFiles": len(failures),
+                    "failures": failures,
+                }
+            )
+            self.store.mark_changed("import_tasks", task)
+            self.store.schedule_save()
+            imported = {
+                asset.get("sourcePath"): asset
+                for asset in self.store.get_collection("assets")
+                if asset.get("importTaskId") == task["id"]
+            }
+
+        pending: List[Tuple[Path, os.stat_result, Dict[str, Any]]] = []
+        copied: List[int] = []
+        last_save = time.monotonic()
+        with ThreadPoolExecutor(max_workers=max(1, self.workers), thread_name_prefix=f"import-{task['id']}") as pool:
+            futures = {
+                pool.submit(copy_with_hash, source, target / relative, self.verify): (source, relative, stat)
+                for source, relative, stat in plan
+            }
+            for future in as_completed(futures):
+                source, relative, stat = futures[future]
+                flush = False
+                with self.store.lock:
+                    try:
+                        size, checksum = future.result()
+                    except OSError as exc:
+                        task["failedFiles"] += 1
+                        task["failures"].append({"path": str(relative), "reason": str(exc)})
+                    else:
+                        task["successFiles"] += 1
+                        record = self.asset_record(task, project, source, relative, target / relative, size, checksum, stat)
+                        pending.append((relative, stat, record))
+                    # 计数每次都更新版本号（条件请求据此失效），变更事件只按批次发送
+                    self.store.mark_changed("import_tasks", ids=[task["id"]])
+                    if len(pending) >= ASSET_FLUSH_SIZE or time.monotonic() - last_save >= SAVE_INTERVAL:
+                        self.store.mark_changed("import_tasks", task)
+                        flush = True
+                if flush:
+                    copied.extend(self.flush(manifest, imported, pending))
+                    last_save = time.monotonic()
+
+        copied.extend(self.flush(manifest, imported, pending))
+        with self.store.lock:
+            if task["failedFiles"] == 0:
+                task["status"] = "success"
+            else:
+                task["status"] = "partial" if task["successFiles"] else "fail"
+            task["finishedAt"] = iso_now()
+            self.store.mark_changed("import_tasks", task)
+        self.store.schedule_save()
+        if self.extractor and copied:
+            self.extractor.submit(copied)
+        if self.thumbnails and copied:
+            self.thumbnails.submit_many(copied)
+        return task
+
+    def asset_record(
+        self,
+        task: Dict[str, Any],
+        project: Dict[str, Any],
+        source: Path,
+        relative: Path,
+        dest: Path,
+        size: int,
+        checksum: str,
+        stat: os.stat_result,
+    ) -> Dict[str, Any]:
+        now = iso_now()
+        return {
+            "folderId": task.get("targetFolderId"),
+            "projectId": project["id"],
+            "fileName": source.name,
+            "fileType": file_type_of(source.name),
+            "size": round(size / 1024 ** 3, 4),
+            "resolution": None,
+            "duration": None,
+            "shootDate": None,
+            "projectName": project.get("name"),
+            "tags": [],
+            "tierLevel": "hot",
+            "localPresence": "local",
+            "clientName": project.get("clientName") or "",
+            "camera": None,
+            "location": None,
+            "createdAt": now,
+            "updatedAt": now,
+            "owner": task.get("createdBy"),
+            "storagePath": str(dest),
+            "sourcePath": str(relative),
+            "checksum": checksum,
+            "importTaskId": task["id"],
+        }
+
+    def flush(
+        self,
+        manifest: ImportManifest,
+        imported: Dict[str, Dict[str, Any]],
+        pending: List[Tuple[Path, os.stat_result, Dict[str, Any]]],
+    ) -> List[int]:
+        # 素材在 store.lock 内成批追加，释放锁后等待这次保存落盘再写清单，
+        # 中途崩溃时重试只会重新拷贝，不会留下指向未保存素材的清单条目。调用方不能持有 store.lock：
+        # 保存要在锁内取快照
+        if not pending:
+            return []
+        with self.store.lock:
+            asset_ids, entries = self.stage(imported, pending)
+        self.store.schedule_save().result()
+        manifest.record(entries)
+        return asset_ids
+
+    def stage(
+        self, imported: Dict[str, Dict[str, Any]], pending: List[Tuple[Path, os.stat_result, Dict[str, Any]]]
+    ) -> Tuple[List[int], List[Dict[str, Any]]]:
+        new_assets: List[Dict[str, Any]] = []
+        asset_ids: List[int] = []
+        entries: List[Dict[str, Any]] = []
+        fresh = sum(1 for _, _, record in pending if record["sourcePath"] not in imported)
+        next_id = self.store.next_id("assets", fresh)
+        for relative, stat, record in pending:
+            existing = imported.get(record["sourcePath"])
+            if existing:
+                existing.update({key: record[key] for key in ("size", "checksum", "storagePath", "updatedAt")})
+                asset_ids.append(existing["id"])
+                self.store.mark_changed("assets", existing)
+            else:
+                record["id"] = next_id
+                next_id += 1
+                new_assets.append(record)
+                asset_ids.append(record["id"])
+                imported[record["sourcePath"]] = record
+            entries.append(
+                {
+                    "path": str(relative),
+                    "size": stat.st_size,
+                    "mtimeNs": stat.st_mtime_ns,
+                    "checksum": record["checksum"],
+                    "dest": record["storagePath"],
+                }
+            )
+        self.store.get_collection("assets").extend(new_assets)
+        for record in new_assets:
+            self.store.mark_changed("assets", record, "create")
+        pending.clear()
+        return asset_ids, entries
+
+
+importer = ImportExecutor(store, metadata_extractor, thumbnails)
@@ -0,0 +1,261 @@
+from __future__ import annotations
+
+import bisect
+import calendar
+import json
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Any, Dict, IO, Iterator, List, Optional, Sequence, Set, Tuple
+
+from .datastore import DataStore, iso_now, store
+
+SEGMENT_BYTES = 8 * 1024 * 1024
+SEGMENT_SECONDS = 24 * 3600
+INDEX_EVERY = 64
+RETENTION_SEGMENTS = 200
+DEFAULT_LIMIT = 200
+
+
+class Segment:
+    # 一个只追加的 JSONL 分段文件；sparse 为每 INDEX_EVERY 条记录的 (截至该条的最大 time, 偏移量)，
+    # values 记录各过滤字段出现过的取值，用于整段跳过。记录的 time 由写入方给出，不保证有序：
+    # first_time / last_time 为段内最小 / 最大时间，sparse 取累计最大值，按时间定位时不会跳过乱序的记录
+    def __init__(self, path: Path, fields: Sequence[str]) -> None:
+        self.path = path
+        self.fields = fields
+        self.first_time: Optional[str] = None
+        self.last_time: Optional[str] = None
+        self.count = 0
+        self.size = 0
+        self.sealed = False
+        try:
+            self.created = float(calendar.timegm(time.strptime(path.name[:15], "%Y%m%dT%H%M%S")))
+        except ValueError:
+            self.created = time.time()
+        self.sparse: List[Tuple[str, int]] = []
+        self.values: Dict[str, Set[Any]] = {field: set() for field in fields}
+
+    @property
+    def meta_path(self) -> Path:
+        return self.path.with_suffix(".meta")
+
+    def note(self, record: Dict[str, Any], offset: int, length: int) -> None:
+        stamp = record.get("time") or ""
+        if self.first_time is None or stamp < self.first_time:
+            self.first_time = stamp
+        if self.last_time is None or stamp > self.last_time:
+            self.last_time = stamp
+        if self.count % INDEX_EVERY == 0:
+            self.sparse.append((self.last_time, offset))
+        self.count += 1
+        self.size = offset + length
+        for field in self.fields:
+            self.values[field].add(record.get(field))
+
+    def scan(self) -> None:
+        offset = 0
+        with self.path.open("rb") as fh:
+            for line in fh:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                self.note(record, offset, len(line))
+                offset += len(line)
+
+    def seal(self) -> None:
+        meta = {
+            "firstTime": self.first_time,
+            "lastTime": self.last_time,
+            "count": self.count,
+            "size": self.size,
+            "sparse": self.sparse,
+            "values": {field: sorted(values, key=str) for field, values in self.values.items()},
+        }
+        self.meta_path.write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+        self.sealed = True
+
+    def load_meta(self) -> bool:
+        if not self.meta_path.exists():
+            return False
+        meta = json.loads(self.meta_path.read_text(encoding="utf-8"))
+        self.first_time, self.last_time = meta["firstTime"], meta["lastTime"]
+        self.count, self.size = meta["count"], meta["size"]
+        self.sparse = [tuple(item) for item in meta["sparse"]]
+        self.values = {field: set(meta["values"].get(field, [])) for field in self.fields}
+        self.sealed = True
+        return True
+
+    def may_match(self, filters: Dict[str, Any], start: Optional[str], end: Optional[str]) -> bool:
+        if self.count == 0:
+            return False
+        if start and self.last_time and self.last_time < start:
+            return False
+        if end and self.first_time and self.first_time > end:
+            return False
+        return all(value in self.values.get(field, {value}) for field, value in filters.items())
+
+    def records(self, offset: int = 0) -> Iterator[Dict[str, Any]]:
+        with self.path.open("rb") as fh:
+            fh.seek(offset)
+            for line in fh:
+                if offset >= self.size:
+                    break
+                offset += len(line)
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    break
+
+    def read(self, start: Optional[str], end: Optional[str]) -> Iterator[Dict[str, Any]]:
+        # 此前所有记录的累计最大时间仍早于 start 的稀疏点之前可以跳过；end 之后仍可能有乱序写入的
+        # 较早记录，读到段尾为止
+        offset = 0
+        if start and self.sparse:
+            position = bisect.bisect_left([stamp for stamp, _ in self.sparse], start)
+            offset = self.sparse[max(position - 1, 0)][1]
+        for record in self.records(offset):
+            stamp = record.get("time") or ""
+            if (start and stamp < start) or (end and stamp > end):
+                continue
+            yield record
+
+
+class LogStore:
+    def __init__(
+        self,
+        root: Path,
+        fields: Sequence[str],
+        segment_bytes: int = SEGMENT_BYTES,
+        segment_seconds: int = SEGMENT_SECONDS,
+        retention: int = RETENTION_SEGMENTS,
+    ) -> None:
+        self.root = root
+        self.fields = tuple(fields)
+        self.segment_bytes = segment_bytes
+        self.segment_seconds = segment_seconds
+        self.retention = retention
+        self.lock = threading.RLock()
+        self.segments: List[Segment] = []
+        self.handle: Optional[IO[bytes]] = None
+        self.last_id = 0
+        self.root.mkdir(parents=True, exist_ok=True)
+        for path in sorted(self.root.glob("*.jsonl")):
+            segment = Segment(path, self.fields)
+            if not segment.load_meta():
+                segment.scan()
+            self.segments.append(segment)
+        if self.segments:
+            self.last_id = self.tail_id(self.segments[-1])
+
+    def tail_id(self, segment: Segment) -> int:
+        last_id = 0
+        for record in segment.records(segment.sparse[-1][1] if segment.sparse else 0):
+            last_id = max(last_id, record.get("id") or 0)
+        return last_id
+
+    def active(self) -> Tuple[Segment, IO[bytes]]:
+        segment = self.segments[-1] if self.segments else None
+        expired = segment is not None and time.time() - segment.created >= self.segment_seconds
+        if segment is None or segment.sealed or segment.size >= self.segment_bytes or (expired and segment.count):
+            if segment is not None and not segment.sealed:
+                self.rotate(segment)
+            name = f"{time.strftime('%Y%m%dT%H%M%S', time.gmtime())}-{self.last_id + 1:010d}.jsonl"
+            segment = Segment(self.root / name, self.fields)
+            segment.path.touch()
+            self.segments.append(segment)
+        if self.handle is None:
+            if segment.path.stat().st_size > segment.size:
+                # 上次异常退出可能留下半行，截掉后再继续追加
+                with segment.path.open("r+b") as fh:
+                    fh.truncate(segment.size)
+            self.handle = segment.path.open("ab")
+        return segment, self.handle
+
+    def rotate(self, segment: Segment) -> None:
+        if self.handle is not None:
+            self.handle.close()
+            self.handle = None
+        segment.seal()
+        while len(self.segments) >= self.retention:
+            oldest = self.segments.pop(0)
+            oldest.path.unlink(missing_ok=True)
+            oldest.meta_path.unlink(missing_ok=True)
+
+    def append(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        return self.extend([record])[0]
+
+    def extend(self, records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        with self.lock:
+            for record in records:
+                segment, handle = self.active()
+                self.last_id += 1
+                record["id"] = self.last_id
+                record.setdefault("time", iso_now())
+                line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+                handle.write(line)
+                segment.note(record, segment.size, len(line))
+            if self.handle is not None:
+                self.handle.flush()
+        return records
+
+    def query(
+        self,
+        filters: Optional[Dict[str, Any]] = None,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        limit: int = DEFAULT_LIMIT,
+    ) -> List[Dict[str, Any]]:
+        # 从最新分段向前查找，返回最新的 limit 条（按时间倒序）
+        filters = {field: value for field, value in (filters or {}).items() if value is not None}
+        if end and len(end) == 10:
+            end += "T23:59:59Z"
+        with self.lock:
+            if self.handle is not None:
+                self.handle.flush()
+            segments = list(self.segments)
+        results: List[Dict[str, Any]] = []
+        for segment in reversed(segments):
+            if len(results) >= limit:
+                break
+            if not segment.may_match(filters, start, end):
+                continue
+            matched: deque = deque(maxlen=limit - len(results))
+            for record in segment.read(start, end):
+                if all(record.get(field) == value for field, value in filters.items()):
+                    matched.append(record)
+            results.extend(reversed(matched))
+        return results
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "segments": len(self.segments),
+                "records": sum(segment.count for segment in self.segments),
+                "bytes": sum(segment.size for segment in self.segments),
+                "lastId": self.last_id,
+            }
+
+
+def migrate_embedded_logs(data_store: DataStore, key: str, logs: LogStore) -> None:
+    # 旧版本把日志放在 data_store.json 中：首次启动时按时间顺序迁入分段文件并从主文档移除
+    # replica 不改写文档，迁移由 primary 完成
+    embedded = data_store.data.get(key)
+    if embedded is None or data_store.read_only:
+        return
+    if not logs.segments:
+        records = sorted((dict(item) for item in embedded), key=lambda item: item.get("time") or "")
+        for record in records:
+            record.pop("id", None)
+        logs.extend(records)
+    with data_store.lock:
+        data_store.data.pop(key, None)
+    data_store.schedule_save()
+
+
+audit_log = LogStore(store.path.parent / "logs" / "audit", fields=("user", "action", "targetType"))
+system_log = LogStore(store.path.parent / "logs" / "system", fields=("level", "module"))
+migrate_embedded_logs(store, "audit_logs", audit_log)
+migrate_embedded_logs(store, "system_logs", system_log)
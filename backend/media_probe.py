@@ -0,0 +1,278 @@
+from __future__ import annotations
+
+import struct
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+# 仅读取容器头部（MP4/MOV 的 moov、WAV 的 fmt/bext、TIFF/RAW/JPEG 的 IFD），不解码媒体数据。
+# 本模块不依赖 DataStore，可在子进程中单独导入。
+
+MP4_EPOCH = datetime(1904, 1, 1)
+MAX_BOXES = 4096
+TIFF_TAGS = {0x0100: "width", 0x0101: "height", 0x010F: "make", 0x0110: "model", 0x0132: "dateTime"}
+EXIF_TAGS = {0x9003: "dateTimeOriginal", 0xA002: "width", 0xA003: "height"}
+
+
+def resolution_label(width: Optional[int], height: Optional[int]) -> Optional[str]:
+    if not width or not height:
+        return None
+    long_edge = max(width, height)
+    for threshold, label in ((7680, "8K"), (5760, "6K"), (3840, "4K"), (2048, "2K"), (1920, "1080P"), (1280, "720P")):
+        if long_edge >= threshold:
+            return label
+    return f"{width}x{height}"
+
+
+def iter_boxes(fh: BinaryIO, start: int, end: int) -> Iterator[Tuple[bytes, int, int]]:
+    pos = start
+    for _ in range(MAX_BOXES):
+        if pos + 8 > end:
+            return
+        fh.seek(pos)
+        header = fh.read(8)
+        if len(header) < 8:
+            return
+        size, kind = struct.unpack(">I4s", header)
+        header_len = 8
+        if size == 1:
+            size = struct.unpack(">Q", fh.read(8))[0]
+            header_len = 16
+        elif size == 0:
+            size = end - pos
+        if size < header_len:
+            return
+        yield kind, pos + header_len, min(pos + size, end)
+        pos += size
+
+
+def find_box(fh: BinaryIO, start: int, end: int, kind: bytes) -> Optional[Tuple[int, int]]:
+    return next(((s, e) for k, s, e in iter_boxes(fh, start, end) if k == kind), None)
+
+
+def read_at(fh: BinaryIO, pos: int, size: int) -> bytes:
+    fh.seek(pos)
+    return fh.read(size)
+
+
+def probe_mp4(fh: BinaryIO, file_size: int) -> Dict[str, Any]:
+    moov = find_box(fh, 0, file_size, b"moov")
+    if not moov:
+        return {"format": "mp4"}
+    info: Dict[str, Any] = {"format": "mp4"}
+    for kind, start, end in iter_boxes(fh, *moov):
+        if kind == b"mvhd":
+            data = read_at(fh, start, min(end - start, 32))
+            if data[:1] == b"\x01":
+                created, _, timescale, duration = struct.unpack(">QQIQ", data[4:32])
+            else:
+                created, _, timescale, duration = struct.unpack(">IIII", data[4:20])
+            if timescale:
+                info["duration"] = round(duration / timescale, 3)
+            if created:
+                try:
+                    info["shootDate"] = (MP4_EPOCH + timedelta(seconds=created)).strftime("%Y-%m-%d")
+                except OverflowError:  # 创建时间损坏时只跳过拍摄日期
+                    pass
+        elif kind == b"trak":
+            probe_trak(fh, start, end, info)
+        elif kind == b"udta":
+            for tag, tag_start, tag_end in iter_boxes(fh, start, end):
+                if tag in (b"\xa9mak", b"\xa9mod"):
+                    raw = read_at(fh, tag_start, min(tag_end - tag_start, 256))
+                    length = struct.unpack(">H", raw[:2])[0] if len(raw) >= 2 else 0
+                    value = raw[4 : 4 + length].decode("utf-8", "ignore").strip("\x00 ")
+                    if value:
+                        info["make" if tag == b"\xa9mak" else "model"] = value
+    return info
+
+
+def probe_trak(fh: BinaryIO, start: int, end: int, info: Dict[str, Any]) -> None:
+    handler = None
+    width = height = 0
+    codec = None
+    tkhd = find_box(fh, start, end, b"tkhd")
+    if tkhd:
+        data = read_at(fh, tkhd[0], min(tkhd[1] - tkhd[0], 92))
+        offset = 88 if data[:1] == b"\x01" else 76
+        if len(data) >= offset + 8:
+            width, height = (value >> 16 for value in struct.unpack(">II", data[offset : offset + 8]))
+    mdia = find_box(fh, start, end, b"mdia")
+    if mdia:
+        hdlr = find_box(fh, mdia[0], mdia[1], b"hdlr")
+        if hdlr:
+            handler = read_at(fh, hdlr[0] + 8, 4)
+        minf = find_box(fh, mdia[0], mdia[1], b"minf")
+        stbl = find_box(fh, minf[0], minf[1], b"stbl") if minf else None
+        stsd = find_box(fh, stbl[0], stbl[1], b"stsd") if stbl else None
+        if stsd:
+            entry = read_at(fh, stsd[0] + 8, 8)
+            if len(entry) == 8:
+                codec = entry[4:8].decode("latin-1").strip()
+    if handler == b"vide" and "width" not in info:
+        info.update({"width": width or None, "height": height or None, "videoCodec": codec})
+    elif handler == b"soun" and "audioCodec" not in info:
+        info["audioCodec"] = codec
+
+
+def probe_wav(fh: BinaryIO, file_size: int) -> Dict[str, Any]:
+    info: Dict[str, Any] = {"format": "wav"}
+    byte_rate = data_size = 0
+    pos = 12
+    while pos + 8 <= file_size:
+        chunk_id, size = struct.unpack("<4sI", read_at(fh, pos, 8))
+        body = pos + 8
+        if chunk_id == b"fmt ":
+            _, channels, sample_rate, byte_rate, _, bits = struct.unpack("<HHIIHH", read_at(fh, body, 16))
+            info.update({"channels": channels, "sampleRate": sample_rate, "bitsPerSample": bits})
+        elif chunk_id == b"bext":
+            data = read_at(fh, body, min(size, 348))
+            originator = data[256:288].decode("utf-8", "ignore").strip("\x00 ")
+            date = data[320:330].decode("ascii", "ignore").replace(":", "-").strip("\x00 ")
+            if originator:
+                info["model"] = originator
+            if len(date) == 10:
+                info["shootDate"] = date
+        elif chunk_id == b"data":
+            data_size = size
+        pos = body + size + (size & 1)
+    if byte_rate and data_size:
+        info["duration"] = round(data_size / byte_rate, 3)
+    return info
+
+
+def parse_tiff(fh: BinaryIO, base: int) -> Dict[str, Any]:
+    order = read_at(fh, base, 2)
+    endian = "<" if order == b"II" else ">"
+    info: Dict[str, Any] = {}
+    first = struct.unpack(endian + "I", read_at(fh, base + 4, 4))[0]
+    queue = [(first, TIFF_TAGS)]
+    seen = set()
+    while queue and len(seen) < 16:
+        offset, tags = queue.pop(0)
+        if not offset or offset in seen:
+            continue
+        seen.add(offset)
+        raw_count = read_at(fh, base + offset, 2)
+        if len(raw_count) < 2:
+            continue
+        count = struct.unpack(endian + "H", raw_count)[0]
+        entries = read_at(fh, base + offset + 2, count * 12 + 4)
+        preview: Dict[int, int] = {}
+        if tags is TIFF_TAGS and len(entries) == count * 12 + 4:
+            queue.append((struct.unpack(endian + "I", entries[-4:])[0], TIFF_TAGS))
+        for index in range(count if len(entries) >= count * 12 else len(entries) // 12):
+            tag, kind, n, value = struct.unpack(endian + "HHI4s", entries[index * 12 : index * 12 + 12])
+            if tag == 0x8769:
+                queue.append((struct.unpack(endian + "I", value)[0], EXIF_TAGS))
+            elif tag == 0x014A:
+                queue.append((struct.unpack(endian + "I", value)[0], TIFF_TAGS))
+            elif tag in (0x0201, 0x0202) and kind == 4:
+                preview[tag] = struct.unpack(endian + "I", value)[0]
+            elif tag in tags:
+                name = tags[tag]
+                if kind == 2:
+                    text = value[:n] if n <= 4 else read_at(fh, base + struct.unpack(endian + "I", value)[0], min(n, 128))
+                    info.setdefault(name, text.decode("utf-8", "ignore").strip("\x00 "))
+                elif kind in (3, 4):
+                    number = struct.unpack(endian + ("H" if kind == 3 else "I"), value[: 2 if kind == 3 else 4])[0]
+                    info[name] = max(info.get(name, 0), number)
+        if preview.get(0x0201) and preview.get(0x0202):
+            info.setdefault("previews", []).append((base + preview[0x0201], preview[0x0202]))
+    return info
+
+
+def tiff_fields(tiff: Dict[str, Any], fmt: str) -> Dict[str, Any]:
+    info: Dict[str, Any] = {"format": fmt, "width": tiff.get("width"), "height": tiff.get("height")}
+    if tiff.get("make"):
+        info["make"] = tiff["make"]
+    if tiff.get("model"):
+        info["model"] = tiff["model"]
+    stamp = tiff.get("dateTimeOriginal") or tiff.get("dateTime")
+    if stamp and len(stamp) >= 10:
+        info["shootDate"] = stamp[:10].replace(":", "-")
+    return info
+
+
+def probe_jpeg(fh: BinaryIO, file_size: int) -> Dict[str, Any]:
+    info: Dict[str, Any] = {"format": "jpeg"}
+    pos = 2
+    while pos + 4 <= file_size:
+        marker, length = struct.unpack(">HH", read_at(fh, pos, 4))
+        if marker & 0xFF00 != 0xFF00:
+            break
+        if marker == 0xFFE1 and read_at(fh, pos + 4, 6) == b"Exif\x00\x00":
+            info.update({k: v for k, v in tiff_fields(parse_tiff(fh, pos + 10), "jpeg").items() if v})
+        elif marker in (0xFFC0, 0xFFC1, 0xFFC2):
+            height, width = struct.unpack(">HH", read_at(fh, pos + 5, 4))
+            info.update({"width": width, "height": height})
+            break
+        elif marker == 0xFFDA:
+            break
+        pos += 2 + length
+    return info
+
+
+def probe_file(path: str) -> Dict[str, Any]:
+    target = Path(path)
+    try:
+        stat = target.stat()
+        file_size = stat.st_size
+        with target.open("rb") as fh:
+            head = fh.read(12)
+            if head[4:8] in (b"ftyp", b"moov", b"wide", b"mdat", b"free"):
+                info = probe_mp4(fh, file_size)
+            elif head[:4] in (b"RIFF", b"RF64") and head[8:12] == b"WAVE":
+                info = probe_wav(fh, file_size)
+            elif head[:4] in (b"II*\x00", b"MM\x00*"):
+                info = tiff_fields(parse_tiff(fh, 0), "raw")
+            elif head[:2] == b"\xff\xd8":
+                info = probe_jpeg(fh, file_size)
+            else:
+                info = {"format": None}
+    except (OSError, struct.error, ValueError, OverflowError) as exc:
+        # 文件损坏时只记为本条素材解析失败，不影响同一批次中的其他素材
+        return {"error": str(exc)}
+    info["modifiedDate"] = datetime.utcfromtimestamp(stat.st_mtime).strftime("%Y-%m-%d")
+    return {key: value for key, value in info.items() if value is not None}
+
+
+def asset_fields(info: Dict[str, Any]) -> Dict[str, Any]:
+    fields: Dict[str, Any] = {}
+    resolution = resolution_label(info.get("width"), info.get("height"))
+    if resolution:
+        fields["resolution"] = resolution
+    if info.get("duration") is not None:
+        fields["duration"] = int(round(info["duration"]))
+    make, model = info.get("make") or "", info.get("model") or ""
+    camera = model if make and model.lower().startswith(make.lower()) else f"{make} {model}".strip()
+    if camera:
+        fields["camera"] = camera
+    # 只采用文件内嵌的拍摄时间：导入拷贝不保留 mtime，modifiedDate 只是导入当天，不能作为拍摄日期
+    if info.get("shootDate"):
+        fields["shootDate"] = info["shootDate"]
+    return fields
+
+
+def embedded_preview(path: str, largest: bool = False) -> Optional[bytes]:
+    # RAW/TIFF/JPEG 通常自带 JPEG 预览图（IFD1 / SubIFD / EXIF 缩略图），直接截取即可，无需解码
+    with open(path, "rb") as fh:
+        head = fh.read(2)
+        previews: List[Tuple[int, int]] = []
+        if head in (b"II", b"MM"):
+            previews = parse_tiff(fh, 0).get("previews", [])
+        elif head == b"\xff\xd8":
+            pos = 2
+            for _ in range(64):
+                marker, length = struct.unpack(">HH", read_at(fh, pos, 4))
+                if marker == 0xFFE1 and read_at(fh, pos + 4, 6) == b"Exif\x00\x00":
+                    previews = parse_tiff(fh, pos + 10).get("previews", [])
+                    break
+                if marker & 0xFF00 != 0xFF00 or marker == 0xFFDA:
+                    break
+                pos += 2 + length
+        if not previews:
+            return None
+        offset, length = (max if largest else min)(previews, key=lambda item: item[1])
+        data = read_at(fh, offset, length)
+        return data if data[:2] == b"\xff\xd8" else None
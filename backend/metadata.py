@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import json
+import multiprocessing
+import os
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .datastore import DataStore, iso_now, store
+from .media_probe import asset_fields, probe_file
+
+BATCH_SIZE = 64
+
+
+class MetadataExtractor:
+    def __init__(self, data_store: DataStore, workers: Optional[int] = None) -> None:
+        self.store = data_store
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = BATCH_SIZE
+        self.queue: "queue.Queue[Tuple[int, bool]]" = queue.Queue()
+        self.cache_path = data_store.path.parent / "media_probe_cache.json"
+        self.cache: Dict[str, Dict[str, Any]] = {}
+        if self.cache_path.exists():
+            try:
+                self.cache = json.loads(self.cache_path.read_text(encoding="utf-8"))
+            except ValueError:
+                self.cache = {}
+        self.pool: Optional[ProcessPoolExecutor] = None
+        self.lock = threading.Lock()
+        self.worker: Optional[threading.Thread] = None
+        self.stats = {"queued": 0, "probed": 0, "cacheHits": 0, "failed": 0, "batches": 0}
+
+    def executor(self) -> ProcessPoolExecutor:
+        # spawn 子进程只导入 media_probe，不会加载或改写 data_store.json
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self.pool
+
+    def submit(self, asset_ids: Iterable[int], force: bool = False) -> int:
+        count = 0
+        for asset_id in asset_ids:
+            self.queue.put((asset_id, force))
+            count += 1
+        with self.lock:
+            self.stats["queued"] += count
+            if self.worker is None or not self.worker.is_alive():
+                self.worker = threading.Thread(target=self.loop, name="metadata-extractor", daemon=True)
+                self.worker.start()
+        return count
+
+    def loop(self) -> None:
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.process(batch)
+            except Exception:  # 工作线程不能退出，否则队列中其余素材不再被处理
+                self.stats["failed"] += len(batch)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    def process(self, batch: List[Tuple[int, bool]]) -> Dict[int, Dict[str, Any]]:
+        jobs: List[Tuple[int, str, Optional[str], bool]] = []
+        with self.store.lock:
+            for asset_id, force in batch:
+                asset = self.store.find_by_id("assets", asset_id)
+                if asset and asset.get("storagePath"):
+                    jobs.append((asset_id, asset["storagePath"], asset.get("checksum"), force))
+        results: Dict[int, Dict[str, Any]] = {}
+        to_probe: List[Tuple[int, str, Optional[str]]] = []
+        for asset_id, path, checksum, force in jobs:
+            if checksum and not force and checksum in self.cache:
+                results[asset_id] = self.cache[checksum]
+                self.stats["cacheHits"] += 1
+            else:
+                to_probe.append((asset_id, path, checksum))
+        if to_probe:
+            paths = [path for _, path, _ in to_probe]
+            chunksize = max(1, len(paths) // (self.workers * 4))
+            try:
+                infos = list(self.executor().map(probe_file, paths, chunksize=chunksize))
+            except BrokenProcessPool:
+                # 进程池不可用时重建，并在当前线程内完成本批次，避免素材卡在队列中
+                self.pool = None
+                infos = [probe_file(path) for path in paths]
+            for (asset_id, _, checksum), info in zip(to_probe, infos):
+                results[asset_id] = info
+                if "error" in info:
+                    self.stats["failed"] += 1
+                    continue
+                self.stats["probed"] += 1
+                if checksum:
+                    self.cache[checksum] = info
+        with self.store.lock:
+            for asset_id, info in results.items():
+                asset = self.store.find_by_id("assets", asset_id)
+                if not asset:
+                    continue
+                if "error" in info:
+                    asset["mediaInfoError"] = info["error"]
+                    self.store.mark_changed("assets", asset)
+                    continue
+                asset["mediaInfo"] = info
+                asset.pop("mediaInfoError", None)
+                for key, value in asset_fields(info).items():
+                    if asset.get(key) in (None, ""):
+                        asset[key] = value
+                asset["updatedAt"] = iso_now()
+                self.store.mark_changed("assets", asset)
+            self.stats["batches"] += 1
+            self.store.schedule_save()
+        if to_probe:
+            self.cache_path.write_text(json.dumps(self.cache, ensure_ascii=False), encoding="utf-8")
+        return results
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"pending": self.queue.qsize(), "workers": self.workers, "cacheEntries": len(self.cache), **self.stats}
+
+
+metadata_extractor = MetadataExtractor(store)
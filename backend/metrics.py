@@ -0,0 +1,230 @@
+from __future__ import annotations
+
+import bisect
+import math
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# 不依赖 prometheus_client 的最小实现：计数器 / 直方图在热路径上只做一次加锁累加，
+# 队列深度等瞬时值由 gauge 回调在抓取时读取各模块的 snapshot()，平时没有开销
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1, 10, 100, 1000, 10000, 100000, 1000000)
+
+Labels = Tuple[str, ...]
+
+
+def escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(names: Sequence[str], values: Sequence[Any], extra: str = "") -> str:
+    parts = [f'{name}="{escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self.values: Dict[Labels, float] = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount: float = 1, *labels: Any) -> None:
+        key = tuple(str(label) for label in labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self) -> Iterable[str]:
+        with self.lock:
+            items = list(self.values.items())
+        for labels, value in items:
+            yield f"{self.name}{format_labels(self.label_names, labels)} {format_value(value)}"
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(
+        self, name: str, documentation: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # 标签 -> [各桶计数（非累计）..., +Inf 桶计数, 总和]
+        self.values: Dict[Labels, List[float]] = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value: float, *labels: Any) -> None:
+        key = tuple(str(label) for label in labels)
+        position = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            row = self.values.get(key)
+            if row is None:
+                row = self.values[key] = [0.0] * (len(self.buckets) + 2)
+            row[position] += 1
+            row[-1] += value
+
+    def time(self, *labels: Any) -> "Timer":
+        return Timer(self, labels)
+
+    def samples(self) -> Iterable[str]:
+        with self.lock:
+            items = [(labels, list(row)) for labels, row in self.values.items()]
+        for labels, row in items:
+            cumulative = 0.0
+            for bound, count in zip(self.buckets + (math.inf,), row[:-1]):
+                cumulative += count
+                bucket = format_labels(self.label_names, labels, f'le="{format_value(bound)}"')
+                yield f"{self.name}_bucket{bucket} {format_value(cumulative)}"
+            suffix = format_labels(self.label_names, labels)
+            yield f"{self.name}_sum{suffix} {format_value(row[-1])}"
+            yield f"{self.name}_count{suffix} {format_value(cumulative)}"
+
+
+class Timer:
+    __slots__ = ("histogram", "labels", "start")
+
+    def __init__(self, histogram: Histogram, labels: Tuple[Any, ...]) -> None:
+        self.histogram = histogram
+        self.labels = labels
+        self.start = 0.0
+
+    def __enter__(self) -> "Timer":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+
+
+class Gauge:
+    # 抓取时调用 collect()，返回 {标签取值元组: 数值}；kind="counter" 用于直接导出模块已有的 stats 计数
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str],
+        collect: Callable[[], Dict[Labels, float]],
+        kind: str = "gauge",
+    ) -> None:
+        self.kind = kind
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self.collect = collect
+
+    def samples(self) -> Iterable[str]:
+        for labels, value in self.collect().items():
+            if value is None:
+                continue
+            yield f"{self.name}{format_labels(self.label_names, labels)} {format_value(value)}"
+
+
+class Registry:
+    def __init__(self) -> None:
+        self.metrics: Dict[str, Any] = {}
+        self.lock = threading.Lock()
+
+    def register(self, metric: Any) -> Any:
+        with self.lock:
+            existing = self.metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self.metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labels))
+
+    def histogram(
+        self, name: str, documentation: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labels, buckets))
+
+    def gauge(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str],
+        collect: Callable[[], Dict[Labels, float]],
+        kind: str = "gauge",
+    ) -> Gauge:
+        return self.register(Gauge(name, documentation, labels, collect, kind))
+
+    def render(self) -> str:
+        # Prometheus 文本格式 0.0.4
+        lines: List[str] = []
+        with self.lock:
+            metrics = list(self.metrics.values())
+        for metric in metrics:
+            try:
+                samples = list(metric.samples())
+            except Exception as exc:  # 单个回调出错不影响其余指标
+                lines.append(f"# {metric.name} 采集失败：{exc!r}")
+                continue
+            lines.append(f"# HELP {metric.name} {escape(metric.documentation)}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+HTTP_DURATION = registry.histogram(
+    "nas_http_request_duration_seconds", "HTTP 请求处理耗时（按路由模板）", ("method", "route", "status")
+)
+RESPONSE_RENDER = registry.histogram("nas_http_response_render_seconds", "响应体 JSON 编码耗时")
+HTTP_IN_FLIGHT: Dict[str, int] = {"requests": 0}
+registry.gauge("nas_http_requests_in_flight", "正在处理的 HTTP 请求数", (), lambda: {(): HTTP_IN_FLIGHT["requests"]})
+
+
+class RequestMetrics:
+    # 纯 ASGI 中间件：按路由模板记录请求耗时。路由由 Router 写入 scope["endpoint"]，
+    # 被外层中间件提前应答（如 304、转发）的请求交给 resolve 按路径匹配
+    def __init__(self, app: Any, resolve: Callable[[Dict[str, Any]], Optional[str]]) -> None:
+        self.app = app
+        self.resolve = resolve
+        self.routes: Dict[Any, str] = {}
+
+    def route_of(self, scope: Dict[str, Any]) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is not None:
+            path = self.routes.get(endpoint)
+            if path is None:
+                path = self.resolve(scope) or "unmatched"
+                self.routes[endpoint] = path
+            return path
+        return self.resolve(scope) or "unmatched"
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message: Dict[str, Any]) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT["requests"] += 1
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_IN_FLIGHT["requests"] -= 1
+            HTTP_DURATION.observe(time.perf_counter() - start, scope["method"], self.route_of(scope), status)
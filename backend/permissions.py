@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import threading
+from typing import Any, Dict, FrozenSet, List, Optional
+
+from .datastore import DataStore, store
+
+# 项目成员角色（project_members.role）在该项目内追加的权限
+MEMBER_ROLE_PERMISSIONS: Dict[str, List[str]] = {
+    "owner": [
+        "perm.project.view",
+        "perm.project.edit",
+        "perm.project.archive",
+        "perm.project.member.view",
+        "perm.project.member.manage",
+        "perm.asset.view",
+        "perm.asset.edit",
+        "perm.asset.meta.edit",
+        "perm.asset.search",
+        "perm.import.create",
+        "perm.import.view",
+        "perm.sync.view",
+        "perm.restore.view",
+    ],
+    "editor": [
+        "perm.project.view",
+        "perm.project.member.view",
+        "perm.asset.view",
+        "perm.asset.edit",
+        "perm.asset.meta.edit",
+        "perm.asset.search",
+        "perm.import.create",
+        "perm.import.view",
+        "perm.restore.view",
+    ],
+    "viewer": ["perm.project.view", "perm.asset.view", "perm.asset.search"],
+}
+# 以下权限只在用户所属的项目内生效；其余权限（存储、用户、系统设置等）为全局权限
+PROJECT_SCOPED_PREFIXES = ("perm.project.", "perm.asset.")
+GLOBAL_EXCEPTIONS = {"perm.project.create"}
+
+
+class CompiledPermissions:
+    __slots__ = ("is_admin", "global_mask", "project_masks")
+
+    def __init__(self, is_admin: bool, global_mask: int, project_masks: Dict[int, int]) -> None:
+        self.is_admin = is_admin
+        self.global_mask = global_mask
+        self.project_masks = project_masks
+
+
+NO_PERMISSIONS = CompiledPermissions(False, 0, {})
+
+
+class PermissionEngine:
+    def __init__(self, data_store: DataStore) -> None:
+        self.store = data_store
+        self.lock = threading.Lock()
+        self.cache: Dict[int, CompiledPermissions] = {}
+        self.stats = {"compiles": 0, "hits": 0, "invalidations": 0}
+        self.load_catalog()
+
+    def load_catalog(self) -> None:
+        names = list(self.store.data.get("permissions", []))
+        for perms in MEMBER_ROLE_PERMISSIONS.values():
+            names.extend(name for name in perms if name not in names)
+        self.bits = {name: 1 << index for index, name in enumerate(names)}
+        self.all_mask = (1 << len(names)) - 1
+        self.scoped_mask = self.mask(
+            name for name in names if name.startswith(PROJECT_SCOPED_PREFIXES) and name not in GLOBAL_EXCEPTIONS
+        )
+        self.member_masks = {role: self.mask(perms) for role, perms in MEMBER_ROLE_PERMISSIONS.items()}
+
+    def mask(self, names: Any) -> int:
+        value = 0
+        for name in names:
+            value |= self.bits.get(name, 0)
+        return value
+
+    def compile(self, user_id: int) -> Optional[CompiledPermissions]:
+        # 用户不存在时返回 None：调用方不缓存，之后创建的同 id 用户不会沿用空权限
+        user = self.store.find_by_id("users", user_id)
+        if not user:
+            return None
+        if user.get("status") == "disabled":
+            return CompiledPermissions(False, 0, {})
+        roles = {role["id"]: role for role in self.store.data.get("roles", [])}
+        is_admin = False
+        role_mask = 0
+        for role_id in user.get("roles", []):
+            role = roles.get(role_id)
+            if not role:
+                continue
+            if role.get("permissions") == "*":
+                is_admin = True
+            else:
+                role_mask |= self.mask(role.get("permissions") or [])
+        if is_admin:
+            return CompiledPermissions(True, self.all_mask, {})
+        project_masks: Dict[int, int] = {}
+        for member in self.store.index("project_members", "userId").get(user_id, []):
+            project_id = member.get("projectId")
+            project_masks[project_id] = project_masks.get(project_id, role_mask) | self.member_masks.get(member.get("role"), 0)
+        return CompiledPermissions(False, role_mask & ~self.scoped_mask, project_masks)
+
+    def get(self, user_id: int) -> CompiledPermissions:
+        compiled = self.cache.get(user_id)
+        if compiled is not None:
+            self.stats["hits"] += 1
+            return compiled
+        with self.lock:
+            compiled = self.cache.get(user_id)
+            if compiled is None:
+                compiled = self.compile(user_id)
+                self.stats["compiles"] += 1
+                if compiled is None:
+                    return NO_PERMISSIONS
+                self.cache[user_id] = compiled
+            return compiled
+
+    def allowed(self, user_id: int, permission: str, project_id: Optional[int] = None) -> bool:
+        bit = self.bits.get(permission)
+        if bit is None:
+            return False
+        compiled = self.get(user_id)
+        if compiled.is_admin:
+            return True
+        if project_id is not None:
+            return bool(compiled.project_masks.get(project_id, compiled.global_mask) & bit)
+        return bool(compiled.global_mask & bit)
+
+    def effective(self, user_id: int, project_id: Optional[int] = None) -> List[str]:
+        compiled = self.get(user_id)
+        if compiled.is_admin:
+            value = self.all_mask
+        elif project_id is not None:
+            value = compiled.project_masks.get(project_id, compiled.global_mask)
+        else:
+            value = compiled.global_mask
+        return [name for name, bit in self.bits.items() if value & bit]
+
+    def visible_projects(self, user_id: int, permission: str = "perm.project.view") -> Optional[FrozenSet[int]]:
+        # None 表示不受限（管理员）
+        compiled = self.get(user_id)
+        if compiled.is_admin:
+            return None
+        bit = self.bits.get(permission, 0)
+        return frozenset(project_id for project_id, value in compiled.project_masks.items() if value & bit)
+
+    def invalidate(self, user_id: Optional[int] = None) -> None:
+        with self.lock:
+            self.stats["invalidations"] += 1
+            if user_id is None:
+                self.cache.clear()
+                self.load_catalog()
+            else:
+                self.cache.pop(user_id, None)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"cachedUsers": len(self.cache), "permissions": len(self.bits), **self.stats}
+
+
+permission_engine = PermissionEngine(store)
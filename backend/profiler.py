@@ -0,0 +1,348 @@
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import functools
+import inspect
+import random
+import sys
+import threading
+import time
+from collections import Counter, deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from fastapi.routing import APIRoute
+
+from .datastore import DataStore, iso_now, store
+
+DEFAULT_SETTINGS: Dict[str, Any] = {
+    "enabled": False,
+    "sampleRate": 0.01,
+    "routes": [],
+    "slowThresholdMs": 1000,
+    "intervalMs": 10,
+    "slowLogSize": 200,
+}
+MAX_DEPTH = 64
+MAX_STACKS = 20000
+MAX_REQUEST_STACKS = 2000
+SLOW_LOG_STACKS = 20
+# 长连接（变更流 SSE）会一直处于处理中，不参与剖析与慢请求统计
+EXCLUDED_PATHS = ("/api/changes/stream",)
+
+Stack = Tuple[str, ...]
+# async 处理函数的登记项：(事件循环线程, 事件循环, 执行处理函数的任务)
+TaskEntry = Tuple[int, asyncio.AbstractEventLoop, Optional["asyncio.Task[Any]"]]
+
+
+class RequestProfile:
+    __slots__ = ("method", "path", "query", "start", "sampled", "late", "threads", "tasks", "samples", "route")
+
+    def __init__(self, method: str, path: str, query: str, sampled: bool) -> None:
+        self.method = method
+        self.path = path
+        self.query = query
+        self.start = time.perf_counter()
+        self.sampled = sampled
+        self.late = False
+        self.threads: List[int] = []
+        self.tasks: List[TaskEntry] = []
+        self.samples: "Counter[Stack]" = Counter()
+        self.route: Optional[str] = None
+
+
+current_profile: contextvars.ContextVar[Optional[RequestProfile]] = contextvars.ContextVar(
+    "current_profile", default=None
+)
+
+
+class Profiler:
+    # 按需开启的采样分析器。ProfiledRoute 在处理函数执行期间登记它所在的位置：同步处理函数登记
+    # 线程池中的工作线程，async 处理函数登记事件循环线程与执行它的任务。单个后台线程每 intervalMs
+    # 通过 sys._current_frames() 取这些线程的调用栈，事件循环线程的栈只计入取栈前后
+    # asyncio.current_task() 都是该任务的请求，交错执行的其他协程与循环空闲等待不计入：按 sampleRate 抽中的请求从开始就采样，
+    # 其余请求运行超过慢请求阈值的一半后也开始采样，慢请求日志因此总能附带剖析结果。
+    # 栈深、不同栈的数量与慢请求日志都有上限，关闭时中间件只做一次布尔判断
+    def __init__(self, data_store: DataStore) -> None:
+        self.store = data_store
+        self.settings = dict(DEFAULT_SETTINGS)
+        self.settings_version = -1
+        self.lock = threading.Lock()
+        self.active: Dict[int, RequestProfile] = {}
+        self.stacks: Dict[str, "Counter[Stack]"] = {}
+        self.distinct = 0
+        self.slow_log: Deque[Dict[str, Any]] = deque(maxlen=DEFAULT_SETTINGS["slowLogSize"])
+        self.labels: Dict[Any, str] = {}
+        self.sampler: Optional[threading.Thread] = None
+        self.stats = {"profiled": 0, "lateProfiled": 0, "samples": 0, "droppedSamples": 0, "slowRequests": 0}
+        self.refresh()
+
+    def refresh(self) -> None:
+        # 设置保存在 store.data["settings"]["profiler"]；replica 同步到设置后在下一个请求时生效
+        version = self.store.version("settings")
+        if version != self.settings_version:
+            self.settings_version = version
+            self.configure(self.store.data.get("settings", {}).get("profiler") or {})
+
+    def configure(self, settings: Dict[str, Any]) -> Dict[str, Any]:
+        merged = {**self.settings, **{key: settings[key] for key in DEFAULT_SETTINGS if key in settings}}
+        merged["enabled"] = bool(merged["enabled"])
+        merged["sampleRate"] = min(1.0, max(0.0, float(merged["sampleRate"])))
+        merged["routes"] = [str(route) for route in merged["routes"] or []]
+        merged["slowThresholdMs"] = max(0.0, float(merged["slowThresholdMs"]))
+        merged["intervalMs"] = max(1.0, float(merged["intervalMs"]))
+        merged["slowLogSize"] = max(1, int(merged["slowLogSize"]))
+        with self.lock:
+            self.settings = merged
+            if self.slow_log.maxlen != merged["slowLogSize"]:
+                self.slow_log = deque(self.slow_log, maxlen=merged["slowLogSize"])
+        if merged["enabled"]:
+            self.ensure_sampler()
+        return self.settings
+
+    def ensure_sampler(self) -> None:
+        if self.sampler is not None and self.sampler.is_alive():
+            return
+        with self.lock:
+            if self.sampler is None or not self.sampler.is_alive():
+                self.sampler = threading.Thread(target=self.loop, name="profiler-sampler", daemon=True)
+                self.sampler.start()
+
+    def begin(
+        self, method: str, path: str, query: str, resolve: Callable[[], Optional[str]]
+    ) -> Optional[RequestProfile]:
+        settings = self.settings
+        if not settings["enabled"]:
+            return None
+        sampled = random.random() < settings["sampleRate"]
+        profile = RequestProfile(method, path, query, sampled)
+        if sampled and settings["routes"]:
+            profile.route = resolve()
+            profile.sampled = profile.route in settings["routes"]
+        with self.lock:
+            if profile.sampled:
+                self.stats["profiled"] += 1
+            self.active[id(profile)] = profile
+        return profile
+
+    def end(
+        self, profile: RequestProfile, status: int, path_params: Dict[str, Any], resolve: Callable[[], Optional[str]]
+    ) -> None:
+        elapsed = (time.perf_counter() - profile.start) * 1000
+        with self.lock:
+            self.active.pop(id(profile), None)
+        settings = self.settings
+        slow = settings["slowThresholdMs"] and elapsed >= settings["slowThresholdMs"]
+        if not profile.samples and not slow:
+            return
+        route = profile.route or resolve() or profile.path
+        with self.lock:
+            counter = self.stacks.setdefault(route, Counter())
+            for stack, count in profile.samples.items():
+                if stack not in counter:
+                    if self.distinct >= MAX_STACKS:
+                        self.stats["droppedSamples"] += count
+                        continue
+                    self.distinct += 1
+                counter[stack] += count
+            if slow:
+                self.stats["slowRequests"] += 1
+                self.slow_log.append(
+                    {
+                        "time": iso_now(),
+                        "method": profile.method,
+                        "route": route,
+                        "path": profile.path,
+                        "pathParams": {key: str(value) for key, value in path_params.items()},
+                        "query": profile.query[:500],
+                        "status": status,
+                        "durationMs": round(elapsed, 2),
+                        "sampledFromStart": profile.sampled and not profile.late,
+                        "samples": sum(profile.samples.values()),
+                        "intervalMs": settings["intervalMs"],
+                        "stacks": [
+                            {"stack": ";".join(stack), "count": count}
+                            for stack, count in profile.samples.most_common(SLOW_LOG_STACKS)
+                        ],
+                    }
+                )
+
+    def loop(self) -> None:
+        while self.settings["enabled"]:
+            time.sleep(self.settings["intervalMs"] / 1000)
+            try:
+                self.sample()
+            except Exception:  # 采样线程不能退出
+                with self.lock:
+                    self.stats["droppedSamples"] += 1
+
+    def sample(self) -> None:
+        late = self.settings["slowThresholdMs"] / 2000
+        now = time.perf_counter()
+        with self.lock:
+            targets: List[Tuple[RequestProfile, List[int], List[TaskEntry]]] = []
+            for profile in self.active.values():
+                if not profile.sampled and late and now - profile.start >= late:
+                    profile.sampled = profile.late = True
+                    self.stats["lateProfiled"] += 1
+                if profile.sampled and (profile.threads or profile.tasks):
+                    targets.append((profile, list(profile.threads), list(profile.tasks)))
+        if not targets:
+            return
+        loops = {loop for _, _, tasks in targets for _, loop, _ in tasks}
+        before = {loop: asyncio.current_task(loop) for loop in loops}
+        frames = sys._current_frames()
+        running = {loop: task for loop, task in before.items() if asyncio.current_task(loop) is task}
+        folded: Dict[int, Stack] = {}
+        for _, threads, tasks in targets:
+            for ident in threads + [ident for ident, _, _ in tasks]:
+                if ident not in folded:
+                    frame = frames.get(ident)
+                    folded[ident] = self.fold(frame) if frame is not None else ()
+        del frames
+        with self.lock:
+            for profile, threads, tasks in targets:
+                if id(profile) not in self.active:  # 采样期间请求已结束
+                    continue
+                # 事件循环线程只在本请求的任务正在执行时计入
+                idents = threads + [ident for ident, loop, task in tasks if task is not None and running.get(loop) is task]
+                for ident in idents:
+                    stack = folded[ident]
+                    if not stack:
+                        continue
+                    if len(profile.samples) >= MAX_REQUEST_STACKS and stack not in profile.samples:
+                        self.stats["droppedSamples"] += 1
+                        continue
+                    profile.samples[stack] += 1
+                    self.stats["samples"] += 1
+
+    def fold(self, frame: Any) -> Stack:
+        # 调用栈折叠为 (根 ... 叶) 的 "模块:函数" 序列，过深时保留靠近叶子的部分
+        names: List[str] = []
+        while frame is not None and len(names) < MAX_DEPTH:
+            code = frame.f_code
+            label = self.labels.get(code)
+            if label is None:
+                label = self.labels[code] = f"{frame.f_globals.get('__name__', '?')}:{code.co_name}"
+            names.append(label)
+            frame = frame.f_back
+        names.reverse()
+        return tuple(names)
+
+    def flamegraph(self, route: Optional[str] = None, limit: Optional[int] = None) -> List[Tuple[str, int]]:
+        # folded 格式（flamegraph.pl / speedscope 可直接读取），以路由模板作为根帧
+        with self.lock:
+            rows = [
+                (f"{name};" + ";".join(stack), count)
+                for name, counter in self.stacks.items()
+                if route is None or name == route
+                for stack, count in counter.items()
+            ]
+        rows.sort(key=lambda row: row[1], reverse=True)
+        return rows[:limit] if limit else rows
+
+    def slow_requests(self, limit: int = 50, route: Optional[str] = None) -> List[Dict[str, Any]]:
+        with self.lock:
+            entries = [entry for entry in self.slow_log if route is None or entry["route"] == route]
+        return list(reversed(entries))[:limit]
+
+    def reset(self) -> None:
+        with self.lock:
+            self.stacks.clear()
+            self.slow_log.clear()
+            self.distinct = 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                **self.settings,
+                "inflight": len(self.active),
+                "profiledRoutes": sorted(self.stacks),
+                "distinctStacks": self.distinct,
+                "slowLogEntries": len(self.slow_log),
+                **self.stats,
+            }
+
+
+profiler = Profiler(store)
+
+
+def is_async(call: Callable[..., Any]) -> bool:
+    return asyncio.iscoroutinefunction(call) or inspect.isasyncgenfunction(call)
+
+
+class ProfiledRoute(APIRoute):
+    # 同步处理函数在线程池中执行：调用前把工作线程登记到当前请求的剖析记录上；
+    # async 处理函数登记事件循环线程与当前任务，中间件与其他请求占用事件循环的时间不计入
+    def get_route_handler(self) -> Callable[..., Any]:
+        call = self.dependant.call
+        if call is not None and not getattr(call, "profiled", False) and asyncio.iscoroutinefunction(call):
+
+            @functools.wraps(call)
+            async def traced_async(*args: Any, **kwargs: Any) -> Any:
+                profile = current_profile.get()
+                if profile is None:
+                    return await call(*args, **kwargs)
+                entry = (threading.get_ident(), asyncio.get_running_loop(), asyncio.current_task())
+                with profiler.lock:
+                    profile.tasks.append(entry)
+                try:
+                    return await call(*args, **kwargs)
+                finally:
+                    with profiler.lock:
+                        profile.tasks.remove(entry)
+
+            traced_async.profiled = True  # type: ignore[attr-defined]
+            self.dependant.call = traced_async
+        elif call is not None and not getattr(call, "profiled", False) and not is_async(call):
+
+            @functools.wraps(call)
+            def traced(*args: Any, **kwargs: Any) -> Any:
+                profile = current_profile.get()
+                if profile is None:
+                    return call(*args, **kwargs)
+                ident = threading.get_ident()
+                with profiler.lock:
+                    profile.threads.append(ident)
+                try:
+                    return call(*args, **kwargs)
+                finally:
+                    with profiler.lock:
+                        profile.threads.remove(ident)
+
+            traced.profiled = True  # type: ignore[attr-defined]
+            self.dependant.call = traced
+        return super().get_route_handler()
+
+
+class ProfilingMiddleware:
+    # 纯 ASGI 中间件：请求开始时登记剖析记录，结束时归并采样结果并写慢请求日志
+    def __init__(self, app: Any, resolve: Callable[[Dict[str, Any]], Optional[str]]) -> None:
+        self.app = app
+        self.resolve = resolve
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http" or scope["path"].startswith(EXCLUDED_PATHS):
+            await self.app(scope, receive, send)
+            return
+        profiler.refresh()
+        profile = profiler.begin(
+            scope["method"], scope["path"], scope.get("query_string", b"").decode("latin-1"), lambda: self.resolve(scope)
+        )
+        if profile is None:
+            await self.app(scope, receive, send)
+            return
+        status = 500
+
+        async def send_wrapper(message: Dict[str, Any]) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        token = current_profile.set(profile)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_profile.reset(token)
+            profiler.end(profile, status, scope.get("path_params") or {}, lambda: self.resolve(scope))
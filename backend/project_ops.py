@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional
+
+from .cold_cache import cold_cache
+from .datastore import DataStore, iso_now, store
+from .permissions import permission_engine
+
+# 以 projectId 关联到项目的集合；sync_jobs 通过 taskId 挂在 sync_tasks 下
+PROJECT_COLLECTIONS = ("folders", "assets", "project_members", "sync_tasks", "tier_policies")
+CHILD_COLLECTIONS = {"sync_jobs": ("taskId", "sync_tasks")}
+# 复制项目结构时不带过去的字段：运行状态、统计值与由 project_tree 临时挂上的子目录
+CLONE_EXCLUDED = {"id", "version", "children", "lastRunAt", "lastRunStatus", "archivedAt"}
+
+
+class ProjectOperations:
+    # 项目级批量操作：归档到冷层、复制目录结构、级联删除。关联记录通过外键索引
+    # （store.index(集合, "projectId")）一次取出，全部修改在 store.lock 内完成，
+    # 关联集合按批量变更只递增一次版本号，项目本身发出一条单条变更事件，最后由调用方保存一次
+    def __init__(self, data_store: DataStore) -> None:
+        self.store = data_store
+        self.stats = {"archived": 0, "cloned": 0, "deleted": 0}
+
+    def related(self, project_id: int) -> Dict[str, List[Dict[str, Any]]]:
+        rows = {name: list(self.store.index(name, "projectId").get(project_id, ())) for name in PROJECT_COLLECTIONS}
+        for name, (field, parent) in CHILD_COLLECTIONS.items():
+            by_parent = self.store.index(name, field)
+            rows[name] = [child for row in rows[parent] for child in by_parent.get(row.get("id"), ())]
+        return rows
+
+    def archive(self, project: Dict[str, Any]) -> Dict[str, int]:
+        # 素材全部转为冷层、仅保留云端副本，同步任务停用；已归档的记录不重复修改
+        now = iso_now()
+        with self.store.lock:
+            rows = self.related(project["id"])
+            assets = [
+                asset
+                for asset in rows["assets"]
+                if asset.get("tierLevel") != "cold" or asset.get("localPresence") != "cloud"
+            ]
+            for asset in assets:
+                touch(asset, {"tierLevel": "cold", "localPresence": "cloud", "updatedAt": now})
+                asset.pop("cachedAt", None)
+            tasks = [task for task in rows["sync_tasks"] if task.get("enabled")]
+            for task in tasks:
+                touch(task, {"enabled": False})
+            project.update({"status": "archived", "tierLevel": "cold", "archivedAt": now, "updatedAt": now})
+            if assets:
+                self.store.mark_changed("assets", ids=[asset.get("id") for asset in assets])
+            if tasks:
+                self.store.mark_changed("sync_tasks", ids=[task.get("id") for task in tasks])
+            self.store.mark_changed("projects", project, "update")
+        cold_cache.forget_project(project["id"])
+        self.stats["archived"] += 1
+        return {"assets": len(assets), "sync_tasks": len(tasks)}
+
+    def clone(self, project: Dict[str, Any], overrides: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        # 复制项目、目录树、成员、同步任务与分层策略，不复制素材；目录的 parentId 映射到新目录，
+        # 复制出的同步任务默认停用
+        overrides = dict(overrides or {})
+        now = iso_now()
+        with self.store.lock:
+            rows = self.related(project["id"])
+            created = {
+                **copy_row(project),
+                "name": f"{project.get('name', '')}（副本）",
+                "status": "ongoing",
+                "tierLevel": "hot",
+                "size": 0,
+                "createdAt": now,
+                "updatedAt": now,
+                **overrides,
+                "id": self.store.next_id("projects"),
+                "clonedFrom": project["id"],
+            }
+            copies: Dict[str, List[Dict[str, Any]]] = {}
+            folder_ids: Dict[Any, int] = {}
+            next_folder = self.store.next_id("folders", len(rows["folders"]))
+            for offset, folder in enumerate(rows["folders"]):
+                folder_ids[folder.get("id")] = next_folder + offset
+            copies["folders"] = [
+                {
+                    **copy_row(folder),
+                    "id": folder_ids[folder.get("id")],
+                    "projectId": created["id"],
+                    "parentId": folder_ids.get(folder.get("parentId")),
+                    "version": 1,
+                }
+                for folder in rows["folders"]
+            ]
+            extra = {
+                "project_members": {"joinedAt": now},
+                "sync_tasks": {"enabled": False},
+                "tier_policies": {"projectName": created.get("name")},
+            }
+            for name, changes in extra.items():
+                first = self.store.next_id(name, len(rows[name]))
+                copies[name] = [
+                    {**copy_row(row), **changes, "id": first + offset, "projectId": created["id"], "version": 1}
+                    for offset, row in enumerate(rows[name])
+                ]
+            self.store.get_collection("projects").append(created)
+            for name, items in copies.items():
+                if items:
+                    self.store.get_collection(name).extend(items)
+                    self.store.mark_changed(name, ids=[item["id"] for item in items])
+            self.store.mark_changed("projects", created, "create")
+        for member in copies["project_members"]:
+            permission_engine.invalidate(member.get("userId"))
+        self.stats["cloned"] += 1
+        return {"project": created, "copied": {name: len(items) for name, items in copies.items()}}
+
+    def delete(self, project: Dict[str, Any]) -> Dict[str, int]:
+        # 级联删除：每个关联集合只重建一次列表，不逐条调用 delete_by_id
+        with self.store.lock:
+            rows = self.related(project["id"])
+            for name, items in rows.items():
+                if not items:
+                    continue
+                doomed = {id(item) for item in items}
+                self.store.data[name] = [item for item in self.store.get_collection(name) if id(item) not in doomed]
+                self.store.mark_changed(name, ids=[item.get("id") for item in items])
+            self.store.data["projects"] = [item for item in self.store.get_collection("projects") if item is not project]
+            self.store.mark_changed("projects", project, "delete")
+        cold_cache.forget_project(project["id"])
+        for member in rows["project_members"]:
+            permission_engine.invalidate(member.get("userId"))
+        self.stats["deleted"] += 1
+        return {name: len(items) for name, items in rows.items()}
+
+    def snapshot(self) -> Dict[str, Any]:
+        return dict(self.stats)
+
+
+def touch(item: Dict[str, Any], changes: Dict[str, Any]) -> None:
+    # 批量修改不逐条发事件，但仍递增记录自身的 version，持旧版本号的条件更新会得到 409
+    item.update(changes)
+    item["version"] = item.get("version", 1) + 1
+
+
+def copy_row(item: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: value for key, value in item.items() if key not in CLONE_EXCLUDED}
+
+
+project_ops = ProjectOperations(store)
@@ -0,0 +1,270 @@
+from __future__ import annotations
+
+import heapq
+import itertools
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from .cold_cache import ColdCacheManager, asset_bytes, cold_cache
+from .datastore import DataStore, iso_now, store
+
+PRIORITIES = {"urgent": 0, "high": 1, "normal": 2, "low": 3, "prefetch": 4}
+MAX_BATCH_ASSETS = 64
+
+GroupKey = Tuple[Optional[int], Optional[int]]
+
+
+def priority_rank(priority: Any) -> int:
+    if isinstance(priority, int):
+        return priority
+    return PRIORITIES.get(str(priority), PRIORITIES["normal"])
+
+
+class RestoreRequest:
+    def __init__(self, asset: Dict[str, Any], rank: int, task_id: Optional[int], prefetch: bool) -> None:
+        self.asset_id: int = asset["id"]
+        self.group: GroupKey = (asset.get("projectId"), asset.get("folderId"))
+        self.rank = rank
+        self.task_ids = {task_id} if task_id is not None else set()
+        self.prefetch = prefetch
+
+
+def simulated_fetch(batch: Dict[str, Any], assets: List[Dict[str, Any]]) -> Dict[int, Optional[str]]:
+    # 默认冷存储客户端：整批一次性取回，返回每个素材的失败原因（None 表示成功）
+    return {asset["id"]: None for asset in assets}
+
+
+class RestoreQueue:
+    def __init__(self, data_store: DataStore, cache: ColdCacheManager) -> None:
+        self.store = data_store
+        self.cache = cache
+        self.fetch: Callable[[Dict[str, Any], List[Dict[str, Any]]], Dict[int, Optional[str]]] = simulated_fetch
+        self.max_batch = MAX_BATCH_ASSETS
+        self.lock = threading.Condition(threading.RLock())
+        self.heap: List[Tuple[int, int, GroupKey]] = []
+        self.groups: Dict[GroupKey, Dict[int, RestoreRequest]] = {}
+        self.pending: Dict[int, RestoreRequest] = {}
+        self.task_remaining: Dict[int, set] = {}
+        self.task_failures: Dict[int, Dict[int, str]] = {}
+        self.counter = itertools.count()
+        self.batch_ids = itertools.count(1)
+        self.worker: Optional[threading.Thread] = None
+        self.stats = {"batches": 0, "restored": 0, "prefetched": 0, "failed": 0, "servedLocally": 0}
+
+    def submit(
+        self,
+        assets: Iterable[Dict[str, Any]],
+        initiator: Optional[str] = None,
+        priority: Any = "normal",
+        prefetch: bool = True,
+        object_type: str = "asset",
+        task: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        assets = list(assets)
+        rank = priority_rank(priority)
+        with self.lock:
+            # 热 / 温层素材本就在本地，不进入回迁队列与冷数据缓存
+            missing = [asset for asset in assets if asset.get("tierLevel") == "cold" and not self.cache.lookup(asset)]
+            self.stats["servedLocally"] += len(assets) - len(missing)
+            if task is None:
+                project_id = assets[0].get("projectId") if assets else None
+                project = self.store.find_by_id("projects", project_id) if project_id is not None else None
+                task = {
+                    "initiator": initiator,
+                    "objectType": object_type,
+                    "projectId": project_id,
+                    "projectName": project.get("name") if project else None,
+                    "folderId": assets[0].get("folderId") if object_type == "folder" and assets else None,
+                    "assetIds": [asset["id"] for asset in assets],
+                    "priority": priority,
+                    "status": "queued",
+                    "startedAt": iso_now(),
+                    "finishedAt": None,
+                    "failureReason": None,
+                    "servedLocally": len(assets) - len(missing),
+                }
+                # insert 在 store.lock 内分配 id 并追加，并发提交不会拿到相同的 id
+                self.store.insert("restore_tasks", task)
+            else:
+                task.update({"status": "queued", "startedAt": iso_now(), "finishedAt": None, "failureReason": None})
+                task["servedLocally"] = len(assets) - len(missing)
+                self.store.mark_changed("restore_tasks", task)
+            self.task_remaining[task["id"]] = {asset["id"] for asset in missing}
+            self.task_failures[task["id"]] = {}
+            for asset in missing:
+                self.push(asset, rank, task["id"], prefetch=False)
+            if prefetch:
+                for asset in missing:
+                    self.prefetch_siblings(asset)
+            if not missing:
+                self.finish_task(task)
+            self.ensure_worker()
+            self.lock.notify_all()
+            return task
+
+    def push(self, asset: Dict[str, Any], rank: int, task_id: Optional[int], prefetch: bool) -> None:
+        request = self.pending.get(asset["id"])
+        if request is None:
+            request = RestoreRequest(asset, rank, task_id, prefetch)
+            self.pending[request.asset_id] = request
+            self.groups.setdefault(request.group, {})[request.asset_id] = request
+        else:
+            if task_id is not None:
+                request.task_ids.add(task_id)
+            request.prefetch = request.prefetch and prefetch
+            if rank >= request.rank:
+                return
+            request.rank = rank
+        heapq.heappush(self.heap, (rank, next(self.counter), request.group))
+
+    def prefetch_siblings(self, asset: Dict[str, Any]) -> None:
+        folder_id = asset.get("folderId")
+        if folder_id is None:
+            return
+        for sibling in self.store.index("assets", "folderId").get(folder_id, ()):
+            if (
+                sibling.get("id") not in self.pending
+                and sibling.get("tierLevel") == "cold"
+                and sibling.get("localPresence") != "both"
+            ):
+                self.push(sibling, PRIORITIES["prefetch"], None, prefetch=True)
+
+    def next_batch(self) -> Optional[Tuple[GroupKey, List[RestoreRequest]]]:
+        # 按最高优先级选出分组，再把同一项目/目录下的所有待回迁素材合并为一个批次
+        while self.heap:
+            rank, _, group = heapq.heappop(self.heap)
+            requests = self.groups.get(group)
+            if not requests:
+                continue
+            if min(request.rank for request in requests.values()) != rank:
+                continue
+            ordered = sorted(requests.values(), key=lambda request: request.rank)[: self.max_batch]
+            for request in ordered:
+                del requests[request.asset_id]
+                del self.pending[request.asset_id]
+            if requests:
+                heapq.heappush(self.heap, (min(r.rank for r in requests.values()), next(self.counter), group))
+            else:
+                del self.groups[group]
+            return group, ordered
+        return None
+
+    def run_once(self) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            picked = self.next_batch()
+            if picked is None:
+                return None
+            group, requests = picked
+            for task_id in {task_id for request in requests for task_id in request.task_ids}:
+                task = self.store.find_by_id("restore_tasks", task_id)
+                if task and task.get("status") == "queued":
+                    task["status"] = "running"
+                    self.store.mark_changed("restore_tasks", task)
+        assets = [asset for asset in (self.store.find_by_id("assets", r.asset_id) for r in requests) if asset]
+        batch = {
+            "batchId": next(self.batch_ids),
+            "projectId": group[0],
+            "folderId": group[1],
+            "assetIds": [asset["id"] for asset in assets],
+            "bytes": sum(asset_bytes(asset) for asset in assets),
+        }
+        try:
+            results = self.fetch(batch, assets)
+        except Exception as exc:  # 冷存储整批失败时，批次内每个素材记为失败
+            results = {asset["id"]: str(exc) for asset in assets}
+        with self.lock, self.store.lock:
+            self.stats["batches"] += 1
+            touched = set()
+            for request in requests:
+                asset = self.store.find_by_id("assets", request.asset_id)
+                reason = results.get(request.asset_id, "素材不存在") if asset else "素材不存在"
+                if reason is None and asset:
+                    admitted = self.cache.admit(asset, prefetch=request.prefetch and not request.task_ids)
+                    if admitted is not None:
+                        self.stats["prefetched" if not request.task_ids else "restored"] += 1
+                    elif request.task_ids:
+                        reason = "素材超出项目冷数据缓存容量"
+                        self.stats["failed"] += 1
+                else:
+                    self.stats["failed"] += 1
+                for task_id in request.task_ids:
+                    self.task_remaining.get(task_id, set()).discard(request.asset_id)
+                    if reason is not None:
+                        self.task_failures.setdefault(task_id, {})[request.asset_id] = reason
+                    touched.add(task_id)
+            for task_id in touched:
+                task = self.store.find_by_id("restore_tasks", task_id)
+                if task and not self.task_remaining.get(task_id):
+                    self.finish_task(task)
+            self.store.schedule_save()
+        return batch
+
+    def finish_task(self, task: Dict[str, Any]) -> None:
+        failures = self.task_failures.pop(task["id"], {})
+        self.task_remaining.pop(task["id"], None)
+        total = len(task.get("assetIds") or [])
+        if not failures:
+            task["status"] = "success"
+        else:
+            task["status"] = "partial" if len(failures) < total else "fail"
+        task["failedAssetIds"] = sorted(failures)
+        task["failureReason"] = next(iter(failures.values()), None)
+        task["finishedAt"] = iso_now()
+        self.store.mark_changed("restore_tasks", task)
+
+    def drain(self) -> List[Dict[str, Any]]:
+        batches = []
+        while True:
+            batch = self.run_once()
+            if batch is None:
+                return batches
+            batches.append(batch)
+
+    def ensure_worker(self) -> None:
+        if self.worker is None or not self.worker.is_alive():
+            self.worker = threading.Thread(target=self.loop, name="restore-queue", daemon=True)
+            self.worker.start()
+
+    def loop(self) -> None:
+        while True:
+            with self.lock:
+                while not self.heap:
+                    self.lock.wait()
+            self.run_once()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            groups = [
+                {
+                    "projectId": group[0],
+                    "folderId": group[1],
+                    "pending": len(requests),
+                    "topPriority": min(request.rank for request in requests.values()),
+                }
+                for group, requests in self.groups.items()
+            ]
+            groups.sort(key=lambda item: item["topPriority"])
+            return {"depth": len(self.pending), "groups": groups, **self.stats}
+
+
+def resolve_task_assets(data_store: DataStore, task: Dict[str, Any]) -> List[Dict[str, Any]]:
+    if task.get("failedAssetIds"):
+        asset_ids = set(task["failedAssetIds"])
+    elif task.get("assetIds"):
+        asset_ids = set(task["assetIds"])
+    else:
+        asset_ids = None
+    assets = []
+    for asset in data_store.get_collection("assets"):
+        if asset_ids is not None:
+            if asset.get("id") in asset_ids:
+                assets.append(asset)
+        elif task.get("folderId") is not None:
+            if asset.get("folderId") == task["folderId"] and asset.get("tierLevel") == "cold":
+                assets.append(asset)
+        elif asset.get("projectId") == task.get("projectId") and asset.get("tierLevel") == "cold":
+            assets.append(asset)
+    return assets
+
+
+restore_queue = RestoreQueue(store, cold_cache)
@@ -0,0 +1,233 @@
+from __future__ import annotations
+
+import json
+import threading
+from bisect import bisect_left, insort
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .datastore import DataStore, iso_now, store
+from .facets import (
+    RANGE_FIELDS,
+    FacetIndex,
+    Node,
+    asset_facets,
+    condition_node,
+    matches,
+    parse_sort,
+    range_key,
+    search_conditions,
+    sort_items,
+)
+
+Member = Tuple[Dict[str, Any], str, int]
+# 成员排序项：(分组, 取值, 素材 id)，分组 0 为数字、1 为其他取值（按字符串比较）、2 为缺少该字段
+Entry = Tuple[int, Any, Any]
+MISSING = 2
+
+
+class MaterializedView:
+    __slots__ = ("signature", "node", "members", "sort", "order", "entries")
+
+    def __init__(
+        self, signature: str, node: Optional[Node], members: Dict[Any, Member], sort: Tuple[str, bool]
+    ) -> None:
+        self.signature = signature
+        self.node = node
+        # 素材 id -> (素材, 进入视图的时间, 进入序号)；首次构建时以素材的 createdAt 作为进入时间、序号为 0
+        self.members = members
+        # 按视图的 sort 升序排列的成员（缺少该字段的在最后），成员增删或排序字段变化时二分插入 / 删除，
+        # 打开视图时不再排序
+        self.sort = sort
+        self.entries = {asset_id: sort_entry(member[0], sort[0]) for asset_id, member in members.items()}
+        self.order = sorted(self.entries.values())
+
+    def put(self, asset_id: Any, member: Member) -> None:
+        entry = sort_entry(member[0], self.sort[0])
+        old = self.entries.get(asset_id)
+        self.members[asset_id] = member
+        if old == entry:
+            return
+        if old is not None:
+            del self.order[bisect_left(self.order, old)]
+        self.entries[asset_id] = entry
+        insort(self.order, entry)
+
+    def drop(self, asset_id: Any) -> None:
+        del self.members[asset_id]
+        del self.order[bisect_left(self.order, self.entries.pop(asset_id))]
+
+    def ordered(self) -> List[Member]:
+        # 降序时只反转有取值的部分，缺少该字段的成员仍在最后
+        split = bisect_left(self.order, (MISSING,))
+        present = self.order[split - 1 :: -1] if self.sort[1] and split else self.order[:split]
+        return [self.members[entry[2]] for entry in present + self.order[split:]]
+
+
+class SavedViews:
+    # 检索视图的物化结果集：materialized 为 true 的视图在首次打开时用分面索引求出结果，
+    # 之后订阅素材的单条变更，只对变更的素材判断是否满足视图条件并增删成员，打开视图时不再重新检索。
+    # 批量变更（只递增版本号）后在下次打开前重建，已在视图中的素材保留原进入时间；
+    # 视图的条件被修改或视图被删除时丢弃对应的结果集。
+    # 时间戳只精确到秒，同一秒内进入视图与打开视图无法区分先后，因此每次进入另记一个递增序号，
+    # 本进程内打开过的视图按序号判断“上次打开后新进入”，其余情况才比较 lastUsedAt
+    def __init__(self, data_store: DataStore, index: FacetIndex) -> None:
+        self.store = data_store
+        self.index = index
+        self.lock = threading.Lock()
+        self.views: Dict[int, MaterializedView] = {}
+        self.version = data_store.version("assets")
+        self.events = 0
+        self.sequence = 0
+        self.visits: Dict[int, int] = {}
+        self.stats = {"builds": 0, "rebuilds": 0, "updates": 0, "opens": 0}
+        data_store.subscribe(self.on_change)
+
+    def on_change(self, collection: str, item: Dict[str, Any], action: str) -> None:
+        if collection == "search_views":
+            with self.lock:
+                view = self.views.get(item.get("id"))
+                if view is not None and (action == "delete" or view.signature != signature(item)):
+                    del self.views[item["id"]]
+                if action == "delete":
+                    self.visits.pop(item.get("id"), None)
+            return
+        if collection != "assets":
+            return
+        with self.lock:
+            self.events += 1
+            if not self.views:
+                return
+            asset_id = item.get("id")
+            now = iso_now()
+            for view in self.views.values():
+                known = view.members.get(asset_id)
+                if action != "delete" and (view.node is None or matches(item, view.node)):
+                    if known:
+                        view.put(asset_id, (item, known[1], known[2]))
+                    else:
+                        self.sequence += 1
+                        view.put(asset_id, (item, now, self.sequence))
+                elif known:
+                    view.drop(asset_id)
+            self.stats["updates"] += 1
+
+    def materialize(self, view: Dict[str, Any]) -> MaterializedView:
+        conditions = view.get("conditions") or {}
+        filters, keyword, query = search_conditions(conditions)
+        with self.lock:
+            version = self.store.version("assets")
+            if self.version + self.events != version:
+                # 有未逐条通知的批量变更：已物化的结果集全部作废，重建时沿用其中素材的进入时间
+                previous = self.views
+                self.views = {}
+                self.version, self.events = version, 0
+                self.stats["rebuilds"] += len(previous)
+            else:
+                previous = {}
+            events = self.events
+            current = self.views.get(view["id"])
+            if current is not None and current.signature == signature(view):
+                return current
+            old = previous.get(view["id"])
+            if old is not None and old.signature != signature(view):
+                old = None
+        items = self.index.search(filters, keyword, None, query=query)["items"]
+        now = iso_now()
+        with self.lock:
+            members: Dict[Any, Member] = {}
+            for asset in items:
+                known = old.members.get(asset.get("id")) if old else None
+                if known:
+                    members[asset.get("id")] = (asset, known[1], known[2])
+                elif old:
+                    self.sequence += 1
+                    members[asset.get("id")] = (asset, now, self.sequence)
+                else:
+                    members[asset.get("id")] = (asset, asset.get("createdAt") or "", 0)
+            materialized = MaterializedView(
+                signature(view), condition_node(filters, keyword, query), members, view_sort(view)
+            )
+            # 检索期间有素材变更时，这份结果可能漏掉变更，只用于本次打开，下次打开重新构建
+            if self.events == events and self.version + self.events == self.store.version("assets"):
+                self.views[view["id"]] = materialized
+            self.stats["builds"] += 1
+            return materialized
+
+    def open(self, view: Dict[str, Any], visible: Optional[Iterable[int]] = None) -> Dict[str, Any]:
+        # 返回 {"members": [(素材, 进入时间, 进入序号)], "materialized": bool, "visit": 上次打开时的序号}，
+        # members 已按视图的 sort 排好序；未物化的视图每次重新检索，以素材的 createdAt 作为进入时间
+        self.stats["opens"] += 1
+        conditions = view.get("conditions") or {}
+        if view.get("materialized"):
+            materialized_view = self.materialize(view)
+            with self.lock:
+                members = materialized_view.ordered()
+                visit = self.visits.get(view["id"])
+                self.visits[view["id"]] = self.sequence
+            materialized = True
+        else:
+            filters, keyword, query = search_conditions(conditions)
+            order = view_sort(view)
+            items = self.index.search(filters, keyword, None, query=query)["items"]
+            members = [(asset, asset.get("createdAt") or "", 0) for asset in sort_items(items, order[0], order[1])]
+            materialized, visit = False, None
+        if visible is not None:
+            allowed = set(visible)
+            members = [member for member in members if member[0].get("projectId") in allowed]
+        return {"members": members, "materialized": materialized, "visit": visit}
+
+    def visited(self, view: Dict[str, Any]) -> None:
+        # 使用记录（lastUsedAt / useCount）不递增视图自身的 version，持旧版本号编辑视图的请求不会因为
+        # 视图被打开过而得到 409；按带 id 的批量变更通知，列表接口的 ETag 与 replica 仍会更新
+        with self.store.lock:
+            view.update({"lastUsedAt": iso_now(), "useCount": int(view.get("useCount") or 0) + 1})
+            self.store.mark_changed("search_views", ids=[view.get("id")])
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            return {"views": {view_id: len(view.members) for view_id, view in self.views.items()}, **self.stats}
+
+
+def signature(view: Dict[str, Any]) -> str:
+    return json.dumps(
+        {"conditions": view.get("conditions") or {}, "materialized": bool(view.get("materialized"))},
+        sort_keys=True,
+        ensure_ascii=False,
+        default=str,
+    )
+
+
+def view_sort(view: Dict[str, Any]) -> Tuple[str, bool]:
+    return parse_sort((view.get("conditions") or {}).get("sort")) or ("id", False)
+
+
+def sort_entry(asset: Dict[str, Any], field: str) -> Entry:
+    value = range_key(field, asset.get(field)) if field in RANGE_FIELDS else asset.get(field)
+    if value is None:
+        return (MISSING, "", asset.get("id"))
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return (0, value, asset.get("id"))
+    return (1, str(value), asset.get("id"))
+
+
+def view_page(
+    view: Dict[str, Any],
+    members: List[Member],
+    visit: Optional[int],
+    only_new: bool,
+    offset: int,
+    limit: Optional[int],
+) -> Dict[str, Any]:
+    # members 已按视图 conditions 中的 sort（默认 id）排好序，这里只分页；new 为上次打开后进入视图的素材：
+    # 有本进程内的打开序号时比较进入序号，否则比较进入时间与 lastUsedAt
+    if visit is not None:
+        fresh = [asset for asset, _, sequence in members if sequence > visit]
+    else:
+        last_visit = view.get("lastUsedAt") or ""
+        fresh = [asset for asset, entered, _ in members if entered > last_visit]
+    items = fresh if only_new else [member[0] for member in members]
+    stop = None if limit is None else offset + limit
+    return {"items": items[offset:stop], "total": len(items), "newSinceLastVisit": len(fresh)}
+
+
+saved_views = SavedViews(store, asset_facets)
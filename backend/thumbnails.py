@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import shutil
+import struct
+import subprocess
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from html import escape
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from .datastore import DataStore, store
+from .media_probe import embedded_preview
+
+THUMB_WIDTH = 320
+PROXY_HEIGHT = 540
+DEFAULT_CACHE_BYTES = 2 * 1024 ** 3
+FFMPEG_TIMEOUT = 120
+KINDS = {"thumb": ".jpg", "proxy": ".mp4"}
+
+
+class ContentCache:
+    # 以内容键寻址的磁盘缓存：<root>/<前两位>/<键><扩展名>，总大小超限时按最近访问顺序淘汰
+    def __init__(self, root: Path, max_bytes: int = DEFAULT_CACHE_BYTES) -> None:
+        self.root = root
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries: "OrderedDict[str, Tuple[Path, int]]" = OrderedDict()
+        self.used = 0
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+        files = [path for path in root.glob("*/*") if path.is_file() and not path.name.endswith(".part")] if root.exists() else []
+        for path in sorted(files, key=lambda item: item.stat().st_atime):
+            size = path.stat().st_size
+            self.entries[path.stem] = (path, size)
+            self.used += size
+
+    def get(self, key: str) -> Optional[Path]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or not entry[0].exists():
+                self.stats["misses"] += 1
+                return None
+            self.entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry[0]
+
+    def put(self, key: str, source: Path, suffix: str) -> Path:
+        dest = self.root / key[:2] / f"{key}{suffix}"
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(source, dest)
+        size = dest.stat().st_size
+        with self.lock:
+            previous = self.entries.pop(key, None)
+            if previous:
+                self.used -= previous[1]
+            self.entries[key] = (dest, size)
+            self.used += size
+            while self.used > self.max_bytes and len(self.entries) > 1:
+                _, (path, evicted_size) = self.entries.popitem(last=False)
+                path.unlink(missing_ok=True)
+                self.used -= evicted_size
+                self.stats["evictions"] += 1
+        return dest
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            return {"entries": len(self.entries), "usedBytes": self.used, "maxBytes": self.max_bytes, **self.stats}
+
+
+def content_key(asset: Dict[str, Any], kind: str) -> Optional[str]:
+    source = asset.get("checksum")
+    if not source:
+        path = asset.get("storagePath")
+        if not path:
+            return None
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        source = f"{path}:{stat.st_size}:{stat.st_mtime_ns}"
+    spec = f"{source}|{kind}|{THUMB_WIDTH if kind == 'thumb' else PROXY_HEIGHT}"
+    return hashlib.blake2b(spec.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def placeholder_svg(asset: Dict[str, Any]) -> bytes:
+    label = escape(str(asset.get("fileType") or "file").upper())
+    name = escape(str(asset.get("fileName") or ""))[:40]
+    height = THUMB_WIDTH * 9 // 16
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{THUMB_WIDTH}" height="{height}">'
+        f'<rect width="100%" height="100%" fill="#1f2937"/>'
+        f'<text x="50%" y="45%" fill="#e5e7eb" font-size="28" text-anchor="middle">{label}</text>'
+        f'<text x="50%" y="70%" fill="#9ca3af" font-size="12" text-anchor="middle">{name}</text>'
+        f"</svg>"
+    ).encode("utf-8")
+
+
+class ThumbnailService:
+    def __init__(self, data_store: DataStore, workers: int = 2) -> None:
+        self.store = data_store
+        self.cache = ContentCache(data_store.path.parent / "thumbnail_cache")
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="thumbnail")
+        self.lock = threading.Lock()
+        self.inflight: Dict[str, Future] = {}
+        self.stats = {"generated": 0, "failed": 0, "skipped": 0}
+
+    def ffmpeg(self) -> Optional[str]:
+        return shutil.which("ffmpeg")
+
+    def can_generate(self, asset: Dict[str, Any], kind: str) -> bool:
+        # 只从本地原始文件生成，绝不为生成缩略图去触发冷数据回迁
+        if asset.get("localPresence") not in ("local", "both") or not asset.get("storagePath"):
+            return False
+        if kind == "proxy":
+            return asset.get("fileType") == "video" and self.ffmpeg() is not None
+        return True
+
+    def lookup(self, asset: Dict[str, Any], kind: str = "thumb") -> Tuple[Optional[str], Optional[Path]]:
+        key = content_key(asset, kind)
+        return key, self.cache.get(key) if key else None
+
+    def submit(self, asset: Dict[str, Any], kind: str = "thumb") -> Optional[Future]:
+        key = content_key(asset, kind)
+        if not key or not self.can_generate(asset, kind):
+            self.stats["skipped"] += 1
+            return None
+        with self.lock:
+            future = self.inflight.get(key)
+            if future is None:
+                future = self.pool.submit(self.generate, key, asset["storagePath"], asset.get("fileType"), kind)
+                self.inflight[key] = future
+                future.add_done_callback(lambda _, key=key: self.inflight.pop(key, None))
+            return future
+
+    def submit_many(self, asset_ids: Iterable[int]) -> None:
+        for asset_id in asset_ids:
+            asset = self.store.find_by_id("assets", asset_id)
+            if asset:
+                self.submit(asset, "thumb")
+
+    def generate(self, key: str, source: str, file_type: Optional[str], kind: str) -> Optional[Path]:
+        if self.cache.get(key):
+            return self.cache.get(key)
+        suffix = KINDS[kind]
+        self.cache.root.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(suffix=suffix + ".part", dir=self.cache.root)
+        os.close(fd)
+        tmp = Path(tmp_name)
+        try:
+            if not self.render(source, file_type, kind, tmp):
+                self.stats["failed"] += 1
+                tmp.unlink(missing_ok=True)
+                return None
+            self.stats["generated"] += 1
+            return self.cache.put(key, tmp, suffix)
+        except (OSError, struct.error, subprocess.SubprocessError):
+            self.stats["failed"] += 1
+            tmp.unlink(missing_ok=True)
+            return None
+
+    def render(self, source: str, file_type: Optional[str], kind: str, dest: Path) -> bool:
+        if kind == "thumb" and file_type == "image":
+            preview = embedded_preview(source)
+            if preview:
+                dest.write_bytes(preview)
+                return True
+        ffmpeg = self.ffmpeg()
+        if not ffmpeg or file_type not in ("video", "image"):
+            return False
+        if kind == "thumb":
+            args = ["-ss", "1", "-i", source, "-frames:v", "1", "-vf", f"scale={THUMB_WIDTH}:-2", "-q:v", "4", "-f", "mjpeg"]
+        else:
+            args = ["-i", source, "-vf", f"scale=-2:{PROXY_HEIGHT}", "-c:v", "libx264", "-preset", "veryfast", "-crf", "28"]
+            args += ["-c:a", "aac", "-b:a", "128k", "-movflags", "+faststart", "-f", "mp4"]
+        result = subprocess.run(
+            [ffmpeg, "-nostdin", "-loglevel", "error", "-y", *args, str(dest)],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            timeout=FFMPEG_TIMEOUT,
+        )
+        return result.returncode == 0 and dest.stat().st_size > 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"inflight": len(self.inflight), "ffmpeg": self.ffmpeg() is not None, "cache": self.cache.snapshot(), **self.stats}
+
+
+thumbnails = ThumbnailService(store)
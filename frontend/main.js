@@ -12,6 +12,7 @@ const MENU = [
         method: "GET",
         endpoint: "/api/dashboard/overview",
         description: "展示容量、磁盘健康、同步状态与告警摘要",
+        liveCollections: ["disks", "storage_volumes", "sync_jobs", "alerts", "projects", "assets"],
       },
     ],
   },
@@ -138,6 +139,7 @@ const MENU = [
         method: "GET",
         endpoint: "/api/import/tasks",
         description: "查看状态、重试失败",
+        liveCollections: ["import_tasks"],
         actions: [
           {
             label: "创建导入任务",
@@ -231,6 +233,7 @@ const MENU = [
         method: "GET",
         endpoint: "/api/sync-jobs",
         description: "按任务筛选执行记录",
+        liveCollections: ["sync_jobs"],
       },
       {
         name: "分层策略配置",
@@ -257,7 +260,19 @@ const MENU = [
         method: "GET",
         endpoint: "/api/restore/tasks",
         description: "查看回迁与重试",
+        liveCollections: ["restore_tasks"],
         actions: [
+          {
+            label: "按目录批量回迁",
+            method: "POST",
+            endpoint: "/api/restore/tasks",
+            samplePayload: { folderId: 6, priority: "high", initiator: "韩越" },
+          },
+          {
+            label: "回迁队列",
+            method: "GET",
+            endpoint: "/api/restore/queue",
+          },
           {
             label: "重试恢复",
             method: "POST",
@@ -428,6 +443,7 @@ const MENU = [
         method: "GET",
         endpoint: "/api/alerts",
         description: "容量/磁盘/同步告警",
+        liveCollections: ["alerts"],
         actions: [
           {
             label: "更新告警状态",
@@ -509,6 +525,7 @@ const MENU = [
 const menuContainer = document.getElementById("menu");
 const content = document.getElementById("content");
 let activeKey = null;
+let liveSource = null;
 
 function renderMenu() {
   menuContainer.innerHTML = "";
@@ -556,12 +573,14 @@ async function loadItem(item) {
   resultPre.textContent = "加载中...";
   content.appendChild(resultPre);
 
+  let response = null;
   try {
-    const response = await callApi(item.method, item.endpoint, item.defaultBody);
+    response = await callApi(item.method, item.endpoint, item.defaultBody);
     resultPre.textContent = JSON.stringify(response, null, 2);
   } catch (error) {
     resultPre.textContent = `请求失败: ${error.message}`;
   }
+  watchChanges(item, response, resultPre);
 
   if (item.actions && item.actions.length) {
     const actionsWrap = document.createElement("div");
@@ -574,6 +593,51 @@ async function loadItem(item) {
   }
 }
 
+// 订阅变更流：列表页按 id 就地合并增量，汇总类页面（如仪表盘）收到变更后节流重新拉取
+function watchChanges(item, response, resultPre) {
+  if (liveSource) {
+    liveSource.close();
+    liveSource = null;
+  }
+  if (!item.liveCollections || !response) {
+    return;
+  }
+  let current = response;
+  let refetchTimer = null;
+  const refetch = () => {
+    clearTimeout(refetchTimer);
+    refetchTimer = setTimeout(async () => {
+      try {
+        current = await callApi(item.method, item.endpoint, item.defaultBody);
+        resultPre.textContent = JSON.stringify(current, null, 2);
+      } catch (error) {
+        resultPre.textContent = `请求失败: ${error.message}`;
+      }
+    }, 1000);
+  };
+  const params = new URLSearchParams({ collections: item.liveCollections.join(",") });
+  liveSource = new EventSource(`${API_BASE}/api/changes/stream?${params}`);
+  liveSource.onmessage = (event) => {
+    const change = JSON.parse(event.data);
+    if (!Array.isArray(current.items)) {
+      refetch();
+      return;
+    }
+    const index = current.items.findIndex((entry) => entry.id === change.id);
+    if (change.action === "delete") {
+      if (index >= 0) {
+        current.items.splice(index, 1);
+      }
+    } else if (index >= 0) {
+      current.items[index] = change.item;
+    } else {
+      current.items.push(change.item);
+    }
+    resultPre.textContent = JSON.stringify(current, null, 2);
+  };
+  liveSource.addEventListener("reset", refetch);
+}
+
 async function callApi(method = "GET", endpoint = "", body) {
   const url = `${API_BASE}${endpoint}`;
   const options = { method, headers: {} };
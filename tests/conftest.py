@@ -0,0 +1,9 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# backend 在导入时按当前目录创建 data_store.json、logs/ 等文件：切到临时目录，测试不改动仓库中的数据
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+os.chdir(tempfile.mkdtemp(prefix="nas-tests-"))
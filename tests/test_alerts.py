@@ -0,0 +1,67 @@
+import threading
+
+from backend.alerts import AlertEngine
+from backend.datastore import DataStore
+
+
+class MemoryLog:
+    def __init__(self):
+        self.records = []
+        self.threads = set()
+
+    def append(self, record):
+        self.extend([record])
+
+    def extend(self, records):
+        self.threads.add(threading.current_thread().name)
+        self.records.extend(records)
+
+
+def test_alert_logs_are_written_outside_the_store_lock(tmp_path):
+    data_store = DataStore(str(tmp_path / "data_store.json"))
+    logs = MemoryLog()
+    engine = AlertEngine(data_store, logs)
+    engine.logs.queue.join()
+    logs.records.clear()
+    disk = data_store.data["disks"][0]
+
+    data_store.apply_update("disks", disk, {"status": "failed"})
+    engine.logs.queue.join()
+
+    assert engine.open[f"disk:{disk['id']}:health"]["level"] == "high"
+    assert [record["level"] for record in logs.records] == ["warn"]
+    assert logs.threads == {"alert-log-writer"}
+    assert "time" in logs.records[0]
+
+
+def test_replica_does_not_evaluate_rules_on_startup(tmp_path):
+    path = tmp_path / "data_store.json"
+    primary = DataStore(str(path))
+    primary.data["disks"][0]["status"] = "failed"
+    primary.save()
+
+    replica = DataStore(str(path), read_only=True)
+    engine = AlertEngine(replica, MemoryLog())
+
+    assert engine.open == {}
+    assert replica.data["alerts"] == primary.data["alerts"]
+
+
+def test_updating_an_open_alert_bumps_its_version(tmp_path):
+    data_store = DataStore(str(tmp_path / "data_store.json"))
+    engine = AlertEngine(data_store, MemoryLog())
+    disk = data_store.data["disks"][0]
+    data_store.apply_update("disks", disk, {"status": "warning"})
+    alert = engine.open[f"disk:{disk['id']}:health"]
+    version = alert["version"]
+    events = []
+    data_store.subscribe(lambda collection, item, action: events.append((collection, item.get("id"), action)))
+
+    data_store.apply_update("disks", disk, {"status": "failed"})
+    assert alert["level"] == "high"
+    assert alert["version"] == version + 1
+    assert ("alerts", alert["id"], "update") in events
+
+    # 内容不变的重复触发只刷新 lastSeenAt，不递增版本号
+    data_store.apply_update("disks", disk, {"temperature": 30})
+    assert alert["version"] == version + 1
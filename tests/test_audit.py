@@ -0,0 +1,93 @@
+import threading
+
+from fastapi import Request
+from fastapi.testclient import TestClient
+
+from backend.app import app, client_ip
+from backend.audit import AuditWriter, audit_writer, created_item, created_records, record_created
+from backend.datastore import DataStore
+
+
+class MemoryLog:
+    def __init__(self):
+        self.records = []
+
+    def append(self, record):
+        self.records.append(record)
+
+    def extend(self, records):
+        self.records.extend(records)
+
+
+def test_created_records_are_tracked_per_request(tmp_path):
+    data_store = DataStore(str(tmp_path / "data_store.json"))
+    data_store.subscribe(record_created, replicated=False)
+    first_created, second_created = threading.Event(), threading.Event()
+    seen = {}
+
+    def create(name, wait_for, signal):
+        bucket = []
+        created_records.set(bucket)
+        with data_store.lock:
+            item = {"id": data_store.next_id("projects"), "name": name}
+            data_store.get_collection("projects").append(item)
+            data_store.mark_changed("projects", item, "create")
+        signal.set()
+        if wait_for is not None:
+            wait_for.wait(5)
+        seen[name] = created_item(bucket, "projects")["id"]
+
+    # a 先建、b 后建，a 在 b 建完之后才取自己的新建记录：集合末尾已是 b 的记录
+    threads = [
+        threading.Thread(target=create, args=("a", second_created, first_created)),
+        threading.Thread(target=create, args=("b", None, second_created)),
+    ]
+    threads[0].start()
+    first_created.wait(5)
+    threads[1].start()
+    for thread in threads:
+        thread.join(5)
+
+    assert seen["a"] < seen["b"]
+    assert data_store.get_collection("projects")[-1]["id"] == seen["b"]
+
+
+def test_blocking_overflow_is_left_to_the_caller():
+    logs = MemoryLog()
+    writer = AuditWriter(logs, {"capacity": 1, "overflow": "inline"})
+    writer.ensure_worker = lambda: None
+
+    assert writer.offer({"n": 1}) is True
+    assert writer.offer({"n": 2}) is None
+    assert logs.records == []
+    assert writer.overflow({"n": 2}) is True
+    assert logs.records == [{"n": 2}]
+
+    writer.configure({"overflow": "drop_newest"})
+    assert writer.offer({"n": 3}) is False
+    assert writer.snapshot()["dropped"] == 1
+
+
+def test_create_is_audited_with_the_new_id(monkeypatch):
+    records = []
+    monkeypatch.setattr(audit_writer, "offer", lambda record: records.append(record) or True)
+    response = TestClient(app).post("/api/projects", json={"name": "审计"})
+
+    assert response.status_code == 200
+    assert records[-1]["targetType"] == "project"
+    assert records[-1]["targetId"] == response.json()["id"]
+
+
+def request_from(peer, forwarded=None):
+    headers = [(b"x-forwarded-for", forwarded.encode())] if forwarded else []
+    return Request({"type": "http", "method": "POST", "path": "/", "headers": headers, "client": (peer, 50000)})
+
+
+def test_forwarded_for_is_only_trusted_from_proxies():
+    # 直连的客户端伪造 X-Forwarded-For 无效
+    assert client_ip(request_from("203.0.113.9", "10.0.0.1")) == "203.0.113.9"
+    assert client_ip(request_from("127.0.0.1")) == "127.0.0.1"
+    assert client_ip(request_from("127.0.0.1", "203.0.113.9")) == "203.0.113.9"
+    # 经本机代理转发时，客户端自带的伪造地址在最左侧，取最右侧的非代理地址
+    assert client_ip(request_from("127.0.0.1", "10.0.0.1, 203.0.113.9, 127.0.0.1")) == "203.0.113.9"
+    assert client_ip(request_from("::1", "2001:db8::7")) == "2001:db8::7"
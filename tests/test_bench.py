@@ -0,0 +1,57 @@
+import asyncio
+import random
+
+from backend.app import app
+from backend.bench import build_scenarios, compare, generate_audit, generate_catalog, percentile, run_scenario
+from backend.datastore import DEFAULT_DATA, store
+
+
+def make_catalog():
+    return generate_catalog(random.Random(42), DEFAULT_DATA, 6, 12, 3, 500, 80)
+
+
+def test_generated_catalog_is_deterministic_and_consistent():
+    data = make_catalog()
+    assert data == make_catalog()
+    assert (len(data["projects"]), len(data["folders"]), len(data["assets"]), len(data["sync_jobs"])) == (6, 72, 500, 80)
+    assert data["users"] == DEFAULT_DATA["users"]
+
+    folders = {folder["id"]: folder for folder in data["folders"]}
+    for folder in data["folders"]:
+        level, parent = 1, folders.get(folder["parentId"])
+        while parent is not None:
+            assert parent["projectId"] == folder["projectId"]
+            level, parent = level + 1, folders.get(parent["parentId"])
+        assert level <= 4
+    projects = {project["id"]: project for project in data["projects"]}
+    for asset in data["assets"]:
+        assert folders[asset["folderId"]]["projectId"] == asset["projectId"]
+        assert asset["projectName"] == projects[asset["projectId"]]["name"]
+    task_ids = {task["id"] for task in data["sync_tasks"]}
+    assert all(job["taskId"] in task_ids for job in data["sync_jobs"])
+    for name in ("assets", "folders", "project_members", "tier_policies"):
+        ids = [row["id"] for row in data[name]]
+        assert len(ids) == len(set(ids)), name
+
+
+def test_audit_records_are_in_time_order():
+    records = generate_audit(random.Random(1), 50, ["admin", "lin_nan"])
+    assert [record["time"] for record in records] == sorted(record["time"] for record in records)
+    assert {record["user"] for record in records} <= {"admin", "lin_nan"}
+
+
+def test_scenarios_run_in_process_and_regressions_are_reported():
+    scenarios = build_scenarios(random.Random(3), store.data)
+    for name in ("dashboard", "search", "tree", "asset", "sync-jobs"):
+        result = asyncio.run(run_scenario(app, scenarios[name], 6, 2))
+        assert (result["requests"], result["errors"]) == (6, 0), name
+        assert result["p50Ms"] <= result["p99Ms"] <= result["maxMs"]
+
+    assert percentile([5.0, 1.0, 3.0, 2.0, 4.0], 0.5) == 3.0
+    assert percentile([], 0.99) == 0.0
+    baseline = {"scenarios": {"search": {"p99Ms": 10.0, "throughput": 100.0}}}
+    assert compare({"scenarios": {"search": {"p99Ms": 11.0, "throughput": 90.0}}}, baseline, 0.2) == []
+    # 基线中没有的场景不参与比较
+    current = {"search": {"p99Ms": 13.0, "throughput": 70.0}, "write": {"p99Ms": 1.0, "throughput": 1.0}}
+    slower = compare({"scenarios": current}, baseline, 0.2)
+    assert len(slower) == 2
@@ -0,0 +1,59 @@
+import asyncio
+
+from backend.changefeed import ChangeFeed
+from backend.datastore import DataStore
+
+
+def make_feed(tmp_path, capacity=100):
+    data_store = DataStore(str(tmp_path / "data_store.json"))
+    return data_store, ChangeFeed(data_store, capacity)
+
+
+def test_changes_are_numbered_and_filtered(tmp_path):
+    data_store, feed = make_feed(tmp_path)
+    alert = data_store.insert("alerts", {"content": "磁盘温度过高"})
+    data_store.insert("import_tasks", {"status": "pending"})
+    data_store.apply_update("alerts", alert, {"status": "closed"})
+    data_store.mark_changed("alerts", ids=[alert["id"]])
+
+    head, reset, changes = feed.since(0)
+    assert (head, reset) == (4, False)
+    assert [(change[0], change[1], change[3]["action"]) for change in changes] == [
+        (1, "alerts", "create"),
+        (2, "import_tasks", "create"),
+        (3, "alerts", "update"),
+    ]
+    # 批量变更标记只给 replica
+    assert [change[3]["action"] for change in feed.since(3, bulk=True)[2]] == ["bulk"]
+    assert [change[0] for change in feed.since(1, {"alerts"})[2]] == [3]
+    assert [change[0] for change in feed.since(0, item_id=alert["id"], limit=1)[2]] == [1]
+    assert feed.since(0, limit=1)[0] == 1
+
+
+def test_lagging_or_future_cursors_are_reset(tmp_path):
+    data_store, feed = make_feed(tmp_path, capacity=3)
+    for index in range(5):
+        data_store.insert("alerts", {"content": f"告警 {index}"})
+    head, reset, changes = feed.since(1)
+    assert (head, reset) == (5, True)
+    assert [change[0] for change in changes] == [3, 4, 5]
+    assert feed.since(2) == (5, False, changes)
+    assert feed.since(9)[1] is True
+
+
+def test_stream_resumes_after_the_last_event_id(tmp_path):
+    data_store, feed = make_feed(tmp_path)
+    for index in range(3):
+        data_store.insert("alerts", {"content": f"告警 {index}"})
+
+    async def collect(since, count):
+        stream = feed.stream(since, {"alerts"}, heartbeat=0.05)
+        messages = [await stream.__anext__() for _ in range(count)]
+        await stream.aclose()
+        return messages
+
+    messages = asyncio.run(collect(1, 3))
+    assert messages[0].startswith("retry:")
+    assert [message.split("\n")[0] for message in messages[1:]] == ["id: 2", "id: 3"]
+    # 序号超过当前序号（重连到了重启后的进程）时先推送 reset
+    assert asyncio.run(collect(7, 2))[1].startswith("event: reset\nid: 3")
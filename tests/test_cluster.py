@@ -0,0 +1,58 @@
+from fastapi.testclient import TestClient
+
+from backend.app import app
+from backend.changefeed import change_feed
+from backend.cluster import Replica
+from backend.datastore import DataStore, store
+from backend.permissions import PermissionEngine
+
+
+def make_replica(tmp_path):
+    client = TestClient(app)
+    replica_store = DataStore(str(tmp_path / "replica.json"), read_only=True)
+    replica = Replica(replica_store, PermissionEngine(replica_store), "http://primary")
+    replica.fetch = lambda path, timeout=None: client.get(path).json()
+    return replica
+
+
+def test_replica_follows_primary_deltas(tmp_path):
+    replica = make_replica(tmp_path)
+    events = []
+    replica.store.subscribe(lambda collection, item, action: events.append((collection, item.get("id"), action)))
+    assert replica.refresh()
+    assert replica.stats["resyncs"] == 1
+    assert replica.store.data["projects"] == store.data["projects"]
+    held = replica.store.find_by_id("projects", 1)
+
+    with store.lock:
+        store.apply_update("projects", store.find_by_id("projects", 1), {"clientName": "增量"})
+        folder = {"id": store.next_id("folders"), "projectId": 1, "name": "新目录", "parentId": None}
+        store.get_collection("folders").append(folder)
+        store.mark_changed("folders", folder, "create")
+        asset = store.find_by_id("assets", 1)
+        asset["rating"] = 5
+        store.mark_changed("assets", ids=[asset["id"]])
+        doomed = store.data["sync_jobs"][0]
+        store.data["sync_jobs"] = store.data["sync_jobs"][1:]
+        store.mark_changed("sync_jobs", doomed, "delete")
+        store.data["settings"]["base"]["siteName"] = "副本"
+        store.mark_changed("settings")
+
+    assert replica.refresh()
+    assert replica.stats["resyncs"] == 1
+    for name in ("projects", "folders", "assets", "sync_jobs", "settings"):
+        assert replica.store.data[name] == store.data[name], name
+    assert held["clientName"] == "增量"
+    assert ("folders", folder["id"], "create") in events
+    assert ("assets", 1, "update") in events
+    assert ("sync_jobs", doomed["id"], "delete") in events
+    assert not replica.refresh()
+
+
+def test_replica_resyncs_when_primary_feed_restarts(tmp_path):
+    replica = make_replica(tmp_path)
+    replica.refresh()
+    replica.cursor += 10 ** 6
+    replica.refresh()
+    assert replica.stats["resyncs"] == 2
+    assert replica.cursor == change_feed.seq
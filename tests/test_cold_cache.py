@@ -0,0 +1,45 @@
+from backend.cold_cache import GB, ColdCacheManager
+from backend.datastore import DataStore
+
+
+def make_cache(tmp_path, policy, budget_gb, sizes):
+    data_store = DataStore(str(tmp_path / "data_store.json"))
+    data_store.data["tier_policies"] = [{"id": 1, "type": "global", "coldCacheGb": budget_gb, "evictionPolicy": policy}]
+    data_store.data["assets"] = [
+        {"id": index, "projectId": 1, "folderId": 1, "size": size, "tierLevel": "cold", "localPresence": "cloud"}
+        for index, size in enumerate(sizes, 1)
+    ]
+    return data_store, ColdCacheManager(data_store)
+
+
+def test_admit_stays_within_budget_for_every_policy(tmp_path):
+    for policy in ("lru", "lfu", "size"):
+        data_store, cache = make_cache(tmp_path, policy, 10, [4, 4, 4, 4])
+        for asset in data_store.data["assets"]:
+            # 已缓存的素材先被访问过，新放入的素材在 LFU / size 策略下优先级最低
+            for cached in data_store.data["assets"]:
+                if cached["localPresence"] == "both":
+                    cache.request(cached)
+            cache.request(asset)
+            used = cache.snapshot()["projects"][0]["usedBytes"]
+            assert used <= 10 * GB, policy
+        # 刚放入的素材不会被自己挤出缓存
+        assert data_store.data["assets"][-1]["localPresence"] == "both", policy
+        assert sum(asset["localPresence"] == "both" for asset in data_store.data["assets"]) == 2, policy
+
+
+def test_asset_larger_than_budget_is_not_admitted(tmp_path):
+    data_store, cache = make_cache(tmp_path, "lru", 10, [4, 12])
+    small, large = data_store.data["assets"]
+    assert cache.admit(small) == []
+    assert cache.admit(large) is None
+    assert large["localPresence"] == "cloud"
+    assert small["localPresence"] == "both"
+
+
+def test_non_cold_assets_are_never_cached(tmp_path):
+    data_store, cache = make_cache(tmp_path, "lru", 10, [4])
+    asset = data_store.data["assets"][0]
+    asset.update({"tierLevel": "hot", "localPresence": "both"})
+    assert cache.admit(asset) is None
+    assert cache.snapshot()["projects"] == [] or cache.snapshot()["projects"][0]["usedBytes"] == 0
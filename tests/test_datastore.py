@@ -0,0 +1,73 @@
+import json
+import threading
+
+from backend.datastore import DataStore
+
+
+def test_background_save_writes_the_snapshot_taken_under_the_lock(tmp_path):
+    data_store = DataStore(str(tmp_path / "data_store.json"))
+    project = data_store.find_by_id("projects", 1)
+    data_store.apply_update("projects", project, {"name": "保存前"})
+    serialize = data_store.serialize
+
+    def mutate_then_serialize(data):
+        # 序列化在锁外进行：这时的修改不属于这次快照
+        data_store.apply_update("projects", project, {"name": "保存后"})
+        return serialize(data)
+
+    data_store.serialize = mutate_then_serialize
+    data_store.schedule_save().result()
+
+    saved = json.loads((tmp_path / "data_store.json").read_text(encoding="utf-8"))
+    assert saved["projects"][0]["name"] == "保存前"
+    assert saved["projects"][0]["version"] == project["version"] - 1
+
+
+def test_index_rebuild_does_not_wait_for_the_store_lock(tmp_path):
+    data_store = DataStore(str(tmp_path / "data_store.json"))
+    held, release = threading.Event(), threading.Event()
+
+    def writer():
+        with data_store.lock:
+            held.set()
+            release.wait(5)
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    held.wait(5)
+    try:
+        expected = [asset["id"] for asset in data_store.data["assets"] if asset.get("projectId") == 1]
+        assert [asset["id"] for asset in data_store.index("assets", "projectId").get(1, ())] == expected
+        assert thread.is_alive()
+    finally:
+        release.set()
+        thread.join(5)
+
+
+def test_index_is_maintained_per_record_without_rebuilding(tmp_path):
+    data_store = DataStore(str(tmp_path / "data_store.json"))
+    by_project = data_store.index("assets", "projectId")
+    built = data_store.indexes[("assets", "projectId")]
+    base = data_store.find_by_id("assets", 1)
+
+    moved = data_store.find_by_id("assets", 2)
+    data_store.apply_update("assets", moved, {"projectId": 2})
+    created = data_store.insert("assets", {**base, "id": None, "projectId": 2})
+    data_store.remove("assets", [base])
+    # 批量变更只带 id：按 id 重新写入
+    with data_store.lock:
+        moved["projectId"] = 1
+        data_store.mark_changed("assets", ids=[moved["id"]])
+
+    assert data_store.index("assets", "projectId") is by_project
+    assert data_store.indexes[("assets", "projectId")] is built
+    for project_id in (1, 2):
+        expected = [asset["id"] for asset in data_store.data["assets"] if asset.get("projectId") == project_id]
+        assert [asset["id"] for asset in by_project.get(project_id, ())] == expected
+    assert created["id"] in [asset["id"] for asset in by_project[2]]
+
+    # 集合被整体替换（未带 id 的批量变更）后重建
+    data_store.data["assets"] = [dict(asset) for asset in data_store.data["assets"]]
+    data_store.mark_changed("assets")
+    assert data_store.indexes[("assets", "projectId")].stale
+    assert data_store.index("assets", "projectId") is not by_project
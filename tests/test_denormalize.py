@@ -0,0 +1,62 @@
+import random
+
+from backend import denormalize
+from backend.bench import generate_catalog
+from backend.datastore import DEFAULT_DATA, DataStore
+from backend.denormalize import Denormalizer
+
+
+def make_denormalizer(tmp_path, monkeypatch):
+    monkeypatch.setattr(denormalize, "BATCH_SIZE", 7)
+    data_store = DataStore(str(tmp_path / "data_store.json"))
+    catalog = generate_catalog(random.Random(5), DEFAULT_DATA, 4, 3, 2, 120, 0)
+    DataStore.fill_versions(catalog)
+    for name in ("projects", "assets", "tier_policies"):
+        data_store.data[name] = catalog[name]
+    denormalizer = Denormalizer(data_store)
+    # 由测试逐批驱动，不启动后台线程
+    monkeypatch.setattr(denormalizer, "ensure_worker", lambda: None)
+    return data_store, denormalizer
+
+
+def test_project_rename_propagates_in_batches(tmp_path, monkeypatch):
+    data_store, denormalizer = make_denormalizer(tmp_path, monkeypatch)
+    project = data_store.find_by_id("projects", 1)
+    assets = [asset for asset in data_store.data["assets"] if asset["projectId"] == 1]
+    others = {asset["id"]: dict(asset) for asset in data_store.data["assets"] if asset["projectId"] != 1}
+    # 导入任务写入的 owner 不是项目负责人的副本，不跟随改名
+    assert all(asset["owner"] == project["ownerName"] for asset in assets)
+    assets[0]["owner"] = "导入员"
+    version = data_store.version("assets")
+
+    data_store.apply_update("projects", project, {"name": "新名字", "clientName": "新客户", "ownerName": "新负责人"})
+    assert denormalizer.run_once()
+    assert denormalizer.snapshot()["pending"]
+    # 传播尚未完成时再次改名：合并为一次传播，从头按最新取值重扫
+    data_store.apply_update("projects", project, {"name": "最终名字"})
+    batches = denormalizer.drain()
+
+    assert batches >= 2 * (len(assets) // 7)
+    assert all((asset["projectName"], asset["clientName"]) == ("最终名字", "新客户") for asset in assets)
+    assert assets[0]["owner"] == "导入员"
+    assert all(asset["owner"] == "新负责人" for asset in assets[1:])
+    assert {asset["id"]: asset for asset in data_store.data["assets"] if asset["projectId"] != 1} == others
+    policies = [policy for policy in data_store.data["tier_policies"] if policy.get("projectId") == 1]
+    assert all(policy["projectName"] == "最终名字" for policy in policies)
+    assert data_store.version("assets") > version
+    snapshot = denormalizer.snapshot()
+    assert snapshot["pending"] == [] and snapshot["lagSeconds"] == 0.0
+    assert snapshot["propagations"] >= 2
+
+
+def test_unrelated_changes_and_deletes_do_not_propagate(tmp_path, monkeypatch):
+    data_store, denormalizer = make_denormalizer(tmp_path, monkeypatch)
+    project = data_store.find_by_id("projects", 2)
+    data_store.apply_update("projects", project, {"status": "completed"})
+    assert not denormalizer.pending
+
+    data_store.apply_update("projects", project, {"name": "即将删除"})
+    assert denormalizer.pending
+    data_store.remove("projects", [project])
+    assert not denormalizer.pending
+    assert not denormalizer.run_once()
@@ -0,0 +1,91 @@
+from fastapi.testclient import TestClient
+
+from backend.app import app
+from backend.datastore import DataStore
+from backend.http_cache import ResponseCache, parse_record_tag, record_tag, response_cache
+
+
+def test_record_tags_round_trip():
+    assert record_tag({"version": 7}) == 'W/"v7"'
+    for value in ('W/"v7"', '"v7"', '"7"', "7", ' W/"v7" '):
+        assert parse_record_tag(value) == 7
+    assert parse_record_tag('"0a1b2c3d-ffee"') is None
+
+
+def test_detail_etag_is_accepted_by_if_match():
+    client = TestClient(app)
+    response = client.get("/api/projects/1")
+    etag = response.headers["etag"]
+    assert etag == f'W/"v{response.json()["version"]}"'
+
+    updated = client.patch("/api/projects/1", json={"clientName": "新客户"}, headers={"If-Match": etag})
+    assert updated.status_code == 200
+    assert updated.json()["version"] == response.json()["version"] + 1
+
+    stale = client.patch("/api/projects/1", json={"clientName": "旧客户"}, headers={"If-Match": etag})
+    assert stale.status_code == 409
+
+    fresh = client.get("/api/projects/1")
+    assert fresh.headers["etag"] == f'W/"v{updated.json()["version"]}"'
+    assert client.get("/api/projects/1", headers={"If-None-Match": fresh.headers["etag"]}).status_code == 304
+    assert client.patch("/api/projects/1", json={}, headers={"If-Match": '"opaque-tag"'}).status_code == 400
+
+
+def test_deleted_ids_are_not_reused(tmp_path):
+    # 删除末尾记录后新建的记录若拿到同一 id，版本号同为 1，旧 ETag 会误配到新记录上
+    path = str(tmp_path / "data_store.json")
+    data_store = DataStore(path)
+    first = data_store.insert("projects", {"name": "临时项目"})
+    data_store.remove("projects", [first])
+    second = data_store.insert("projects", {"name": "新项目"})
+    assert second["id"] == first["id"] + 1
+    assert data_store.find_by_id("projects", first["id"]) is None
+
+    data_store.remove("projects", [second])
+    data_store.save()
+    assert DataStore(path).next_id("projects") == second["id"] + 1
+
+
+def test_reserved_id_blocks_are_not_reused(tmp_path):
+    data_store = DataStore(str(tmp_path / "data_store.json"))
+    first = data_store.next_id("folders", 3)
+    batch = [{"id": first + offset, "name": f"批量 {offset}"} for offset in range(3)]
+    data_store.get_collection("folders").extend(batch)
+    data_store.mark_changed("folders", ids=[item["id"] for item in batch])
+    data_store.remove("folders", batch)
+    assert data_store.next_id("folders") == first + 3
+
+
+def test_response_cache_is_invalidated_by_its_collections(tmp_path):
+    data_store = DataStore(str(tmp_path / "data_store.json"))
+    cache = ResponseCache(data_store, max_bytes=1000)
+    for key, collections in (("overview", ("projects", "assets")), ("tree", ("projects", "folders")), ("disks", ("disks",))):
+        cache.put(key, collections, cache.versions(collections), b"{}", "application/json")
+
+    # 单条变更按标签立即移除依赖该集合的条目
+    data_store.apply_update("folders", data_store.data["folders"][0], {"name": "素材 A"})
+    assert sorted(cache.entries) == ["disks", "overview"]
+    # 只递增版本号的批量变更在读取时比对版本号失效
+    data_store.mark_changed("assets", ids=[1])
+    assert cache.get("overview", ("projects", "assets")) is None
+    assert cache.get("disks", ("disks",)).body == b"{}"
+
+    # 生成期间依赖集合已变更的响应不缓存
+    versions = cache.versions(("assets",))
+    data_store.mark_changed("assets", ids=[1])
+    cache.put("stale", ("assets",), versions, b"{}", "application/json")
+    assert "stale" not in cache.entries
+    assert cache.snapshot()["invalidations"] == 2
+
+
+def test_cached_tree_reflects_folder_changes():
+    client = TestClient(app)
+    first = client.get("/api/projects/1/tree").json()
+    assert client.get("/api/projects/1/tree").json() == first
+    hits = response_cache.stats["hits"]
+    assert hits >= 1
+
+    client.post("/api/folders", json={"projectId": 1, "name": "调色", "parentId": None})
+    tree = client.get("/api/projects/1/tree").json()
+    assert "调色" in [node["name"] for node in tree["items"]]
+    assert response_cache.stats["hits"] == hits
@@ -0,0 +1,131 @@
+from pathlib import Path
+
+import pytest
+
+from backend import importer as importer_module
+from backend.datastore import DataStore
+from backend.importer import ImportExecutor, hash_file
+
+
+@pytest.fixture
+def setup(tmp_path):
+    data_store = DataStore(str(tmp_path / "data_store.json"))
+    mount = tmp_path / "card"
+    (mount / "DCIM").mkdir(parents=True)
+    for index in range(5):
+        (mount / "DCIM" / f"C{index:03d}.mp4").write_bytes(bytes([index]) * (1000 + index))
+    (mount / "DCIM" / ".DS_Store").write_bytes(b"x")
+    data_store.data["import_devices"] = [{"name": "card", "mountPath": str(mount)}]
+    data_store.data["projects"][0]["clientName"] = None
+    executor = ImportExecutor(data_store, media_root=str(tmp_path / "media"), workers=2)
+    executor.manifest_dir = tmp_path / "manifests"
+    task = {
+        "id": 1,
+        "sourceDevice": "card",
+        "sourcePaths": ["/DCIM"],
+        "targetProjectId": 1,
+        "targetFolderId": 4,
+        "createdBy": "测试",
+    }
+    data_store.data["import_tasks"] = [task]
+    return data_store, executor, task, mount
+
+
+def imported(data_store, task):
+    return [asset for asset in data_store.data["assets"] if asset.get("importTaskId") == task["id"]]
+
+
+def test_copies_and_verifies_every_file(setup):
+    data_store, executor, task, mount = setup
+    executor.run(task)
+    assert task["status"] == "success"
+    assert (task["totalFiles"], task["successFiles"], task["failedFiles"]) == (5, 5, 0)
+    assets = imported(data_store, task)
+    assert len(assets) == 5
+    for asset in assets:
+        dest = Path(asset["storagePath"])
+        assert dest.read_bytes() == (mount / asset["sourcePath"]).read_bytes()
+        assert hash_file(dest) == asset["checksum"]
+        assert asset["clientName"] == ""
+    assert not list(Path(executor.media_root).rglob("*.part"))
+
+
+def test_retry_resumes_after_partial_run(setup, monkeypatch):
+    data_store, executor, task, _ = setup
+    original = importer_module.copy_with_hash
+
+    def flaky(source, dest, verify=True):
+        if source.name == "C002.mp4":
+            raise OSError("读取失败")
+        return original(source, dest, verify)
+
+    monkeypatch.setattr(importer_module, "copy_with_hash", flaky)
+    executor.run(task)
+    assert task["status"] == "partial"
+    assert task["failedFiles"] == 1
+    assert len(imported(data_store, task)) == 4
+
+    monkeypatch.setattr(importer_module, "copy_with_hash", original)
+    executor.run(task)
+    assert task["status"] == "success"
+    assert task["skippedFiles"] == 4
+    assert task["successFiles"] == 5
+    assert sorted(asset["fileName"] for asset in imported(data_store, task)) == [f"C{i:03d}.mp4" for i in range(5)]
+
+
+def test_retry_recopies_deleted_destination(setup):
+    data_store, executor, task, _ = setup
+    executor.run(task)
+    victim = imported(data_store, task)[0]
+    Path(victim["storagePath"]).unlink()
+
+    executor.run(task)
+    assert task["status"] == "success"
+    assert task["skippedFiles"] == 4
+    assert Path(victim["storagePath"]).exists()
+    assert len(imported(data_store, task)) == 5
+
+
+def test_source_paths_outside_the_mount_are_rejected(setup, tmp_path):
+    data_store, executor, task, mount = setup
+    (tmp_path / "secret.mov").write_bytes(b"secret")
+    (mount / "link").symlink_to(tmp_path)
+    task["sourcePaths"] = ["/DCIM", "/../secret.mov", "/DCIM/../../", "/link"]
+    executor.run(task)
+    assert task["status"] == "partial"
+    assert (task["totalFiles"], task["successFiles"], task["failedFiles"]) == (8, 5, 3)
+    assert sorted(failure["path"] for failure in task["failures"]) == ["/../secret.mov", "/DCIM/../../", "/link"]
+    assert all(Path(asset["sourcePath"]).parts[0] == "DCIM" for asset in imported(data_store, task))
+
+
+def test_unexpected_errors_mark_the_task_failed(setup, monkeypatch):
+    data_store, executor, task, _ = setup
+
+    def broken(*args, **kwargs):
+        raise RuntimeError("清单损坏")
+
+    monkeypatch.setattr(executor, "manifest", broken)
+    executor.run(task)
+    assert task["status"] == "fail"
+    assert task["failureReason"] == "清单损坏"
+    assert task["finishedAt"]
+
+
+def test_manifest_resumes_across_executors_and_recopies_changed_sources(setup, tmp_path):
+    data_store, executor, task, mount = setup
+    executor.run(task)
+    manifest = executor.manifest(task["id"])
+    assert sorted(manifest.entries) == [str(Path("DCIM") / f"C{index:03d}.mp4") for index in range(5)]
+
+    # 重启后的新实例只依据清单判断：未变化的文件跳过，大小或 mtime 变化的源文件重新拷贝
+    changed = mount / "DCIM" / "C001.mp4"
+    changed.write_bytes(b"new take" * 300)
+    restarted = ImportExecutor(data_store, media_root=executor.media_root, workers=2)
+    restarted.manifest_dir = executor.manifest_dir
+    restarted.run(task)
+    assert task["status"] == "success"
+    assert (task["skippedFiles"], task["successFiles"]) == (4, 5)
+    asset = next(asset for asset in imported(data_store, task) if asset["fileName"] == "C001.mp4")
+    assert Path(asset["storagePath"]).read_bytes() == changed.read_bytes()
+    assert asset["checksum"] == hash_file(changed)
+    assert len(imported(data_store, task)) == 5
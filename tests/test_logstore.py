@@ -0,0 +1,47 @@
+import random
+
+from backend import logstore
+from backend.logstore import LogStore
+
+
+def stamp(second):
+    return f"2024-03-01T10:{second // 60:02d}:{second % 60:02d}Z"
+
+
+def test_segments_rotate_and_old_ones_are_dropped(tmp_path):
+    logs = LogStore(tmp_path, fields=("level",), segment_bytes=600, retention=3)
+    for index in range(60):
+        logs.append({"level": "info" if index % 3 else "warn", "message": f"第 {index} 条", "time": stamp(index)})
+
+    assert len(logs.segments) == 3
+    assert len(list(tmp_path.glob("*.jsonl"))) == 3
+    assert all(segment.meta_path.exists() for segment in logs.segments[:-1])
+    kept = logs.query(limit=1000)
+    assert [record["id"] for record in kept] == list(range(60, 60 - len(kept), -1))
+
+    reopened = LogStore(tmp_path, fields=("level",), segment_bytes=600, retention=3)
+    assert reopened.last_id == 60
+    assert reopened.query(limit=1000) == kept
+    assert reopened.append({"level": "info"})["id"] == 61
+
+
+def test_time_range_query_matches_a_scan_with_out_of_order_times(tmp_path, monkeypatch):
+    monkeypatch.setattr(logstore, "INDEX_EVERY", 4)
+    rng = random.Random(3)
+    logs = LogStore(tmp_path, fields=("level",), segment_bytes=4000)
+    written = []
+    for index in range(300):
+        # 批量写入的日志可能晚于后来的日志落盘，时间不保证有序
+        second = index - rng.choice([0, 0, 0, 5, 40])
+        written.extend(logs.extend([{"level": rng.choice(["info", "warn"]), "time": stamp(max(second, 0))}]))
+    assert len(logs.segments) > 1
+
+    for start, end, level in ((stamp(50), stamp(120), None), (stamp(0), stamp(10), "warn"), (stamp(250), None, "info")):
+        expected = [
+            record
+            for record in written
+            if record["time"] >= start and (end is None or record["time"] <= end) and level in (None, record["level"])
+        ]
+        result = logs.query({"level": level}, start, end, limit=1000)
+        assert sorted(record["id"] for record in result) == [record["id"] for record in expected]
+    assert len(logs.query(limit=7)) == 7
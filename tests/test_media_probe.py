@@ -0,0 +1,30 @@
+import struct
+
+from backend.media_probe import asset_fields, probe_file
+
+
+def test_shoot_date_is_not_taken_from_file_mtime(tmp_path):
+    path = tmp_path / "A001.r3d"
+    path.write_bytes(b"\x00" * 64)
+    info = probe_file(str(path))
+    assert "modifiedDate" in info
+    assert "shootDate" not in asset_fields(info)
+
+
+def test_embedded_shoot_date_is_kept():
+    assert asset_fields({"shootDate": "2024-01-04"})["shootDate"] == "2024-01-04"
+
+
+def box(kind, payload):
+    return struct.pack(">I", 8 + len(payload)) + kind + payload
+
+
+def test_corrupt_mvhd_creation_time_does_not_fail_the_probe(tmp_path):
+    mvhd = b"\x01\x00\x00\x00" + struct.pack(">QQIQ", 2**63, 0, 1000, 5000)
+    path = tmp_path / "A001.mp4"
+    path.write_bytes(box(b"ftyp", b"isom\x00\x00\x00\x00") + box(b"moov", box(b"mvhd", mvhd)))
+
+    info = probe_file(str(path))
+    assert "error" not in info
+    assert info["duration"] == 5.0
+    assert "shootDate" not in info
@@ -0,0 +1,49 @@
+from fastapi.testclient import TestClient
+
+from backend.app import app
+from backend.metrics import Registry
+
+
+def test_histograms_render_cumulative_buckets():
+    registry = Registry()
+    latency = registry.histogram("demo_seconds", "演示耗时", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        latency.observe(value, "/a")
+    assert registry.histogram("demo_seconds", "重复注册返回已有指标") is latency
+
+    lines = registry.render().splitlines()
+    assert lines[:2] == ["# HELP demo_seconds 演示耗时", "# TYPE demo_seconds histogram"]
+    assert lines[2:] == [
+        'demo_seconds_bucket{route="/a",le="0.1"} 2',
+        'demo_seconds_bucket{route="/a",le="1"} 3',
+        'demo_seconds_bucket{route="/a",le="+Inf"} 4',
+        'demo_seconds_sum{route="/a"} 3.65',
+        'demo_seconds_count{route="/a"} 4',
+    ]
+
+
+def test_counters_gauges_and_failing_collectors():
+    registry = Registry()
+    registry.counter("demo_total", "计数", ("name",)).inc(2, 'say "hi"')
+
+    def broken():
+        raise RuntimeError("队列不可用")
+
+    registry.gauge("demo_broken", "出错的回调", (), broken)
+    registry.gauge("demo_depth", "队列深度", ("queue",), lambda: {("import",): 3, ("restore",): None})
+    text = registry.render()
+    assert 'demo_total{name="say \\"hi\\""} 2' in text
+    assert "# demo_broken 采集失败" in text
+    assert 'demo_depth{queue="import"} 3' in text
+    assert "restore" not in text
+
+
+def test_requests_are_recorded_by_route_template():
+    client = TestClient(app)
+    client.get("/api/projects/1")
+    client.get("/api/projects/2")
+    client.get("/api/does-not-exist")
+    text = client.get("/metrics").text
+    assert 'nas_http_request_duration_seconds_count{method="GET",route="/api/projects/{project_id}",status="200"}' in text
+    assert 'route="/api/projects/1"' not in text
+    assert 'route="unmatched",status="404"' in text
@@ -0,0 +1,50 @@
+from fastapi.testclient import TestClient
+
+from backend.app import app
+from backend.datastore import DataStore, store
+from backend.permissions import PermissionEngine, permission_engine
+
+
+def test_search_only_returns_assets_of_visible_projects():
+    client = TestClient(app)
+    for user_id, project_id in ((3, 1), (4, 2)):
+        expected = sorted(asset["id"] for asset in store.data["assets"] if asset.get("projectId") == project_id)
+        result = client.post("/api/assets/search", json={}, headers={"X-User-Id": str(user_id)}).json()
+        assert sorted(item["id"] for item in result["items"]) == expected
+        # 请求的 projectIds 与可见项目求交集
+        other = client.post("/api/assets/search", json={"projectIds": [1, 2]}, headers={"X-User-Id": str(user_id)})
+        assert {item["projectId"] for item in other.json()["items"]} == {project_id}
+    assert len(client.post("/api/assets/search", json={}).json()["items"]) == len(store.data["assets"])
+
+
+def check(client, user_id, project_id):
+    payload = {"userId": user_id, "permission": "perm.import.create", "projectId": project_id}
+    return client.post("/api/permissions/check", json=payload).json()["allowed"]
+
+
+def test_membership_changes_invalidate_cached_masks():
+    client = TestClient(app)
+    assert not check(client, 4, 1)
+    client.post("/api/projects/1/members", json={"userId": 4, "role": "editor"})
+    assert check(client, 4, 1)
+    client.patch("/api/projects/1/members/4", json={"role": "viewer"})
+    assert not check(client, 4, 1)
+    client.delete("/api/projects/1/members/4")
+    assert permission_engine.visible_projects(4) == frozenset({2})
+
+
+def test_unknown_users_are_not_cached(tmp_path):
+    data_store = DataStore(str(tmp_path / "data_store.json"))
+    engine = PermissionEngine(data_store)
+    assert not engine.allowed(9, "perm.asset.edit", 1)
+    assert 9 not in engine.cache
+    # 之后以该 id 创建的管理员不会沿用空权限
+    data_store.get_collection("users").append({"id": 9, "name": "新同事", "roles": [1], "status": "enabled"})
+    data_store.mark_changed("users", data_store.get_collection("users")[-1], "create")
+    assert engine.allowed(9, "perm.asset.edit", 1)
+
+
+def test_create_user_invalidates_cached_masks():
+    client = TestClient(app)
+    created = client.post("/api/users", json={"name": "新同事", "roles": [1]}).json()
+    assert check(client, created["id"], 1)
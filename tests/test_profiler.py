@@ -0,0 +1,46 @@
+import asyncio
+import threading
+import time
+
+from backend.datastore import DataStore
+from backend.profiler import Profiler
+
+
+def test_loop_samples_are_attributed_to_the_running_task(tmp_path):
+    profiler = Profiler(DataStore(str(tmp_path / "data_store.json")))
+    profiler.settings = {**profiler.settings, "enabled": True, "sampleRate": 1.0, "slowThresholdMs": 0}
+    busy = profiler.begin("GET", "/busy", "", lambda: None)
+    idle = profiler.begin("GET", "/idle", "", lambda: None)
+
+    def spin(seconds):
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            pass
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        ident = threading.get_ident()
+        waiter = asyncio.create_task(asyncio.Event().wait())
+        await asyncio.sleep(0)
+        busy.tasks.append((ident, loop, asyncio.current_task()))
+        idle.tasks.append((ident, loop, waiter))
+        done = threading.Event()
+
+        def sample():
+            while not done.is_set():
+                profiler.sample()
+                time.sleep(0.005)
+
+        sampler = threading.Thread(target=sample)
+        sampler.start()
+        spin(0.2)
+        done.set()
+        sampler.join()
+        waiter.cancel()
+
+    asyncio.run(main())
+
+    assert profiler.stats["profiled"] == 2
+    assert busy.samples
+    assert any(stack[-1].endswith(":spin") for stack in busy.samples)
+    assert not idle.samples
@@ -0,0 +1,76 @@
+from backend.datastore import DataStore
+from backend.project_ops import PROJECT_COLLECTIONS, ProjectOperations
+
+
+def make_ops(tmp_path):
+    data_store = DataStore(str(tmp_path / "data_store.json"))
+    return data_store, ProjectOperations(data_store)
+
+
+def rows_of(data_store, project_id):
+    return {name: [row for row in data_store.data[name] if row.get("projectId") == project_id] for name in PROJECT_COLLECTIONS}
+
+
+def test_archive_moves_assets_to_cold_and_stops_sync(tmp_path):
+    data_store, ops = make_ops(tmp_path)
+    project = data_store.find_by_id("projects", 1)
+    before = {asset["id"]: dict(asset) for asset in data_store.data["assets"]}
+    versions = data_store.version("assets"), data_store.version("projects")
+
+    result = ops.archive(project)
+    rows = rows_of(data_store, 1)
+    assert result["assets"] == sum(1 for asset in before.values() if asset["projectId"] == 1 and asset["tierLevel"] != "cold")
+    assert all((asset["tierLevel"], asset["localPresence"]) == ("cold", "cloud") for asset in rows["assets"])
+    assert not any(task["enabled"] for task in rows["sync_tasks"])
+    assert (project["status"], project["tierLevel"]) == ("archived", "cold")
+    for asset in data_store.data["assets"]:
+        if asset["projectId"] != 1:
+            assert asset == before[asset["id"]]
+        elif before[asset["id"]]["tierLevel"] != "cold":
+            assert asset["version"] == before[asset["id"]]["version"] + 1
+    # 关联集合只递增一次版本号
+    assert (data_store.version("assets"), data_store.version("projects")) == (versions[0] + 1, versions[1] + 1)
+    assert ops.archive(project) == {"assets": 0, "sync_tasks": 0}
+
+
+def test_clone_copies_structure_with_remapped_ids(tmp_path):
+    data_store, ops = make_ops(tmp_path)
+    project = data_store.find_by_id("projects", 1)
+    original = rows_of(data_store, 1)
+
+    created = ops.clone(project, {"name": "宣传片第二季"})["project"]
+    copied = rows_of(data_store, created["id"])
+    assert (created["name"], created["clonedFrom"], created["status"]) == ("宣传片第二季", 1, "ongoing")
+    assert data_store.find_by_id("projects", created["id"]) is created
+    assert copied["assets"] == []
+    for name in ("folders", "project_members", "sync_tasks", "tier_policies"):
+        assert len(copied[name]) == len(original[name]), name
+        assert not {row["id"] for row in copied[name]} & {row["id"] for row in data_store.data[name] if row not in copied[name]}
+    names = {folder["id"]: folder["name"] for folder in copied["folders"]}
+    for source, folder in zip(original["folders"], copied["folders"]):
+        assert folder["name"] == source["name"] and folder["version"] == 1
+        assert (folder["parentId"] is None) == (source["parentId"] is None)
+        if folder["parentId"] is not None:
+            assert names[folder["parentId"]] == data_store.find_by_id("folders", source["parentId"])["name"]
+        assert data_store.find_by_id("folders", folder["id"]) is folder
+    assert not any(task["enabled"] for task in copied["sync_tasks"])
+    assert rows_of(data_store, 1) == original
+
+
+def test_delete_cascades_to_related_rows(tmp_path):
+    data_store, ops = make_ops(tmp_path)
+    project = data_store.find_by_id("projects", 1)
+    task_ids = {task["id"] for task in rows_of(data_store, 1)["sync_tasks"]}
+    others = rows_of(data_store, 2)
+    jobs = len(data_store.data["sync_jobs"])
+
+    removed = ops.delete(project)
+    assert data_store.find_by_id("projects", 1) is None
+    assert all(rows == [] for rows in rows_of(data_store, 1).values())
+    assert not any(job["taskId"] in task_ids for job in data_store.data["sync_jobs"])
+    assert len(data_store.data["sync_jobs"]) == jobs - removed["sync_jobs"]
+    assert rows_of(data_store, 2) == others
+    # 外键索引不再返回已删除的记录
+    assert data_store.index("assets", "projectId").get(1) is None
+    for asset in others["assets"]:
+        assert data_store.find_by_id("assets", asset["id"]) is asset
@@ -0,0 +1,93 @@
+import random
+import threading
+import time
+
+from backend.cold_cache import ColdCacheManager
+from backend.datastore import DataStore
+from backend.restore_queue import RestoreQueue
+
+
+def make_queue(tmp_path):
+    data_store = DataStore(str(tmp_path / "data_store.json"))
+    data_store.data["tier_policies"].append({"id": 9, "type": "project", "projectId": 1, "coldCacheGb": 13})
+    return data_store, RestoreQueue(data_store, ColdCacheManager(data_store))
+
+
+def test_hot_assets_are_not_admitted_or_evicted(tmp_path):
+    data_store, queue = make_queue(tmp_path)
+    hot = data_store.find_by_id("assets", 1)
+    assert (hot["tierLevel"], hot["localPresence"], hot["size"]) == ("hot", "both", 12.5)
+    cold = {**hot, "id": 10, "tierLevel": "cold", "localPresence": "cloud", "size": 2}
+    data_store.data["assets"].append(cold)
+    data_store.mark_changed("assets")
+
+    task = queue.submit([hot], prefetch=False)
+    queue.drain()
+    assert task["status"] == "success"
+    assert task["servedLocally"] == 1
+    queue.submit([cold], prefetch=False)
+    queue.drain()
+
+    assert (hot["tierLevel"], hot["localPresence"]) == ("hot", "both")
+    assert cold["localPresence"] == "both"
+    assert queue.cache.snapshot()["projects"][0]["usedBytes"] == 2 * 1024 ** 3
+
+
+def test_prefetch_only_queues_cold_siblings(tmp_path):
+    data_store, queue = make_queue(tmp_path)
+    base = data_store.find_by_id("assets", 1)
+    siblings = [
+        {**base, "id": 20 + index, "tierLevel": tier, "localPresence": "cloud" if tier == "cold" else "both", "size": 1}
+        for index, tier in enumerate(["cold", "cold", "warm", "cold"])
+    ]
+    data_store.data["assets"].extend(siblings)
+    data_store.mark_changed("assets")
+    queue.submit([siblings[0]], prefetch=True)
+    assert sorted(queue.pending) == [20, 21, 23]
+
+
+def test_restore_batches_and_rebalance_do_not_deadlock(tmp_path):
+    data_store, queue = make_queue(tmp_path)
+    base = data_store.find_by_id("assets", 1)
+    assets = [{**base, "id": 100 + index, "tierLevel": "cold", "localPresence": "cloud", "size": 1} for index in range(40)]
+    data_store.data["assets"].extend(assets)
+    data_store.mark_changed("assets")
+    queue.max_batch = 1
+    deadline = time.monotonic() + 1
+
+    def restore():
+        while time.monotonic() < deadline:
+            queue.submit(random.sample(assets, 5), prefetch=False)
+            queue.drain()
+
+    def rebalance():
+        # 与 tier-policy 接口一样：调整预算后重新收敛，预算变小时会淘汰素材
+        while time.monotonic() < deadline:
+            data_store.data["tier_policies"][-1]["coldCacheGb"] = random.choice([2, 13])
+            queue.cache.rebalance()
+
+    threads = [threading.Thread(target=restore, daemon=True), threading.Thread(target=rebalance, daemon=True)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+
+    assert not any(thread.is_alive() for thread in threads)
+    assert not queue.pending
+
+
+def test_concurrent_submits_get_distinct_task_ids(tmp_path):
+    data_store, queue = make_queue(tmp_path)
+    asset = data_store.find_by_id("assets", 1)
+    tasks = []
+    # 回迁任务与其他写入方（如重试、接口新建）并发分配 id
+    threads = [
+        threading.Thread(target=lambda: tasks.append(queue.submit([asset], prefetch=False))) for _ in range(10)
+    ] + [threading.Thread(target=lambda: tasks.append(data_store.insert("restore_tasks", {}))) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+
+    ids = [task["id"] for task in tasks]
+    assert len(ids) == 20 and len(set(ids)) == 20
@@ -0,0 +1,53 @@
+import random
+
+from fastapi.testclient import TestClient
+
+from backend.app import app
+from backend.datastore import DataStore
+from backend.facets import FacetIndex, sort_items
+from backend.saved_views import SavedViews
+
+
+def test_opening_a_view_does_not_bump_its_version():
+    client = TestClient(app)
+    view = client.post(
+        "/api/search/views", json={"name": "冷数据", "conditions": {"tierLevel": ["cold"]}, "materialized": True}
+    ).json()
+
+    opened = client.post(f"/api/search/views/{view['id']}/open", json={})
+    assert opened.status_code == 200
+    assert opened.json()["view"]["version"] == view["version"]
+    assert opened.json()["view"]["useCount"] == 1
+
+    renamed = client.patch(
+        f"/api/search/views/{view['id']}", json={"name": "冷素材"}, headers={"If-Match": f'W/"v{view["version"]}"'}
+    )
+    assert renamed.status_code == 200
+
+
+def test_materialized_members_stay_sorted(tmp_path):
+    data_store = DataStore(str(tmp_path / "data_store.json"))
+    rng = random.Random(5)
+    data_store.data["assets"] = [
+        {"id": index, "projectId": 1, "tierLevel": "cold", "size": rng.uniform(0, 50)} for index in range(1, 201)
+    ]
+    views = SavedViews(data_store, FacetIndex(data_store))
+    view = {"id": 1, "conditions": {"tierLevel": ["cold"], "sort": "-size"}, "materialized": True}
+    views.open(view)
+
+    assets = list(data_store.get_collection("assets"))
+    for asset in rng.sample(assets, 40):
+        changes = {"size": rng.uniform(0, 50)} if rng.random() < 0.7 else {"tierLevel": "hot"}
+        data_store.apply_update("assets", asset, changes)
+    for _ in range(20):
+        data_store.insert("assets", {"projectId": 1, "tierLevel": "cold", "size": rng.uniform(0, 50)})
+    data_store.insert("assets", {"projectId": 1, "tierLevel": "cold"})
+    data_store.remove("assets", rng.sample(assets, 10))
+
+    members = views.open(view)["members"]
+    expected = sort_items(
+        [asset for asset in data_store.get_collection("assets") if asset["tierLevel"] == "cold"], "size", True
+    )
+    assert [member[0]["id"] for member in members] == [asset["id"] for asset in expected]
+    assert members[-1][0].get("size") is None
+    assert views.stats["builds"] == 1
@@ -0,0 +1,64 @@
+import os
+
+from backend.datastore import DataStore
+from backend.thumbnails import ContentCache, ThumbnailService
+
+
+def make_service(tmp_path, monkeypatch):
+    service = ThumbnailService(DataStore(str(tmp_path / "data_store.json")), workers=1)
+    renders = []
+
+    def render(source, file_type, kind, dest):
+        renders.append(source)
+        dest.write_bytes(b"jpeg:" + open(source, "rb").read()[:16])
+        return True
+
+    monkeypatch.setattr(service, "render", render)
+    return service, renders
+
+
+def test_thumbnails_are_cached_by_content(tmp_path, monkeypatch):
+    service, renders = make_service(tmp_path, monkeypatch)
+    source = tmp_path / "A001.jpg"
+    source.write_bytes(b"first take")
+    asset = {"id": 1, "fileType": "image", "localPresence": "local", "storagePath": str(source)}
+
+    key, path = service.lookup(asset)
+    assert path is None
+    generated = service.submit(asset).result()
+    assert service.lookup(asset) == (key, generated)
+    assert service.submit(asset).result() == generated
+    assert len(renders) == 1
+
+    # 没有校验值时以路径、大小与 mtime 为内容键：源文件变化后旧缩略图不再命中
+    source.write_bytes(b"second, longer take")
+    os.utime(source, ns=(1, 1))
+    assert service.lookup(asset)[1] is None
+    service.submit(asset).result()
+    asset["checksum"] = "blake2b:00ff"
+    assert service.lookup(asset)[1] is None
+    assert len(renders) == 2
+    assert service.cache.snapshot()["hits"] >= 2
+
+
+def test_cold_assets_are_not_rendered(tmp_path, monkeypatch):
+    service, renders = make_service(tmp_path, monkeypatch)
+    asset = {"id": 1, "fileType": "image", "localPresence": "cloud", "storagePath": str(tmp_path / "missing.jpg")}
+    assert service.submit(asset) is None
+    assert service.stats["skipped"] == 1
+    assert renders == []
+
+
+def test_content_cache_evicts_least_recently_used(tmp_path):
+    cache = ContentCache(tmp_path / "cache", max_bytes=25)
+    for key in ("aa01", "bb02", "cc03"):
+        part = tmp_path / f"{key}.part"
+        part.write_bytes(b"x" * 10)
+        cache.put(key, part, ".jpg")
+    assert cache.get("aa01") is None
+    assert cache.get("bb02") is not None
+    assert cache.snapshot()["evictions"] == 1
+
+    reopened = ContentCache(tmp_path / "cache", max_bytes=25)
+    assert sorted(reopened.entries) == ["bb02", "cc03"]
+    assert reopened.used == 20